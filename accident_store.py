@@ -0,0 +1,454 @@
+"""
+    Stockage des accidents sur le disque, par année et par mois, en fichiers de colonnes
+    ouverts en mémoire virtuelle (np.memmap). Le fichier des accidents est lu par paquets
+    et n'est jamais chargé en entier : les colonnes normalisées (date, heure, gravité,
+    commune, coordonnées et champs du popup) sont ajoutées aux fichiers de leur période.
+    Les callbacks ne lisent que les périodes qu'ils affichent, et le système garde en
+    mémoire les seules pages lues : la mémoire utilisée ne dépend plus de la taille des
+    données, ce qui permet de charger les accidents de toute la France.
+
+    Organisation du dossier :
+        meta.json                   types des colonnes, catégories, nombre de lignes par période
+        <année>/<mois>/<colonne>.bin  une colonne d'une période (année et mois 0 si date inconnue)
+"""
+from os import path, makedirs, replace, remove
+import json
+import shutil
+import numpy as np
+import pandas as pd
+import geopandas
+from compact import build_compact_table
+from cube import build_cube, add_to_cube
+from data_cache import file_infos, commune_ids, read_communes
+
+# Version du format du stockage, à incrémenter si les colonnes changent
+# (2 : commune_id en int32)
+STORE_VERSION = 2
+
+# Type de chaque colonne numérique
+STORE_COLUMNS = {
+    'date': 'int32',        # jours depuis le 1er janvier 1970, STORE_NO_DATE si inconnue
+    'year': 'int16',
+    'month': 'int8',
+    'hour': 'int8',         # -1 si inconnue
+    'commune_id': 'int32',  # -1 si inconnue
+    'x': 'float64',
+    'y': 'float64',
+}
+
+# Colonnes de texte stockées en codes (int32, -1 si manquant), avec la liste de leurs valeurs
+STORE_CATEGORIES = ['heure', 'commune', 'code_insee', 'type_colli', 'type_acci', 'luminosite']
+
+# Colonne de texte stockée telle quelle : les textes à la suite (adresse.bin) et la
+# position de fin de chaque texte (adresse_end.bin)
+STORE_TEXT = 'adresse'
+
+# Valeur de la colonne date quand la date est inconnue
+STORE_NO_DATE = np.iinfo(np.int32).min
+
+# Nombre d'accidents lus à la fois dans le fichier source
+STORE_CHUNK_SIZE = 100_000
+
+def partition_dir(store_dir: str, year: int, month: int) -> str:
+    """
+        Fonction pour récupérer le dossier d'une période
+
+        Args:
+            store_dir (str): le dossier du stockage
+            year (int): l'année
+            month (int): le mois
+
+        Returns:
+            str: le dossier de la période
+    """
+    return path.join(store_dir, str(year), f"{month:02d}")
+
+def append_column(filepath: str, values: np.ndarray) -> None:
+    """
+        Procédure pour ajouter des valeurs à la fin d'un fichier de colonne
+
+        Args:
+            filepath (str): le chemin du fichier
+            values (np.ndarray): les valeurs
+
+        Returns:
+            None
+    """
+    with open(filepath, "ab") as file:
+        np.ascontiguousarray(values).tofile(file)
+
+def encode_categories(values: pd.Series, categories: list) -> np.ndarray:
+    """
+        Fonction pour coder une colonne de texte, en ajoutant ses nouvelles valeurs
+        à la liste des valeurs connues
+
+        Args:
+            values (pd.Series): la colonne
+            categories (list): les valeurs connues, complétée en place
+
+        Returns:
+            np.ndarray: le code de chaque valeur (int32), -1 si elle est manquante
+    """
+    values = values.astype(object).where(values.notna(), None)
+    known = set(categories)
+    categories.extend(value for value in pd.unique(values.dropna()) if value not in known)
+    return pd.Index(categories, dtype=object).get_indexer(values).astype(np.int32)
+
+def append_chunk(store_dir: str, chunk: geopandas.GeoDataFrame, communes: geopandas.GeoDataFrame,
+                 meta: dict) -> None:
+    """
+        Procédure pour ajouter un paquet d'accidents aux fichiers de leurs périodes
+
+        Args:
+            store_dir (str): le dossier du stockage
+            chunk (geopandas.GeoDataFrame): les accidents, au format du fichier léger
+            communes (geopandas.GeoDataFrame): les communes, lues par read_communes
+            meta (dict): les métadonnées du stockage, complétées en place
+
+        Returns:
+            None
+    """
+    chunk['date'] = pd.to_datetime(chunk['date'])
+    chunk['commune_id'] = commune_ids(chunk, communes)
+    table = build_compact_table(chunk)
+
+    dates = chunk['date'].to_numpy(dtype='datetime64[D]')
+    columns = {
+        'date': np.where(np.isnat(dates), STORE_NO_DATE, dates.astype(np.int64)),
+        'year': table['year'].to_numpy(),
+        'month': table['month'].to_numpy(),
+        'hour': table['hour'].to_numpy(),
+        'commune_id': table['commune_id'].to_numpy(),
+        'x': chunk.geometry.x.to_numpy(),
+        'y': chunk.geometry.y.to_numpy(),
+    }
+    columns = {name: values.astype(STORE_COLUMNS[name]) for name, values in columns.items()}
+    for name in STORE_CATEGORIES:
+        columns[name] = encode_categories(chunk[name], meta['categories'][name])
+
+    texts = [text.encode("utf-8") for text in chunk[STORE_TEXT].fillna("").astype(str)]
+    lengths = np.array([len(text) for text in texts], dtype=np.int64)
+
+    keys = columns['year'].astype(np.int64) * 100 + columns['month']
+    for key in np.unique(keys):
+        rows = np.flatnonzero(keys == key)
+        year, month = int(key // 100), int(key % 100)
+        directory = partition_dir(store_dir, year, month)
+        makedirs(directory, exist_ok=True)
+        for name, values in columns.items():
+            append_column(path.join(directory, f"{name}.bin"), values[rows])
+
+        text_path = path.join(directory, f"{STORE_TEXT}.bin")
+        start = path.getsize(text_path) if path.exists(text_path) else 0
+        with open(text_path, "ab") as file:
+            file.write(b"".join(texts[row] for row in rows))
+        append_column(path.join(directory, f"{STORE_TEXT}_end.bin"),
+                      start + np.cumsum(lengths[rows]))
+
+        partition = meta['partitions'].setdefault(f"{year}-{month}", {'rows': 0, 'x': 0.0, 'y': 0.0})
+        partition['rows'] += len(rows)
+        # Sommes des coordonnées (arrondies en float32 comme la table compacte), pour le
+        # centre des cartes sans relire les colonnes
+        partition['x'] += float(columns['x'][rows].astype(np.float32).sum(dtype=np.float64))
+        partition['y'] += float(columns['y'][rows].astype(np.float32).sum(dtype=np.float64))
+
+def read_chunks(source: str, chunk_size: int):
+    """
+        Générateur des accidents d'un fichier, par paquets de chunk_size
+
+        Args:
+            source (str): le chemin du fichier des accidents
+            chunk_size (int): le nombre d'accidents par paquet
+
+        Returns:
+            geopandas.GeoDataFrame: les paquets d'accidents, l'un après l'autre
+    """
+    # fiona n'est importé que pour construire le stockage
+    import fiona
+
+    def to_frame(properties: list, coordinates: list, crs) -> geopandas.GeoDataFrame:
+        x, y = zip(*coordinates)
+        return geopandas.GeoDataFrame(pd.DataFrame(properties), crs=crs,
+                                      geometry=geopandas.points_from_xy(x, y))
+
+    # Les champs et coordonnées sont lus directement, plus vite que GeoDataFrame.from_features
+    with fiona.open(source) as source_file:
+        crs = source_file.crs
+        properties, coordinates = [], []
+        for feature in source_file:
+            properties.append(dict(feature.properties))
+            coordinates.append(feature.geometry.coordinates[:2] if feature.geometry is not None
+                               else (np.nan, np.nan))
+            if len(properties) >= chunk_size:
+                yield to_frame(properties, coordinates, crs)
+                properties, coordinates = [], []
+        if properties:
+            yield to_frame(properties, coordinates, crs)
+
+def build_store(source: str, communes_source: str, store_dir: str,
+                chunk_size: int = STORE_CHUNK_SIZE) -> None:
+    """
+        Procédure pour construire le stockage à partir du fichier des accidents, lu par paquets.
+        Le stockage est construit à côté puis renommé : il n'existe que s'il est complet.
+
+        Args:
+            source (str): le chemin du fichier des accidents
+            communes_source (str): le chemin du fichier des communes
+            store_dir (str): le dossier du stockage
+            chunk_size (int): le nombre d'accidents lus à la fois
+
+        Returns:
+            None
+    """
+    temporary_dir = f"{store_dir}.tmp"
+    shutil.rmtree(temporary_dir, ignore_errors=True)
+    makedirs(temporary_dir)
+
+    meta = {
+        'version': STORE_VERSION,
+        'source': file_infos(source),
+        'depends': file_infos(communes_source),
+        'crs': None,
+        'categories': {name: [] for name in STORE_CATEGORIES},
+        'partitions': {},
+    }
+    communes = read_communes(communes_source)
+    for chunk in read_chunks(source, chunk_size):
+        meta['crs'] = chunk.crs.to_string() if chunk.crs is not None else None
+        append_chunk(temporary_dir, chunk, communes, meta)
+
+    with open(path.join(temporary_dir, "meta.json"), "w", encoding="utf-8") as file:
+        json.dump(meta, file, ensure_ascii=False)
+
+    shutil.rmtree(store_dir, ignore_errors=True)
+    replace(temporary_dir, store_dir)
+
+def append_to_store(store_dir: str, accidents: geopandas.GeoDataFrame, source: str,
+                    communes_source: str) -> None:
+    """
+        Procédure pour ajouter des accidents au stockage, dans les seuls fichiers de leurs
+        périodes, quand ils viennent d'être ajoutés à la fin du fichier des accidents.
+        Le stockage doit être à jour avec le fichier d'avant l'ajout (is_store_valid).
+
+        Args:
+            store_dir (str): le dossier du stockage
+            accidents (geopandas.GeoDataFrame): les accidents ajoutés au fichier
+            source (str): le chemin du fichier des accidents, déjà complété
+            communes_source (str): le chemin du fichier des communes
+
+        Returns:
+            None
+    """
+    meta_path = path.join(store_dir, "meta.json")
+    with open(meta_path, encoding="utf-8") as file:
+        meta = json.load(file)
+    # Sans meta.json, le stockage n'est plus valide : un ajout interrompu le fait reconstruire
+    remove(meta_path)
+
+    append_chunk(store_dir, accidents.copy(), read_communes(communes_source), meta)
+    meta['source'] = file_infos(source)
+
+    with open(f"{meta_path}.tmp", "w", encoding="utf-8") as file:
+        json.dump(meta, file, ensure_ascii=False)
+    replace(f"{meta_path}.tmp", meta_path)
+
+def is_store_valid(store_dir: str, source: str, communes_source: str) -> bool:
+    """
+        Fonction pour savoir si le stockage est à jour avec le fichier des accidents
+
+        Args:
+            store_dir (str): le dossier du stockage
+            source (str): le chemin du fichier des accidents
+            communes_source (str): le chemin du fichier des communes
+
+        Returns:
+            bool: True si le stockage peut être utilisé
+    """
+    meta_path = path.join(store_dir, "meta.json")
+    if not path.exists(meta_path):
+        return False
+    with open(meta_path, encoding="utf-8") as file:
+        meta = json.load(file)
+    return (meta.get('version') == STORE_VERSION
+            and meta.get('source') == file_infos(source)
+            and meta.get('depends') == file_infos(communes_source))
+
+class AccidentStore:
+    """
+        Lecture du stockage des accidents, période par période
+
+        Args:
+            store_dir (str): le dossier du stockage
+    """
+    def __init__(self, store_dir: str):
+        self.store_dir = store_dir
+        with open(path.join(store_dir, "meta.json"), encoding="utf-8") as file:
+            self.meta = json.load(file)
+        self.partitions = {}
+        for key, partition in self.meta['partitions'].items():
+            year, month = key.split("-")
+            self.partitions[(int(year), int(month))] = partition
+        self.categories = {name: pd.Index(values, dtype=object)
+                           for name, values in self.meta['categories'].items()}
+
+    def partition_index(self) -> dict:
+        """
+            Fonction pour construire l'index des périodes, au format de build_partition_index.
+            Les positions sont des intervalles (range) : les lignes ne sont pas lues.
+
+            Returns:
+                dict: les positions par année ('years') et par (année, mois) ('months')
+        """
+        index = {'years': {}, 'months': {}}
+        start = 0
+        for (year, month), partition in sorted(self.partitions.items()):
+            end = start + partition['rows']
+            if year > 0:
+                index['months'][(year, month)] = range(start, end)
+                first = index['years'].get(year, range(start, start)).start
+                index['years'][year] = range(first, end)
+            start = end
+        return index
+
+    def columns(self, year: int, month: int, names: list) -> dict:
+        """
+            Fonction pour ouvrir des colonnes d'une période, sans les lire
+
+            Args:
+                year (int): l'année
+                month (int): le mois
+                names (list): les noms des colonnes (voir STORE_COLUMNS et STORE_CATEGORIES)
+
+            Returns:
+                dict: chaque colonne, en lecture seule (np.memmap, tableau vide si aucune ligne)
+        """
+        rows = self.partitions.get((year, month), {'rows': 0})['rows']
+        directory = partition_dir(self.store_dir, year, month)
+        columns = {}
+        for name in names:
+            dtype = STORE_COLUMNS.get(name, 'int32')
+            if rows == 0:
+                columns[name] = np.empty(0, dtype=dtype)
+            else:
+                columns[name] = np.memmap(path.join(directory, f"{name}.bin"),
+                                          dtype=dtype, mode='r', shape=(rows,))
+        return columns
+
+    def texts(self, year: int, month: int, name: str = STORE_TEXT) -> np.ndarray:
+        """
+            Fonction pour lire la colonne de texte d'une période
+
+            Args:
+                year (int): l'année
+                month (int): le mois
+                name (str): le nom de la colonne
+
+            Returns:
+                np.ndarray: les textes de la période
+        """
+        rows = self.partitions.get((year, month), {'rows': 0})['rows']
+        if rows == 0:
+            return np.empty(0, dtype=object)
+        directory = partition_dir(self.store_dir, year, month)
+        ends = np.fromfile(path.join(directory, f"{name}_end.bin"), dtype=np.int64)
+        with open(path.join(directory, f"{name}.bin"), "rb") as file:
+            data = file.read()
+        starts = np.concatenate(([0], ends[:-1]))
+        return np.array([data[start:end].decode("utf-8") for start, end in zip(starts, ends)],
+                        dtype=object)
+
+    def frame(self, year: int, month: int) -> geopandas.GeoDataFrame:
+        """
+            Fonction pour lire les accidents d'une période, au format de read_accidents
+
+            Args:
+                year (int): l'année
+                month (int): le mois
+
+            Returns:
+                geopandas.GeoDataFrame: les accidents de la période
+        """
+        columns = self.columns(year, month, list(STORE_COLUMNS) + STORE_CATEGORIES)
+        dates = np.asarray(columns['date']).astype('datetime64[D]')
+        dates[columns['date'] == STORE_NO_DATE] = np.datetime64('NaT')
+
+        accidents = pd.DataFrame({'date': pd.to_datetime(dates)})
+        for name in STORE_CATEGORIES:
+            accidents[name] = pd.Categorical.from_codes(np.asarray(columns[name]),
+                                                        categories=self.categories[name])
+        accidents[STORE_TEXT] = self.texts(year, month)
+        accidents['commune_id'] = np.asarray(columns['commune_id'])
+        return geopandas.GeoDataFrame(
+            accidents, crs=self.meta['crs'],
+            geometry=geopandas.points_from_xy(columns['x'], columns['y']))
+
+    def compact_table(self, year: int, month: int) -> pd.DataFrame:
+        """
+            Fonction pour lire la table compacte d'une période (voir compact.py)
+
+            Args:
+                year (int): l'année
+                month (int): le mois
+
+            Returns:
+                pd.DataFrame: les colonnes utilisées par le cube
+        """
+        columns = self.columns(year, month, ['year', 'month', 'hour', 'commune_id', 'type_acci'])
+        table = pd.DataFrame({name: np.asarray(columns[name])
+                              for name in ['year', 'month', 'hour', 'commune_id']})
+        table['type_acci'] = pd.Categorical.from_codes(np.asarray(columns['type_acci']),
+                                                       categories=self.categories['type_acci'])
+        return table
+
+    def center(self, year: int = None, month: int = None) -> list:
+        """
+            Fonction pour calculer la position moyenne des accidents d'une période,
+            à partir des sommes enregistrées dans les métadonnées
+
+            Args:
+                year (int): l'année, None pour tous les accidents
+                month (int): le mois
+
+            Returns:
+                list: la latitude et la longitude moyennes
+        """
+        partitions = (list(self.partitions.values()) if year is None
+                      else [self.partitions.get((year, month), {'rows': 0, 'x': 0.0, 'y': 0.0})])
+        rows = sum(partition['rows'] for partition in partitions)
+        if rows == 0:
+            return [float('nan'), float('nan')]
+        return [sum(partition['y'] for partition in partitions) / rows,
+                sum(partition['x'] for partition in partitions) / rows]
+
+    def build_cube(self) -> dict:
+        """
+            Fonction pour construire le cube des nombres d'accidents, une année à la fois
+
+            Returns:
+                dict: le cube des nombres d'accidents
+        """
+        cube = None
+        for year in sorted({year for year, _ in self.partitions}):
+            table = pd.concat([self.compact_table(year, month)
+                               for partition_year, month in sorted(self.partitions)
+                               if partition_year == year], ignore_index=True)
+            cube = build_cube(table) if cube is None else add_to_cube(cube, table)
+        return cube
+
+def open_store(store_dir: str, source: str, communes_source: str) -> AccidentStore:
+    """
+        Fonction pour ouvrir le stockage, en le reconstruisant si le fichier
+        des accidents ou celui des communes a changé
+
+        Args:
+            store_dir (str): le dossier du stockage
+            source (str): le chemin du fichier des accidents
+            communes_source (str): le chemin du fichier des communes
+
+        Returns:
+            AccidentStore: le stockage
+    """
+    if not is_store_valid(store_dir, source, communes_source):
+        print("Construction du stockage des accidents par période...")
+        build_store(source, communes_source, store_dir)
+    return AccidentStore(store_dir)
@@ -0,0 +1,102 @@
+"""
+    Cache sur le disque des éléments statiques du dashboard (carte choroplèthe,
+    histogramme de la gravité par heure). Chaque élément est enregistré sous l'empreinte
+    (sha256) des données qui le produisent : un processus qui démarre avec les mêmes
+    données le relit au lieu de le recalculer, et plusieurs workers partagent les mêmes
+    fichiers. Des données différentes donnent une autre empreinte, donc un autre fichier.
+"""
+from os import path, makedirs, replace, remove, getpid
+import glob
+import hashlib
+import numpy as np
+import pandas as pd
+import geopandas
+
+def update_hash(sha, part) -> None:
+    """
+        Procédure pour ajouter une donnée à une empreinte
+
+        Args:
+            sha: l'empreinte en cours de calcul (hashlib)
+            part: la donnée (texte, octets, tableau numpy, Series ou DataFrame)
+
+        Returns:
+            None
+    """
+    if isinstance(part, (geopandas.GeoDataFrame, geopandas.GeoSeries)):
+        # Les géométries sont comparées par leur représentation binaire (WKB)
+        geometry = part.geometry if isinstance(part, geopandas.GeoDataFrame) else part
+        for wkb in geometry.to_wkb():
+            sha.update(wkb or b"")
+        if isinstance(part, geopandas.GeoDataFrame):
+            update_hash(sha, pd.DataFrame(part.drop(columns=part.geometry.name)))
+    elif isinstance(part, (pd.DataFrame, pd.Series)):
+        sha.update(repr(list(part.columns) if isinstance(part, pd.DataFrame)
+                        else part.name).encode("utf-8"))
+        sha.update(pd.util.hash_pandas_object(part, index=True).to_numpy().tobytes())
+    elif isinstance(part, np.ndarray):
+        sha.update(f"{part.dtype}{part.shape}".encode("utf-8"))
+        sha.update(np.ascontiguousarray(part).tobytes())
+    elif isinstance(part, bytes):
+        sha.update(part)
+    else:
+        sha.update(repr(part).encode("utf-8"))
+    # Séparateur, pour que ("ab", "c") et ("a", "bc") ne donnent pas la même empreinte
+    sha.update(b"\0")
+
+def content_hash(*parts) -> str:
+    """
+        Fonction pour calculer l'empreinte des données qui produisent un élément
+
+        Args:
+            *parts: les données (texte, octets, tableaux numpy, Series ou DataFrame)
+
+        Returns:
+            str: l'empreinte (sha256)
+    """
+    sha = hashlib.sha256()
+    for part in parts:
+        update_hash(sha, part)
+    return sha.hexdigest()
+
+def cached_artifact(cache_dir: str, name: str, key: str, build,
+                    dumps=None, loads=None) -> object:
+    """
+        Fonction pour relire un élément statique depuis le cache, ou le construire
+        et l'enregistrer. Les anciennes versions de l'élément sont supprimées.
+
+        Args:
+            cache_dir (str): le dossier du cache, None pour toujours construire l'élément
+            name (str): le nom de l'élément
+            key (str): l'empreinte des données de l'élément (voir content_hash)
+            build (function): la fonction qui construit l'élément
+            dumps (function): la fonction qui transforme l'élément en texte, None s'il en est un
+            loads (function): la fonction qui relit l'élément depuis le texte
+
+        Returns:
+            l'élément
+    """
+    if cache_dir is None:
+        return build()
+
+    filepath = path.join(cache_dir, f"{name}-{key}.txt")
+    if path.exists(filepath):
+        with open(filepath, encoding="utf-8") as file:
+            text = file.read()
+        return loads(text) if loads is not None else text
+
+    artifact = build()
+    makedirs(cache_dir, exist_ok=True)
+    # Écriture à côté puis renommage : un autre worker ne lit jamais un fichier incomplet
+    temporary_path = f"{filepath}.{getpid()}.tmp"
+    with open(temporary_path, "w", encoding="utf-8") as file:
+        file.write(dumps(artifact) if dumps is not None else artifact)
+    replace(temporary_path, filepath)
+
+    for old_path in glob.glob(path.join(cache_dir, f"{name}-*.txt")):
+        if old_path != filepath:
+            try:
+                remove(old_path)
+            except FileNotFoundError:
+                pass
+    return artifact
@@ -0,0 +1,52 @@
+/*
+    Animation du slider des années dans le navigateur (ANIMATION_CLIENTSIDE dans main.py).
+    Les séries de chaque année sont dans le dcc.Store 'yearly-series' : chaque tick de
+    l'intervalle et chaque changement d'année se font sans requête au serveur.
+*/
+
+// Remplace l'axe y de la première série et le titre d'un graphique
+function withYearSeries(figure, serie) {
+    if (!figure || !figure.data || !serie) {
+        return window.dash_clientside.no_update;
+    }
+    const data = figure.data.slice();
+    data[0] = Object.assign({}, data[0], {y: serie.y});
+    const layout = Object.assign({}, figure.layout, {
+        title: Object.assign({}, (figure.layout || {}).title, {text: serie.title})
+    });
+    return Object.assign({}, figure, {data: data, layout: layout});
+}
+
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    animation: {
+        // Passe à l'année suivante, ou revient à la première après la dernière
+        on_tick: function (_, year, series) {
+            const years = series.years;
+            const index = years.indexOf(year);
+            return years[index + 1 < years.length ? index + 1 : 0];
+        },
+
+        // Met à jour l'histogramme des accidents par mois
+        update_histogramme: function (year, series, figure) {
+            const serie = series.series[String(year)];
+            return withYearSeries(figure, serie && serie.histogramme);
+        },
+
+        // Met à jour la courbe du nombre d'accidents par heure
+        update_graphique: function (year, series, figure) {
+            const serie = series.series[String(year)];
+            return withYearSeries(figure, serie && serie.graphique);
+        },
+
+        // Arrête ou relance l'animation
+        on_play_button_click: function (n_clicks) {
+            if (n_clicks === null || n_clicks === undefined) {
+                return [false, '⏸️'];
+            }
+            if (n_clicks % 2 === 1) {
+                return [true, '▶️'];
+            }
+            return [false, '⏸️'];
+        }
+    }
+});
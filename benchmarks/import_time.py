@@ -0,0 +1,155 @@
+"""
+    Rapport du temps d'import de chaque module du dashboard, mesuré avec
+    python -X importtime dans un processus neuf par module. Pour chaque module, le
+    rapport donne son temps d'import total et les paquets les plus lourds qu'il charge.
+    Avec --check, le rapport échoue si l'import du dashboard charge un des modules
+    qui ne doivent l'être qu'à leur première utilisation (DEFERRED_MODULES).
+
+    Utilisation :
+        python benchmarks/import_time.py
+        python benchmarks/import_time.py --modules main wsgi --top 15
+        python benchmarks/import_time.py --check
+"""
+from os import path
+import argparse
+import glob
+import subprocess
+import sys
+
+# Dossier du dashboard
+REPO_DIR = path.dirname(path.dirname(path.abspath(__file__)))
+
+# Modules qui ne doivent pas être chargés par l'import du dashboard : récupération
+# des données (scraping, téléchargement, lecture des GeoJSON) et rendu des cartes
+DEFERRED_MODULES = ['scraping', 'selenium', 'downloader', 'fiona', 'folium',
+                    'marker_layers', 'plotly.express']
+
+# Module importé au démarrage du dashboard, vérifié par --check
+STARTUP_MODULE = 'main'
+
+def repo_modules() -> list:
+    """
+        Fonction pour lister les modules à la racine du dashboard
+
+        Returns:
+            list: les noms des modules
+    """
+    names = [path.splitext(path.basename(filepath))[0]
+             for filepath in glob.glob(path.join(REPO_DIR, "*.py"))]
+    # gunicorn.conf.py est un fichier de configuration, pas un module importable
+    return sorted(name for name in names if "." not in name)
+
+def import_times(module: str) -> dict:
+    """
+        Fonction pour mesurer l'import d'un module dans un processus neuf
+
+        Args:
+            module (str): le nom du module
+
+        Returns:
+            dict: le temps d'import cumulé de chaque module chargé, en secondes
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=REPO_DIR, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"Import de {module} impossible :\n{result.stderr[-2000:]}")
+
+    # Format : "import time: <propre> | <cumulé> | <module>", en microsecondes. Les modules
+    # chargés par un import sont écrits avant lui, plus indentés : seuls ceux écrits après
+    # l'import précédent de premier niveau (démarrage de Python compris) sont gardés
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[1].strip().isdigit():
+            continue
+        name = fields[2].strip()
+        times[name] = int(fields[1]) / 1e6
+        if fields[2] == f" {name}":
+            if name == module:
+                return times
+            times = {}
+    return times
+
+def measure_module(module: str, repeat: int) -> dict:
+    """
+        Fonction pour mesurer l'import d'un module plusieurs fois, en gardant le plus rapide
+
+        Args:
+            module (str): le nom du module
+            repeat (int): le nombre de mesures
+
+        Returns:
+            dict: le temps d'import cumulé de chaque module chargé, en secondes
+    """
+    runs = [import_times(module) for _ in range(repeat)]
+    return min(runs, key=lambda times: times.get(module, 0))
+
+def heaviest_packages(times: dict, module: str, top: int) -> list:
+    """
+        Fonction pour trouver les paquets les plus lourds chargés par un module
+
+        Args:
+            times (dict): le temps d'import cumulé de chaque module chargé
+            module (str): le module mesuré, exclu du classement
+            top (int): le nombre de paquets gardés
+
+        Returns:
+            list: les (paquet, temps) du plus lourd au plus léger
+    """
+    packages = {name: seconds for name, seconds in times.items()
+                if "." not in name and name != module}
+    return sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]
+
+def deferred_loaded(times: dict) -> list:
+    """
+        Fonction pour trouver les modules de DEFERRED_MODULES chargés par un import
+
+        Args:
+            times (dict): le temps d'import cumulé de chaque module chargé
+
+        Returns:
+            list: les modules chargés trop tôt
+    """
+    return [name for name in DEFERRED_MODULES if name in times]
+
+def main() -> None:
+    """
+        Procédure principale : mesure chaque module et affiche le rapport
+
+        Returns:
+            None
+    """
+    parser = argparse.ArgumentParser(description="Temps d'import des modules du dashboard")
+    parser.add_argument("--modules", nargs="+", help="modules mesurés (tous par défaut)")
+    parser.add_argument("--top", type=int, default=8,
+                        help="nombre de paquets les plus lourds affichés par module")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="nombre de mesures par module (la plus rapide est gardée)")
+    parser.add_argument("--check", action="store_true",
+                        help=f"échoue si l'import de {STARTUP_MODULE} charge un module "
+                             f"de DEFERRED_MODULES")
+    args = parser.parse_args()
+
+    modules = args.modules or repo_modules()
+    if args.check and STARTUP_MODULE not in modules:
+        modules.append(STARTUP_MODULE)
+
+    reports = {module: measure_module(module, args.repeat) for module in modules}
+    for module in sorted(modules, key=lambda name: reports[name].get(name, 0), reverse=True):
+        times = reports[module]
+        print(f"{module} : {times.get(module, 0) * 1000:.0f} ms")
+        for package, seconds in heaviest_packages(times, module, args.top):
+            print(f"    {package:<24} {seconds * 1000:8.0f} ms")
+
+    if args.check:
+        loaded = deferred_loaded(reports[STARTUP_MODULE])
+        if loaded:
+            print(f"L'import de {STARTUP_MODULE} charge des modules qui devraient l'être "
+                  f"à leur première utilisation : {', '.join(loaded)}")
+            sys.exit(1)
+        print(f"L'import de {STARTUP_MODULE} ne charge aucun module de DEFERRED_MODULES.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+"""
+    Benchmarks des fonctions du dashboard sur des données synthétiques, sans téléchargement.
+    Pour chaque taille, un jeu de données est généré dans un dossier temporaire, puis un
+    processus neuf charge le dashboard et mesure chaque fonction : premier appel (à froid),
+    deuxième appel (à chaud) et pic de mémoire allouée (tracemalloc, sur un troisième appel).
+    Les fonctions déjà appelées par le chargement du dashboard (WARM_AFTER_LOAD) n'ont
+    pas de temps à froid.
+    Les résultats sont enregistrés en JSON, et peuvent être comparés à ceux d'une version
+    précédente pour voir les régressions.
+
+    Utilisation :
+        python benchmarks/run.py
+        python benchmarks/run.py --sizes 10000 100000 1000000 10000000
+        python benchmarks/run.py --compare benchmarks/results/ancien.json
+"""
+from os import path, makedirs, chdir, symlink
+import argparse
+import asyncio
+import json
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from synthetic import write_synthetic_data
+
+# Dossier du dashboard
+REPO_DIR = path.dirname(path.dirname(path.abspath(__file__)))
+
+# Tailles mesurées par défaut, et toutes les tailles du benchmark complet (--full)
+DEFAULT_SIZES = [10_000, 100_000]
+FULL_SIZES = [10_000, 100_000, 1_000_000, 10_000_000]
+
+# Période affichée par les fonctions qui dépendent de l'année et du mois
+BENCHMARK_YEAR = 2019
+BENCHMARK_MONTH = 4
+
+# Dossier des résultats
+RESULTS_DIR = path.join(REPO_DIR, "benchmarks", "results")
+
+# Fonctions déjà appelées par main.main() : leur premier appel mesuré est déjà à chaud,
+# leur temps à froid est compris dans celui du chargement ('load')
+WARM_AFTER_LOAD = ['create_choropleth_map', 'create_histogram_gravity_by_hour']
+
+# Au-delà de ce rapport avec la version comparée, un temps est signalé comme une régression
+REGRESSION_RATIO = 1.2
+
+def measure(function, cold: bool = True) -> dict:
+    """
+        Fonction pour mesurer une fonction : temps du premier et du deuxième appel,
+        puis pic de mémoire allouée pendant un troisième appel
+
+        Args:
+            function (function): la fonction à mesurer, sans paramètre
+            cold (bool): si False, la fonction a déjà été appelée : seul le temps
+                à chaud est gardé
+
+        Returns:
+            dict: les temps en secondes ('cold', absent si cold est False, et 'warm')
+                et le pic de mémoire en octets
+    """
+    timings = []
+    for _ in range(2):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    if not cold:
+        return {'warm': timings[1], 'peak_memory': peak}
+    return {'cold': timings[0], 'warm': timings[1], 'peak_memory': peak}
+
+def run_worker(workspace: str, result_file: str) -> None:
+    """
+        Procédure exécutée dans un processus neuf : charge le dashboard sur les données
+        synthétiques du dossier workspace et mesure chaque fonction
+
+        Args:
+            workspace (str): le dossier qui contient data/ et assets/
+            result_file (str): le fichier JSON où écrire les mesures
+
+        Returns:
+            None
+    """
+    chdir(workspace)
+    sys.path.insert(0, REPO_DIR)
+    import main
+    from get_data import lighten_data
+
+    # Les caches sur le disque fausseraient les mesures à froid
+    main.FIGURE_CACHE_DIR = None
+    main.MAP_CACHE_DIR = None
+    main.MAP_WARM_UP = False
+    main.REFRESH_ON_START = False
+
+    results = {'load': measure(lambda: asyncio.run(main.main()))}
+
+    year, month = BENCHMARK_YEAR, BENCHMARK_MONTH
+    accidents = main.period_accidents(year, month)
+    center = main.map_center(year, month)
+    benchmarks = {
+        'create_map': lambda: main.create_map(accidents, center),
+        'update_map': lambda: main.update_map(year, month),
+        'update_histogramme': lambda: main.update_histogramme(year),
+        'update_graphique': lambda: main.update_graphique(year),
+        'create_choropleth_map': main.create_choropleth_map,
+        'create_histogram_gravity_by_hour': main.create_histogram_gravity_by_hour,
+        'lighten_data': lambda: lighten_data("data/big_accidents.geojson",
+                                             "data/light_accidents_benchmark.geojson"),
+    }
+    for name, function in benchmarks.items():
+        results[name] = measure(function, cold=name not in WARM_AFTER_LOAD)
+
+    try:
+        import resource
+        # Mémoire maximale du processus (en kilo-octets sous Linux)
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    except ImportError:
+        max_rss = None
+
+    with open(result_file, "w", encoding="utf-8") as file:
+        json.dump({
+            'functions': results,
+            'accidents_in_period': len(accidents),
+            'max_rss': max_rss,
+        }, file)
+
+def run_size(rows: int, seed: int) -> dict:
+    """
+        Fonction pour générer les données d'une taille et les mesurer dans un processus neuf
+
+        Args:
+            rows (int): le nombre d'accidents
+            seed (int): la graine du générateur
+
+        Returns:
+            dict: les mesures, et le temps de génération des données
+    """
+    workspace = tempfile.mkdtemp(prefix=f"dashboard-benchmark-{rows}-")
+    try:
+        start = time.perf_counter()
+        write_synthetic_data(path.join(workspace, "data"), rows, seed)
+        generation = time.perf_counter() - start
+        # Les icônes des radars sont lues dans assets/
+        symlink(path.join(REPO_DIR, "assets"), path.join(workspace, "assets"))
+
+        result_file = path.join(workspace, "result.json")
+        subprocess.run([sys.executable, path.abspath(__file__), "--worker", workspace,
+                        "--result-file", result_file], check=True, stdout=subprocess.DEVNULL)
+        with open(result_file, encoding="utf-8") as file:
+            result = json.load(file)
+        result['generation'] = generation
+        return result
+    finally:
+        shutil.rmtree(workspace, ignore_errors=True)
+
+def git_commit() -> str:
+    """
+        Fonction pour récupérer le commit du dashboard mesuré
+
+        Returns:
+            str: le commit, None si le dossier n'est pas un dépôt git
+    """
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(results: dict, previous: dict) -> None:
+    """
+        Procédure pour afficher l'évolution des temps à chaud par rapport à une version précédente
+
+        Args:
+            results (dict): les mesures de cette version
+            previous (dict): les mesures de la version précédente
+
+        Returns:
+            None
+    """
+    print(f"Comparaison avec {previous.get('commit')} ({previous.get('date')}) :")
+    for rows, size in results['sizes'].items():
+        previous_size = previous['sizes'].get(rows)
+        if previous_size is None:
+            continue
+        for name, measures in size['functions'].items():
+            before = previous_size['functions'].get(name)
+            if before is None or before['warm'] == 0:
+                continue
+            ratio = measures['warm'] / before['warm']
+            flag = " <- régression" if ratio > REGRESSION_RATIO else ""
+            print(f"  {rows} lignes, {name} : {before['warm']:.4f} s -> "
+                  f"{measures['warm']:.4f} s (x{ratio:.2f}){flag}")
+
+def main() -> None:
+    """
+        Procédure principale : mesure chaque taille et enregistre les résultats
+
+        Returns:
+            None
+    """
+    parser = argparse.ArgumentParser(description="Benchmarks du dashboard sur des données synthétiques")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES,
+                        help="nombres d'accidents à mesurer")
+    parser.add_argument("--full", action="store_true",
+                        help=f"mesure toutes les tailles ({', '.join(map(str, FULL_SIZES))})")
+    parser.add_argument("--seed", type=int, default=0, help="graine du générateur")
+    parser.add_argument("--output", help="fichier JSON des résultats")
+    parser.add_argument("--compare", help="fichier JSON d'une version précédente")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--result-file", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker is not None:
+        run_worker(args.worker, args.result_file)
+        return
+
+    results = {
+        'commit': git_commit(),
+        'date': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'seed': args.seed,
+        'sizes': {},
+    }
+    for rows in (FULL_SIZES if args.full else args.sizes):
+        print(f"Benchmark sur {rows} accidents...")
+        size = run_size(rows, args.seed)
+        results['sizes'][str(rows)] = size
+        for name, measures in size['functions'].items():
+            cold = f"{measures['cold']:.4f} s à froid, " if 'cold' in measures else ""
+            print(f"  {name} : {cold}{measures['warm']:.4f} s à chaud, "
+                  f"{measures['peak_memory'] / 1024 / 1024:.1f} Mo")
+
+    output = args.output or path.join(RESULTS_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}"
+                                                   f"-{results['commit'] or 'local'}.json")
+    makedirs(path.dirname(path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as file:
+        json.dump(results, file, indent=2)
+    print(f"Résultats enregistrés dans {output}")
+
+    if args.compare is not None:
+        with open(args.compare, encoding="utf-8") as file:
+            compare(results, json.load(file))
+
+if __name__ == "__main__":
+    main()
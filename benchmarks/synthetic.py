@@ -0,0 +1,187 @@
+"""
+    Générateur de données synthétiques pour les benchmarks, au format des fichiers
+    du dashboard : accidents (fichier lourd et fichier léger), communes, radars et
+    auto-écoles. Les données sont tirées au hasard avec une graine fixe, sans rien
+    télécharger, et les accidents sont générés et écrits par paquets pour pouvoir en
+    produire plusieurs millions.
+"""
+from os import path, makedirs
+import json
+import numpy as np
+import pandas as pd
+import geopandas
+from shapely.geometry import box
+
+# Emprise des Hauts-de-Seine (longitude min, latitude min, longitude max, latitude max)
+BOUNDS = (2.15, 48.73, 2.34, 48.95)
+
+# Nombre de communes, sur une grille de COMMUNES_GRID x COMMUNES_GRID
+COMMUNES_GRID = 6
+
+# Valeurs des champs des accidents, avec leur probabilité pour la gravité
+TYPES_COLLISION = ["Deux véhicules - frontale", "Deux véhicules - par l'arrière",
+                   "Deux véhicules - par le coté", "Trois véhicules et plus - en chaîne",
+                   "Autre collision", "Sans collision", None]
+TYPES_ACCIDENT = ["Léger", "Grave", "Mortel"]
+TYPES_ACCIDENT_PROBABILITIES = [0.8, 0.17, 0.03]
+LUMINOSITES = ["Plein jour", "Crépuscule ou aube", "Nuit sans éclairage public",
+               "Nuit avec éclairage public allumé", "Nuit avec éclairage public non allumé"]
+TYPES_RADAR = ["Radar fixe", "Radar feu rouge", "Radar discriminant", "Radar vitesse moyenne"]
+
+# Années des accidents
+FIRST_YEAR = 2006
+LAST_YEAR = 2021
+
+# Nombre d'accidents générés et écrits à la fois
+CHUNK_SIZE = 100_000
+
+def synthetic_communes() -> geopandas.GeoDataFrame:
+    """
+        Fonction pour générer les communes, au format du fichier des communes
+
+        Returns:
+            geopandas.GeoDataFrame: les communes (insee_com, nom et polygone)
+    """
+    width = (BOUNDS[2] - BOUNDS[0]) / COMMUNES_GRID
+    height = (BOUNDS[3] - BOUNDS[1]) / COMMUNES_GRID
+    polygons, codes, names = [], [], []
+    for row in range(COMMUNES_GRID):
+        for column in range(COMMUNES_GRID):
+            number = row * COMMUNES_GRID + column
+            x, y = BOUNDS[0] + column * width, BOUNDS[1] + row * height
+            polygons.append(box(x, y, x + width, y + height))
+            codes.append(f"92{number + 1:03d}")
+            names.append(f"Commune {number + 1:02d}")
+    return geopandas.GeoDataFrame({'insee_com': codes, 'nom': names},
+                                  geometry=polygons, crs="EPSG:4326")
+
+def synthetic_accidents(rows: int, communes: geopandas.GeoDataFrame,
+                        rng: np.random.Generator, first: int = 0, heavy: bool = False) -> tuple:
+    """
+        Fonction pour générer des accidents, au format du fichier léger
+        (ou du fichier lourd, avec des champs en plus)
+
+        Args:
+            rows (int): le nombre d'accidents
+            communes (geopandas.GeoDataFrame): les communes, pour le nom et le code INSEE
+            rng (np.random.Generator): le générateur aléatoire
+            first (int): le numéro du premier accident, pour les adresses
+            heavy (bool): si True, ajoute les champs du fichier lourd absents du fichier léger
+
+        Returns:
+            pd.DataFrame: les champs des accidents
+            np.ndarray: les longitudes
+            np.ndarray: les latitudes
+    """
+    x = rng.uniform(BOUNDS[0], BOUNDS[2], rows)
+    y = rng.uniform(BOUNDS[1], BOUNDS[3], rows)
+    column = ((x - BOUNDS[0]) / (BOUNDS[2] - BOUNDS[0]) * COMMUNES_GRID).astype(int)
+    row = ((y - BOUNDS[1]) / (BOUNDS[3] - BOUNDS[1]) * COMMUNES_GRID).astype(int)
+    commune = (np.clip(row, 0, COMMUNES_GRID - 1) * COMMUNES_GRID
+               + np.clip(column, 0, COMMUNES_GRID - 1))
+
+    days = (np.datetime64(f"{LAST_YEAR + 1}-01-01") - np.datetime64(f"{FIRST_YEAR}-01-01")).astype(int)
+    dates = np.datetime64(f"{FIRST_YEAR}-01-01") + rng.integers(0, days, rows)
+    minutes = rng.integers(0, 24 * 60, rows)
+
+    accidents = pd.DataFrame({
+        'date': np.datetime_as_string(dates, unit='D'),
+        'heure': [f"{minute // 60:02d}:{minute % 60:02d}:00" for minute in minutes],
+        'commune': communes['nom'].to_numpy()[commune],
+        'code_insee': communes['insee_com'].to_numpy()[commune],
+        'type_colli': rng.choice(np.array(TYPES_COLLISION, dtype=object), rows),
+        'type_acci': rng.choice(TYPES_ACCIDENT, rows, p=TYPES_ACCIDENT_PROBABILITIES),
+        'luminosite': rng.choice(LUMINOSITES, rows),
+        'adresse': [f"{(first + number) % 200 + 1} rue {(first + number) // 200}"
+                    for number in range(rows)],
+    })
+    if heavy:
+        # Générateur à part, pour que les deux fichiers aient les mêmes accidents
+        extra = np.random.default_rng(first)
+        accidents['num_acc'] = np.arange(first, first + rows).astype(str)
+        accidents['nb_vehicules'] = extra.integers(1, 5, rows)
+        accidents['nb_victimes'] = extra.integers(1, 4, rows)
+        accidents['conditions_atmospheriques'] = extra.choice(["Normale", "Pluie légère",
+                                                               "Temps couvert"], rows)
+    return accidents, x, y
+
+def write_geojson(filepath: str, name: str, chunks) -> None:
+    """
+        Procédure pour écrire des points dans un fichier GeoJSON, au format écrit par GDAL,
+        paquet par paquet
+
+        Args:
+            filepath (str): le chemin du fichier
+            name (str): le nom de la couche
+            chunks: les paquets de points, des tuples (champs, longitudes, latitudes)
+
+        Returns:
+            None
+    """
+    with open(filepath, "w", encoding="utf-8") as file:
+        file.write('{\n"type": "FeatureCollection",\n'
+                   f'"name": "{name}",\n'
+                   '"crs": { "type": "name", "properties": '
+                   '{ "name": "urn:ogc:def:crs:OGC:1.3:CRS84" } },\n'
+                   '"features": [\n')
+        first = True
+        for properties, x, y in chunks:
+            records = properties.astype(object).where(properties.notna(), None).to_dict('records')
+            for record, longitude, latitude in zip(records, x.tolist(), y.tolist()):
+                feature = {'type': 'Feature', 'properties': record,
+                           'geometry': {'type': 'Point', 'coordinates': [longitude, latitude]}}
+                file.write(("" if first else ",\n") + json.dumps(feature, ensure_ascii=False))
+                first = False
+        file.write('\n]\n}\n')
+
+def write_synthetic_data(data_dir: str, rows: int, seed: int = 0, radars: int = 400,
+                         driving_schools: int = 200) -> None:
+    """
+        Procédure pour écrire un jeu de données synthétique complet dans un dossier,
+        avec les noms de fichiers du dashboard
+
+        Args:
+            data_dir (str): le dossier des données
+            rows (int): le nombre d'accidents
+            seed (int): la graine du générateur aléatoire
+            radars (int): le nombre de radars, dont un sur dix dans les Hauts-de-Seine
+            driving_schools (int): le nombre d'auto-écoles
+
+        Returns:
+            None
+    """
+    makedirs(data_dir, exist_ok=True)
+    communes = synthetic_communes()
+    communes.to_file(path.join(data_dir, "communes-92-hauts-de-seine.geojson"), driver="GeoJSON")
+
+    # Les deux fichiers des accidents ont les mêmes accidents (même graine)
+    for filename, heavy in [("big_accidents.geojson", True), ("light_accidents.geojson", False)]:
+        rng = np.random.default_rng(seed)
+        chunks = (synthetic_accidents(min(CHUNK_SIZE, rows - first), communes, rng, first, heavy)
+                  for first in range(0, rows, CHUNK_SIZE))
+        write_geojson(path.join(data_dir, filename), filename.split(".")[0], chunks)
+
+    rng = np.random.default_rng(seed + 1)
+    in_92 = np.arange(radars) % 10 == 0
+    pd.DataFrame({
+        'id': np.arange(radars),
+        'departement': np.where(in_92, "92", rng.choice(["75", "78", "93", "94", "2A"], radars)),
+        'latitude': np.where(in_92, rng.uniform(BOUNDS[1], BOUNDS[3], radars),
+                             rng.uniform(42.0, 51.0, radars)),
+        'longitude': np.where(in_92, rng.uniform(BOUNDS[0], BOUNDS[2], radars),
+                              rng.uniform(-4.5, 8.0, radars)),
+        'route': rng.choice(np.array(["A86", "N118", "D920", None], dtype=object), radars),
+        'sens': rng.choice(["Paris vers province", "Province vers Paris"], radars),
+        'type': rng.choice(TYPES_RADAR, radars),
+        'vitesse_vehicules_legers_kmh': rng.choice([50, 70, 90, 110, np.nan], radars),
+    }).to_csv(path.join(data_dir, "radars.csv"), index=False)
+
+    # La position est le texte "latitude,longitude" lu sur le site des auto-écoles
+    latitudes = rng.uniform(BOUNDS[1], BOUNDS[3], driving_schools)
+    longitudes = rng.uniform(BOUNDS[0], BOUNDS[2], driving_schools)
+    geopandas.GeoDataFrame({
+        'name': [f"Auto-école {number}" for number in range(driving_schools)],
+        'position': [f"{latitude},{longitude}" for latitude, longitude in zip(latitudes, longitudes)],
+        'grade': rng.uniform(1, 5, driving_schools).round(1).astype(str),
+    }, geometry=geopandas.points_from_xy(longitudes, latitudes),
+       crs="EPSG:4326").to_file(path.join(data_dir, "driving_schools.geojson"), driver="GeoJSON")
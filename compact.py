@@ -0,0 +1,58 @@
+"""
+    Table compacte des accidents, construite une seule fois au chargement.
+    Les champs utilisés par les graphiques et les cartes y sont déjà décodés et typés
+    au plus juste : année (int16), mois et heure (int8), coordonnées (float32),
+    commune (int32) et catégories pour les champs qui ont peu de valeurs différentes.
+    Les lignes sont dans le même ordre que la table des accidents.
+"""
+import numpy as np
+import pandas as pd
+import geopandas
+
+# Champs texte gardés en catégories (codes entiers et liste des valeurs)
+COMPACT_CATEGORIES = ['type_acci', 'type_colli', 'luminosite', 'commune']
+
+def build_compact_table(accident: geopandas.GeoDataFrame) -> pd.DataFrame:
+    """
+        Fonction pour construire la table compacte des accidents
+
+        Args:
+            accident (geopandas.GeoDataFrame): les accidents, avec la date déjà convertie
+                en datetime et leur commune_id
+
+        Returns:
+            pd.DataFrame: la table compacte, une ligne par accident. L'année et le mois
+                valent 0 et l'heure -1 quand ils sont inconnus.
+    """
+    # L'heure est lue une seule fois dans le texte "HH:MM:SS"
+    hours = pd.to_numeric(accident['heure'].astype(str).str.slice(0, 2), errors='coerce')
+
+    table = pd.DataFrame({
+        'year': accident['date'].dt.year.fillna(0).to_numpy(dtype=np.int16),
+        'month': accident['date'].dt.month.fillna(0).to_numpy(dtype=np.int8),
+        'hour': hours.where(hours.between(0, 23), -1).to_numpy(dtype=np.int8),
+        'x': accident.geometry.x.to_numpy(dtype=np.float32),
+        'y': accident.geometry.y.to_numpy(dtype=np.float32),
+        'commune_id': accident['commune_id'].to_numpy(dtype=np.int32),
+    })
+    for column in COMPACT_CATEGORIES:
+        table[column] = accident[column].astype('category').array
+    return table
+
+def memory_report(accident: geopandas.GeoDataFrame, table: pd.DataFrame) -> str:
+    """
+        Fonction pour comparer la mémoire utilisée par les accidents et par la table compacte
+
+        Args:
+            accident (geopandas.GeoDataFrame): les accidents
+            table (pd.DataFrame): la table compacte des accidents
+
+        Returns:
+            str: le résumé de la comparaison
+    """
+    columns = ['date', 'heure', 'geometry', 'commune_id'] + COMPACT_CATEGORIES
+    before = accident[columns].memory_usage(deep=True).sum()
+    after = table.memory_usage(deep=True).sum()
+    return (f"Mémoire des champs des accidents : {before / 1024 / 1024:.1f} Mo, "
+            f"table compacte : {after / 1024 / 1024:.1f} Mo "
+            f"({before / max(after, 1):.1f} fois moins)")
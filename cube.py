@@ -0,0 +1,240 @@
+"""
+    Cube des nombres d'accidents par année, mois, heure, gravité et commune.
+    Le cube est calculé en une seule passe au chargement des données puis sauvegardé
+    sur le disque : les graphiques ne font plus que des sommes sur ses axes.
+"""
+from os import path, makedirs, stat
+import numpy as np
+import pandas as pd
+
+# Gravités des accidents, dans l'ordre de l'axe du cube
+SEVERITIES = ['Léger', 'Grave', 'Mortel']
+
+# Version du format du cube, à incrémenter si les axes changent
+CUBE_VERSION = 2
+
+def source_key(filepath: str, depends: tuple = ()) -> str:
+    """
+        Fonction pour calculer la clé d'un fichier source et des fichiers dont il dépend
+        (taille et date de modification de chacun)
+
+        Args:
+            filepath (str): le chemin du fichier source
+            depends (tuple): les autres fichiers lus pour construire le cube (le fichier
+                des communes, qui donne les commune_id de l'axe des communes)
+
+        Returns:
+            str: la clé des fichiers, qui change dès que l'un d'eux est modifié
+    """
+    keys = [CUBE_VERSION]
+    for dependency in (filepath,) + tuple(depends):
+        infos = stat(dependency)
+        keys += [infos.st_size, infos.st_mtime_ns]
+    return "-".join(map(str, keys))
+
+def count_accidents(table: pd.DataFrame, unique_years: np.ndarray,
+                    communes: np.ndarray) -> np.ndarray:
+    """
+        Fonction pour compter les accidents sur les axes du cube, en une seule passe
+
+        Args:
+            table (pd.DataFrame): la table compacte des accidents (voir compact.py)
+            unique_years (np.ndarray): les années de l'axe des années
+            communes (np.ndarray): les identifiants (commune_id) de l'axe des communes
+
+        Returns:
+            np.ndarray: le tableau des comptes
+    """
+    # Position de chaque accident sur chaque axe (-1 si la valeur est inconnue)
+    year_codes = pd.Categorical(table['year'], categories=unique_years).codes.astype(np.int64)
+    month_codes = table['month'].to_numpy(dtype=np.int64) - 1
+    hour_codes = table['hour'].to_numpy(dtype=np.int64)
+    severity_codes = pd.Categorical(table['type_acci'], categories=SEVERITIES).codes
+    commune_codes = pd.Categorical(table['commune_id'], categories=communes).codes
+
+    shape = (len(unique_years), 12, 24, len(SEVERITIES), len(communes))
+    coords = (year_codes, month_codes, hour_codes,
+              severity_codes.astype(np.int64), commune_codes.astype(np.int64))
+    valid = np.ones(len(table), dtype=bool)
+    for axis, codes in enumerate(coords):
+        valid &= (codes >= 0) & (codes < shape[axis])
+
+    flat = np.ravel_multi_index(tuple(codes[valid] for codes in coords), shape)
+    return np.bincount(flat, minlength=int(np.prod(shape))).astype(np.int32).reshape(shape)
+
+def build_cube(table: pd.DataFrame) -> dict:
+    """
+        Fonction pour construire le cube des nombres d'accidents
+
+        Args:
+            table (pd.DataFrame): la table compacte des accidents
+
+        Returns:
+            dict: le tableau des comptes ('counts') et les valeurs de chaque axe
+    """
+    unique_years = np.unique(table['year'][table['year'] > 0]).astype(np.int64)
+    # Les accidents sans commune connue (-1) ont aussi leur place sur l'axe des communes
+    communes = np.unique(table['commune_id'].to_numpy()).astype(np.int64)
+    counts = count_accidents(table, unique_years, communes)
+
+    return {
+        'counts': counts,
+        'years': unique_years,
+        'severities': np.array(SEVERITIES),
+        'communes': communes,
+    }
+
+def load_or_build_cube(table: pd.DataFrame, source: str, cache_path: str,
+                       depends: tuple = ()) -> dict:
+    """
+        Fonction pour charger le cube depuis le disque, ou le construire s'il n'est plus à jour
+
+        Args:
+            table (pd.DataFrame): la table compacte des accidents
+            source (str): le chemin du fichier des accidents
+            cache_path (str): le chemin du fichier .npz du cube
+            depends (tuple): les autres fichiers lus pour construire le cube
+
+        Returns:
+            dict: le cube des nombres d'accidents
+    """
+    cube = load_saved_cube(cache_path, source_key(source, depends))
+    if cube is None:
+        cube = build_cube(table)
+        save_cube(cube, source, cache_path, depends)
+    return cube
+
+def add_to_cube(cube: dict, new_table: pd.DataFrame) -> dict:
+    """
+        Fonction pour ajouter de nouveaux accidents au cube, sans tout recompter.
+        Les axes des années et des communes sont agrandis si besoin.
+
+        Args:
+            cube (dict): le cube des nombres d'accidents
+            new_table (pd.DataFrame): la table compacte des nouveaux accidents
+
+        Returns:
+            dict: le cube mis à jour
+    """
+    unique_years = np.union1d(cube['years'],
+                              new_table['year'][new_table['year'] > 0].astype(np.int64))
+    communes = np.union1d(cube['communes'],
+                          new_table['commune_id'].to_numpy()).astype(np.int64)
+
+    counts = np.zeros((len(unique_years), 12, 24, len(SEVERITIES), len(communes)), dtype=np.int32)
+    year_positions = np.searchsorted(unique_years, cube['years'])
+    commune_positions = np.searchsorted(communes, cube['communes'])
+    counts[np.ix_(year_positions, range(12), range(24), range(len(SEVERITIES)),
+                  commune_positions)] = cube['counts']
+    counts += count_accidents(new_table, unique_years, communes)
+
+    return {**cube, 'counts': counts, 'years': unique_years, 'communes': communes}
+
+def save_cube(cube: dict, source: str, cache_path: str, depends: tuple = ()) -> None:
+    """
+        Procédure pour sauvegarder le cube, associé à l'état actuel des fichiers sources
+
+        Args:
+            cube (dict): le cube des nombres d'accidents
+            source (str): le chemin du fichier des accidents
+            cache_path (str): le chemin du fichier .npz du cube
+            depends (tuple): les autres fichiers lus pour construire le cube
+
+        Returns:
+            None
+    """
+    makedirs(path.dirname(cache_path) or ".", exist_ok=True)
+    np.savez(cache_path, key=np.array(source_key(source, depends)), **cube)
+
+def load_saved_cube(cache_path: str, key: str = None) -> dict:
+    """
+        Fonction pour lire le cube sauvegardé
+
+        Args:
+            cache_path (str): le chemin du fichier .npz du cube
+            key (str): la clé attendue du fichier source, None pour ne pas la vérifier
+
+        Returns:
+            dict: le cube, None s'il n'existe pas ou ne correspond pas à la clé
+    """
+    if not path.exists(cache_path):
+        return None
+    with np.load(cache_path) as saved:
+        if key is not None and str(saved['key']) != key:
+            return None
+        return {name: saved[name] for name in saved.files if name != 'key'}
+
+def year_position(cube: dict, year: int) -> int:
+    """
+        Fonction pour récupérer la position d'une année sur l'axe des années
+
+        Args:
+            cube (dict): le cube des nombres d'accidents
+            year (int): l'année
+
+        Returns:
+            int: la position de l'année, None si l'année n'est pas dans le cube
+    """
+    positions = np.flatnonzero(cube['years'] == year)
+    return int(positions[0]) if len(positions) else None
+
+def counts_by_month(cube: dict, year: int) -> np.ndarray:
+    """
+        Fonction pour récupérer le nombre d'accidents de chaque mois d'une année
+
+        Args:
+            cube (dict): le cube des nombres d'accidents
+            year (int): l'année
+
+        Returns:
+            np.ndarray: les 12 nombres d'accidents, de janvier à décembre
+    """
+    position = year_position(cube, year)
+    if position is None:
+        return np.zeros(12, dtype=np.int64)
+    return cube['counts'][position].sum(axis=(1, 2, 3))
+
+def counts_by_hour(cube: dict, year: int) -> np.ndarray:
+    """
+        Fonction pour récupérer le nombre d'accidents de chaque heure d'une année
+
+        Args:
+            cube (dict): le cube des nombres d'accidents
+            year (int): l'année
+
+        Returns:
+            np.ndarray: les 24 nombres d'accidents, de 0h à 23h
+    """
+    position = year_position(cube, year)
+    if position is None:
+        return np.zeros(24, dtype=np.int64)
+    return cube['counts'][position].sum(axis=(0, 2, 3))
+
+def counts_by_hour_and_severity(cube: dict) -> np.ndarray:
+    """
+        Fonction pour récupérer le nombre d'accidents par heure et par gravité, toutes années
+
+        Args:
+            cube (dict): le cube des nombres d'accidents
+
+        Returns:
+            np.ndarray: un tableau de 24 lignes (heures) et une colonne par gravité
+    """
+    return cube['counts'].sum(axis=(0, 1, 4))
+
+def counts_by_commune(cube: dict) -> pd.DataFrame:
+    """
+        Fonction pour récupérer le nombre d'accidents par commune, toutes années
+
+        Args:
+            cube (dict): le cube des nombres d'accidents
+
+        Returns:
+            pd.DataFrame: les colonnes 'commune_id' et 'nbAccidents',
+                sans les accidents dont la commune est inconnue
+    """
+    counts = pd.DataFrame({
+        'commune_id': cube['communes'],
+        'nbAccidents': cube['counts'].sum(axis=(0, 1, 2, 3)),
+    })
+    return counts[counts['commune_id'] >= 0].reset_index(drop=True)
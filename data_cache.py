@@ -0,0 +1,315 @@
+"""
+    Cache des jeux de données au format colonne (GeoParquet et Feather).
+    Chaque fichier source est lu une seule fois, avec les dates déjà converties et
+    les colonnes de texte répétitives en catégories, puis écrit dans data/cache/.
+    Les lancements suivants lisent ce cache, tant que le fichier source n'a pas changé.
+"""
+from os import path, makedirs, stat, replace
+import hashlib
+import json
+import time
+import numpy as np
+import pandas as pd
+import geopandas
+
+# Dossier du cache
+CACHE_DIR = "data/cache"
+
+# Si True, un fichier source dont la date a changé est comparé par son contenu (sha256)
+# avant d'invalider le cache, par exemple après un nouveau téléchargement identique
+CACHE_HASH = False
+
+# Fichier des communes, utilisé pour rattacher chaque accident à sa commune
+COMMUNES_SOURCE = "data/communes-92-hauts-de-seine.geojson"
+
+# Format des fichiers du cache, à incrémenter quand les colonnes écrites changent
+# (2 : commune_id en int32) : les caches d'un autre format sont refaits
+CACHE_FORMAT = 2
+
+# Colonnes des accidents stockées en catégories
+ACCIDENT_CATEGORIES = ['commune', 'code_insee', 'type_colli', 'type_acci', 'luminosite']
+
+def file_hash(filepath: str) -> str:
+    """
+        Fonction pour calculer le sha256 d'un fichier, par blocs
+
+        Args:
+            filepath (str): le chemin du fichier
+
+        Returns:
+            str: le sha256 du fichier
+    """
+    sha = hashlib.sha256()
+    with open(filepath, "rb") as file:
+        for block in iter(lambda: file.read(1024 * 1024), b""):
+            sha.update(block)
+    return sha.hexdigest()
+
+def file_infos(filepath: str) -> list:
+    """
+        Fonction pour récupérer la taille et la date de modification d'un fichier
+
+        Args:
+            filepath (str): le chemin du fichier
+
+        Returns:
+            list: la taille et la date de modification (en nanosecondes)
+    """
+    infos = stat(filepath)
+    return [infos.st_size, infos.st_mtime_ns]
+
+def is_cache_valid(source: str, meta_path: str, depends: tuple = ()) -> bool:
+    """
+        Fonction pour savoir si le cache d'un fichier source est à jour
+
+        Args:
+            source (str): le chemin du fichier source
+            meta_path (str): le chemin du fichier qui décrit le cache
+            depends (tuple): les autres fichiers utilisés pour préparer le jeu de données
+
+        Returns:
+            bool: si le cache peut être utilisé
+    """
+    if not path.exists(meta_path):
+        return False
+    with open(meta_path, encoding="utf-8") as file:
+        meta = json.load(file)
+
+    if meta.get('format') != CACHE_FORMAT:
+        return False
+    if meta.get('depends', {}) != {filepath: file_infos(filepath) for filepath in depends}:
+        return False
+
+    infos = stat(source)
+    if meta['size'] != infos.st_size:
+        return False
+    if meta['mtime_ns'] == infos.st_mtime_ns:
+        return True
+    if CACHE_HASH and meta.get('sha256') == file_hash(source):
+        # Même contenu : on garde le cache et on retient la nouvelle date
+        meta['mtime_ns'] = infos.st_mtime_ns
+        write_meta(meta_path, meta)
+        return True
+    return False
+
+def write_meta(meta_path: str, meta: dict) -> None:
+    """
+        Procédure pour écrire le fichier qui décrit le cache
+
+        Args:
+            meta_path (str): le chemin du fichier
+            meta (dict): la description du cache
+
+        Returns:
+            None
+    """
+    with open(f"{meta_path}.tmp", "w", encoding="utf-8") as file:
+        json.dump(meta, file)
+    replace(f"{meta_path}.tmp", meta_path)
+
+def load_cached(source: str, reader, depends: tuple = ()) -> pd.DataFrame:
+    """
+        Fonction pour lire un jeu de données depuis le cache, ou depuis sa source
+        en remplissant le cache
+
+        Args:
+            source (str): le chemin du fichier source
+            reader (function): la fonction qui lit et prépare le fichier source
+            depends (tuple): les autres fichiers lus par reader : le cache est
+                aussi refait quand l'un d'eux change
+
+        Returns:
+            pd.DataFrame: le jeu de données (GeoDataFrame s'il a une géométrie)
+    """
+    name = path.splitext(path.basename(source))[0]
+    meta_path = path.join(CACHE_DIR, f"{name}.json")
+
+    if is_cache_valid(source, meta_path, depends):
+        with open(meta_path, encoding="utf-8") as file:
+            cache_path = json.load(file)['cache']
+        if cache_path.endswith(".parquet"):
+            return geopandas.read_parquet(cache_path)
+        return pd.read_feather(cache_path)
+
+    data = reader(source)
+    write_cache(source, data, depends)
+    return data
+
+def write_cache(source: str, data: pd.DataFrame, depends: tuple = ()) -> None:
+    """
+        Procédure pour écrire le cache d'un jeu de données, associé à l'état actuel
+        de son fichier source et des fichiers dont il dépend
+
+        Args:
+            source (str): le chemin du fichier source
+            data (pd.DataFrame): le jeu de données, tel que lu depuis le fichier source
+            depends (tuple): les autres fichiers lus pour préparer le jeu de données
+
+        Returns:
+            None
+    """
+    name = path.splitext(path.basename(source))[0]
+    meta_path = path.join(CACHE_DIR, f"{name}.json")
+
+    makedirs(CACHE_DIR, exist_ok=True)
+    infos = stat(source)
+    try:
+        if isinstance(data, geopandas.GeoDataFrame):
+            cache_path = path.join(CACHE_DIR, f"{name}.parquet")
+            data.to_parquet(f"{cache_path}.tmp")
+        else:
+            cache_path = path.join(CACHE_DIR, f"{name}.feather")
+            data.reset_index(drop=True).to_feather(f"{cache_path}.tmp")
+    except ImportError:
+        print("pyarrow n'est pas installé, les données ne sont pas mises en cache.")
+        return
+    except (TypeError, ValueError) as e:
+        # pyarrow refuse par exemple les colonnes qui mélangent des nombres et du texte
+        print(f"Impossible de mettre {name} en cache : {e}")
+        return
+    replace(f"{cache_path}.tmp", cache_path)
+
+    write_meta(meta_path, {
+        'source': source,
+        'cache': cache_path,
+        'format': CACHE_FORMAT,
+        'size': infos.st_size,
+        'mtime_ns': infos.st_mtime_ns,
+        'sha256': file_hash(source) if CACHE_HASH else None,
+        'depends': {filepath: file_infos(filepath) for filepath in depends},
+    })
+
+def append_cached(source: str, data: pd.DataFrame, new_data: pd.DataFrame,
+                  depends: tuple = ()) -> pd.DataFrame:
+    """
+        Fonction pour mettre à jour le cache d'un jeu de données dont le fichier source a
+        seulement reçu de nouvelles lignes à sa fin, sans relire tout le fichier : les
+        nouvelles lignes sont ajoutées aux données du cache
+
+        Args:
+            source (str): le chemin du fichier source, déjà complété
+            data (pd.DataFrame): le jeu de données avant l'ajout (lu par load_cached)
+            new_data (pd.DataFrame): les lignes ajoutées, lues par le même reader
+            depends (tuple): les autres fichiers lus pour préparer le jeu de données
+
+        Returns:
+            pd.DataFrame: le jeu de données complet, identique à une nouvelle lecture du fichier
+    """
+    combined = pd.concat([data, new_data], ignore_index=True)
+    # Les catégories sont recalculées sur toute la colonne, comme à la lecture du fichier
+    for column in data.columns:
+        if isinstance(data[column].dtype, pd.CategoricalDtype):
+            combined[column] = combined[column].astype(object).astype('category')
+    write_cache(source, combined, depends)
+    return combined
+
+def data_version(source: str, keep: bool = False) -> str:
+    """
+        Fonction pour récupérer la version des données d'un fichier source.
+        La version change quand le fichier est modifié, sauf si la modification
+        est un ajout incrémental (keep=True) : les caches qui dépendent de la version,
+        comme les cartes sur le disque, ne sont alors invalidés que partiellement.
+
+        Args:
+            source (str): le chemin du fichier source
+            keep (bool): si True, garde la version actuelle malgré la modification
+
+        Returns:
+            str: la version des données
+    """
+    name = path.splitext(path.basename(source))[0]
+    version_path = path.join(CACHE_DIR, f"{name}.version.json")
+    infos = stat(source)
+
+    saved = None
+    if path.exists(version_path):
+        with open(version_path, encoding="utf-8") as file:
+            saved = json.load(file)
+    if saved is not None and (keep or (saved['size'] == infos.st_size
+                                       and saved['mtime_ns'] == infos.st_mtime_ns)):
+        version = saved['version']
+    else:
+        version = str(time.time_ns())
+
+    if saved != {'version': version, 'size': infos.st_size, 'mtime_ns': infos.st_mtime_ns}:
+        makedirs(CACHE_DIR, exist_ok=True)
+        write_meta(version_path, {'version': version, 'size': infos.st_size,
+                                  'mtime_ns': infos.st_mtime_ns})
+    return version
+
+def read_communes(source: str) -> geopandas.GeoDataFrame:
+    """
+        Fonction pour lire le fichier des communes, triées par code INSEE.
+        La position d'une commune dans ce tableau est son identifiant (commune_id).
+
+        Args:
+            source (str): le chemin du fichier des communes
+
+        Returns:
+            geopandas.GeoDataFrame: les communes
+    """
+    communes = geopandas.read_file(source)
+    return communes.sort_values('insee_com', kind='stable').reset_index(drop=True)
+
+def commune_ids(accident: geopandas.GeoDataFrame,
+                communes: geopandas.GeoDataFrame) -> np.ndarray:
+    """
+        Fonction pour trouver la commune de chaque accident, par une jointure spatiale
+        (le point de l'accident dans le polygone de la commune, avec l'index spatial
+        des communes). Un accident hors de toutes les communes garde son code_insee
+        s'il correspond à une commune.
+
+        Args:
+            accident (geopandas.GeoDataFrame): les accidents
+            communes (geopandas.GeoDataFrame): les communes, lues par read_communes
+
+        Returns:
+            np.ndarray: l'identifiant de la commune de chaque accident, -1 si inconnue
+    """
+    points = accident[['geometry']].reset_index(drop=True)
+    polygons = communes[['geometry']]
+    if polygons.crs is not None and points.crs is not None and polygons.crs != points.crs:
+        polygons = polygons.to_crs(points.crs)
+
+    joined = geopandas.sjoin(points, polygons, how='left', predicate='intersects')
+    # Un point sur la limite de deux communes est gardé dans la première
+    joined = joined[~joined.index.duplicated()]
+    ids = joined['index_right'].fillna(-1).to_numpy(dtype=np.int64)
+
+    by_code = pd.Index(communes['insee_com'].astype(str)).get_indexer(
+        accident['code_insee'].astype(str))
+    return np.where(ids >= 0, ids, by_code).astype(np.int32)
+
+def read_accidents(source: str, communes_source: str = COMMUNES_SOURCE) -> geopandas.GeoDataFrame:
+    """
+        Fonction pour lire le fichier des accidents et typer ses colonnes
+
+        Args:
+            source (str): le chemin du fichier des accidents
+            communes_source (str): le chemin du fichier des communes
+
+        Returns:
+            geopandas.GeoDataFrame: les accidents, dates converties, catégories
+                et identifiant de la commune (commune_id)
+    """
+    accident = geopandas.read_file(source)
+    accident['date'] = pd.to_datetime(accident['date'])
+    for column in ACCIDENT_CATEGORIES:
+        accident[column] = accident[column].astype('category')
+    accident['commune_id'] = commune_ids(accident, read_communes(communes_source))
+    return accident
+
+def read_radars(source: str) -> pd.DataFrame:
+    """
+        Fonction pour lire le fichier des radars et typer ses colonnes
+
+        Args:
+            source (str): le chemin du fichier des radars
+
+        Returns:
+            pd.DataFrame: les radars
+    """
+    radars = pd.read_csv(source)
+    for column in ['departement', 'type']:
+        radars[column] = radars[column].astype('category')
+    return radars
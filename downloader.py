@@ -0,0 +1,372 @@
+"""
+    Téléchargement de fichiers avec reprise.
+    Le fichier est téléchargé dans un fichier .part, en plusieurs morceaux (requêtes HTTP
+    Range) en parallèle quand le serveur le permet. L'avancement est sauvegardé pour
+    reprendre un téléchargement interrompu, chaque morceau est réessayé en cas d'erreur,
+    et un fichier déjà téléchargé n'est retéléchargé que s'il a changé (ETag / Last-Modified).
+"""
+from os import path, replace, remove
+from concurrent.futures import ThreadPoolExecutor
+import urllib.request
+import urllib.error
+import http.client
+import threading
+import hashlib
+import json
+import time
+
+# Taille des blocs lus sur le réseau
+CHUNK_SIZE = 1024 * 1024
+
+# Taille minimale d'un morceau pour découper le téléchargement
+MIN_SEGMENT_SIZE = 4 * 1024 * 1024
+
+class RangeIgnored(Exception):
+    """
+        Le serveur annonce les requêtes Range mais renvoie tout le fichier
+    """
+
+def open_url(url: str, headers: dict = None, method: str = "GET", timeout: int = 60):
+    """
+        Fonction pour envoyer une requête HTTP
+
+        Args:
+            url (str): l'url
+            headers (dict): les en-têtes de la requête
+            method (str): la méthode HTTP
+            timeout (int): le temps d'attente maximal en secondes
+
+        Returns:
+            http.client.HTTPResponse: la réponse
+    """
+    request = urllib.request.Request(url, headers=headers or {}, method=method)
+    return urllib.request.urlopen(request, timeout=timeout)
+
+def with_retries(function, retries: int, backoff: float, description: str):
+    """
+        Fonction pour appeler une fonction et la réessayer en cas d'erreur réseau,
+        en attendant de plus en plus longtemps entre deux essais
+
+        Args:
+            function (function): la fonction à appeler, sans argument
+            retries (int): le nombre de nouveaux essais
+            backoff (float): l'attente avant le premier nouvel essai, en secondes
+            description (str): la description de l'opération, pour les messages
+
+        Returns:
+            Le résultat de la fonction
+    """
+    for attempt in range(retries + 1):
+        try:
+            return function()
+        except (urllib.error.URLError, http.client.HTTPException,
+                ConnectionError, TimeoutError) as e:
+            # Les erreurs du client (404, 403...) ne changeront pas en réessayant
+            if (isinstance(e, urllib.error.HTTPError)
+                    and e.code < 500 and e.code not in (408, 429)):
+                raise
+            if attempt == retries:
+                raise
+            wait = backoff * 2 ** attempt
+            print(f"Erreur pendant {description} ({e}), nouvel essai dans {wait:.0f} s...")
+            time.sleep(wait)
+    return None
+
+def read_json(filepath: str) -> dict:
+    """
+        Fonction pour lire un fichier JSON s'il existe
+
+        Args:
+            filepath (str): le chemin du fichier
+
+        Returns:
+            dict: le contenu du fichier, None s'il n'existe pas ou est illisible
+    """
+    if not path.exists(filepath):
+        return None
+    try:
+        with open(filepath, encoding="utf-8") as file:
+            return json.load(file)
+    except ValueError:
+        return None
+
+def write_json(filepath: str, content: dict) -> None:
+    """
+        Procédure pour écrire un fichier JSON sans jamais laisser de fichier à moitié écrit
+
+        Args:
+            filepath (str): le chemin du fichier
+            content (dict): le contenu
+
+        Returns:
+            None
+    """
+    with open(f"{filepath}.tmp", "w", encoding="utf-8") as file:
+        json.dump(content, file)
+    replace(f"{filepath}.tmp", filepath)
+
+def probe(url: str, headers: dict, timeout: int) -> dict:
+    """
+        Fonction pour récupérer les informations d'un fichier distant sans le télécharger
+
+        Args:
+            url (str): l'url du fichier
+            headers (dict): les en-têtes de la requête (conditions ETag / Last-Modified)
+            timeout (int): le temps d'attente maximal en secondes
+
+        Returns:
+            dict: le statut, la taille, le support des requêtes Range, l'ETag et la date
+    """
+    try:
+        with open_url(url, headers, method="HEAD", timeout=timeout) as response:
+            size = response.headers.get("Content-Length")
+            return {
+                'status': response.status,
+                'size': int(size) if size is not None else None,
+                'ranges': response.headers.get("Accept-Ranges", "").lower() == "bytes",
+                'etag': response.headers.get("ETag"),
+                'last_modified': response.headers.get("Last-Modified"),
+            }
+    except urllib.error.HTTPError as e:
+        if e.code == 304:
+            return {'status': 304}
+        if e.code < 500 and e.code not in (408, 429):
+            # Le serveur refuse HEAD : on téléchargera d'un seul bloc
+            return {'status': e.code, 'size': None, 'ranges': False,
+                    'etag': None, 'last_modified': None}
+        raise
+
+class Progress:
+    """
+        Affichage de l'avancement d'un téléchargement, partagé entre les morceaux
+    """
+
+    def __init__(self, filename: str, total: int, done: int = 0) -> None:
+        """
+            Crée l'avancement
+
+            Args:
+                filename (str): le nom du fichier, pour les messages
+                total (int): la taille totale, None si elle est inconnue
+                done (int): le nombre d'octets déjà téléchargés
+        """
+        self.filename = filename
+        self.total = total
+        self.done = done
+        self._next_step = (done * 100 // total // 10 + 1) * 10 if total else 10
+        self._lock = threading.Lock()
+
+    def add(self, size: int) -> None:
+        """
+            Procédure pour ajouter des octets téléchargés et afficher chaque palier de 10 %
+
+            Args:
+                size (int): le nombre d'octets
+
+            Returns:
+                None
+        """
+        with self._lock:
+            self.done += size
+            if not self.total:
+                return
+            percent = self.done * 100 // self.total
+            if percent >= self._next_step:
+                print(f"{self.filename} : {percent} % ({self.done // (1024 * 1024)} Mo)")
+                self._next_step = (percent // 10 + 1) * 10
+
+def download_segment(url: str, part_path: str, segment: dict, state: dict,
+                     lock: threading.Lock, progress: Progress, timeout: int) -> None:
+    """
+        Procédure pour télécharger un morceau du fichier avec une requête Range,
+        en reprenant là où le morceau s'était arrêté
+
+        Args:
+            url (str): l'url du fichier
+            part_path (str): le chemin du fichier .part
+            segment (dict): le morceau ('start', 'end' inclus, 'done' octets déjà écrits)
+            state (dict): l'état du téléchargement, sauvegardé après chaque bloc
+            lock (threading.Lock): le verrou de l'état
+            progress (Progress): l'avancement du téléchargement
+            timeout (int): le temps d'attente maximal en secondes
+
+        Returns:
+            None
+    """
+    length = segment['end'] - segment['start'] + 1
+    if segment['done'] >= length:
+        return
+    headers = {"Range": f"bytes={segment['start'] + segment['done']}-{segment['end']}"}
+    if state['etag']:
+        headers["If-Range"] = state['etag']
+
+    with open_url(url, headers, timeout=timeout) as response:
+        if response.status != 206:
+            # Pas une erreur réseau : réessayer ne changerait rien
+            raise RangeIgnored("le serveur n'a pas renvoyé le morceau demandé")
+        with open(part_path, "r+b") as file:
+            file.seek(segment['start'] + segment['done'])
+            while segment['done'] < length:
+                block = response.read(min(CHUNK_SIZE, length - segment['done']))
+                if not block:
+                    raise ConnectionError("connexion interrompue")
+                file.write(block)
+                with lock:
+                    segment['done'] += len(block)
+                    write_json(f"{part_path}.json", state)
+                progress.add(len(block))
+
+def download_stream(url: str, part_path: str, state: dict, progress: Progress,
+                    timeout: int) -> None:
+    """
+        Procédure pour télécharger le fichier d'un seul bloc, en reprenant la fin
+        du fichier .part si le serveur accepte les requêtes Range
+
+        Args:
+            url (str): l'url du fichier
+            part_path (str): le chemin du fichier .part
+            state (dict): l'état du téléchargement
+            progress (Progress): l'avancement du téléchargement
+            timeout (int): le temps d'attente maximal en secondes
+
+        Returns:
+            None
+    """
+    done = path.getsize(part_path) if path.exists(part_path) else 0
+    headers = {}
+    if done and state['ranges']:
+        headers["Range"] = f"bytes={done}-"
+        if state['etag']:
+            headers["If-Range"] = state['etag']
+
+    with open_url(url, headers, timeout=timeout) as response:
+        if response.status == 206:
+            mode = "ab"
+        else:
+            # Le serveur renvoie tout le fichier : on repart de zéro
+            mode = "wb"
+            progress.add(-done)
+        with open(part_path, mode) as file:
+            for block in iter(lambda: response.read(CHUNK_SIZE), b""):
+                file.write(block)
+                progress.add(len(block))
+
+def file_sha256(filepath: str) -> str:
+    """
+        Fonction pour calculer le sha256 d'un fichier
+
+        Args:
+            filepath (str): le chemin du fichier
+
+        Returns:
+            str: le sha256 du fichier
+    """
+    sha = hashlib.sha256()
+    with open(filepath, "rb") as file:
+        for block in iter(lambda: file.read(CHUNK_SIZE), b""):
+            sha.update(block)
+    return sha.hexdigest()
+
+def download(url: str, filepath: str, segments: int = 4, retries: int = 5,
+             backoff: float = 2.0, timeout: int = 60, sha256: str = None) -> bool:
+    """
+        Fonction pour télécharger un fichier avec reprise, morceaux parallèles et
+        nouveaux essais, seulement s'il a changé depuis le dernier téléchargement
+
+        Args:
+            url (str): l'url du fichier
+            filepath (str): le chemin du fichier
+            segments (int): le nombre maximal de morceaux téléchargés en parallèle
+            retries (int): le nombre de nouveaux essais par morceau
+            backoff (float): l'attente avant le premier nouvel essai, en secondes
+            timeout (int): le temps d'attente maximal d'une requête en secondes
+            sha256 (str): le sha256 attendu du fichier, None pour ne pas le vérifier
+
+        Returns:
+            bool: True si le fichier a été téléchargé, False s'il n'a pas changé
+    """
+    filename = path.basename(filepath)
+    part_path = f"{filepath}.part"
+    meta_path = f"{filepath}.meta.json"
+
+    # Conditions pour ne pas retélécharger un fichier qui n'a pas changé
+    headers = {}
+    meta = read_json(meta_path) if path.exists(filepath) else None
+    if meta is not None:
+        if meta.get('etag'):
+            headers["If-None-Match"] = meta['etag']
+        if meta.get('last_modified'):
+            headers["If-Modified-Since"] = meta['last_modified']
+
+    infos = with_retries(lambda: probe(url, headers, timeout), retries, backoff,
+                         f"la connexion à {filename}")
+    if infos['status'] == 304:
+        print(f"{filename} n'a pas changé, pas de nouveau téléchargement.")
+        return False
+
+    # Reprise d'un téléchargement interrompu, si le fichier distant est le même
+    state = read_json(f"{part_path}.json")
+    if (state is None or not path.exists(part_path) or state['url'] != url
+            or state['size'] != infos['size'] or state['etag'] != infos['etag']
+            or state['last_modified'] != infos['last_modified']):
+        state = {'url': url, **{key: infos[key] for key in
+                                ('size', 'ranges', 'etag', 'last_modified')},
+                 'segments': []}
+        if path.exists(part_path):
+            remove(part_path)
+    elif state['segments'] or path.getsize(part_path):
+        print(f"Reprise du téléchargement de {filename}...")
+
+    size = state['size']
+    lock = threading.Lock()
+    segmented = bool(size and state['ranges'] and segments > 1)
+    if segmented:
+        if not state['segments']:
+            count = max(1, min(segments, size // MIN_SEGMENT_SIZE))
+            bounds = [size * i // count for i in range(count + 1)]
+            state['segments'] = [{'start': bounds[i], 'end': bounds[i + 1] - 1, 'done': 0}
+                                 for i in range(count)]
+            with open(part_path, "wb") as file:
+                file.truncate(size)
+            write_json(f"{part_path}.json", state)
+        progress = Progress(filename, size, sum(s['done'] for s in state['segments']))
+        try:
+            with ThreadPoolExecutor(max_workers=len(state['segments'])) as executor:
+                futures = [
+                    executor.submit(with_retries,
+                                    lambda segment=segment: download_segment(
+                                        url, part_path, segment, state, lock, progress, timeout),
+                                    retries, backoff, f"le téléchargement de {filename}")
+                    for segment in state['segments']
+                ]
+                for future in futures:
+                    future.result()
+        except RangeIgnored:
+            # Le fichier est alors téléchargé d'un seul bloc, depuis le début
+            print(f"Le serveur de {filename} ignore les requêtes Range, "
+                  "téléchargement d'un seul bloc...")
+            state['ranges'] = False
+            state['segments'] = []
+            remove(part_path)
+            segmented = False
+    if not segmented:
+        write_json(f"{part_path}.json", state)
+        progress = Progress(filename, size,
+                            path.getsize(part_path) if path.exists(part_path) else 0)
+        with_retries(lambda: download_stream(url, part_path, state, progress, timeout),
+                     retries, backoff, f"le téléchargement de {filename}")
+
+    # Vérification de l'intégrité du fichier avant de le mettre à sa place
+    if size is not None and path.getsize(part_path) != size:
+        raise ConnectionError(f"{filename} est incomplet "
+                              f"({path.getsize(part_path)} octets sur {size})")
+    if sha256 is not None and file_sha256(part_path) != sha256.lower():
+        remove(part_path)
+        remove(f"{part_path}.json")
+        raise ValueError(f"Le sha256 de {filename} ne correspond pas")
+
+    replace(part_path, filepath)
+    remove(f"{part_path}.json")
+    write_json(meta_path, {'url': url, 'size': path.getsize(filepath),
+                           'etag': state['etag'], 'last_modified': state['last_modified']})
+    return True
@@ -0,0 +1,127 @@
+"""
+    Points des cartes servis au format GeoJSON, pour la seule zone visible.
+    Chaque couche (accidents, radars, auto-écoles) garde en mémoire ses coordonnées,
+    les propriétés de ses points et un STRtree : une requête avec une bbox ne renvoie
+    que les points de la zone. Les réponses sont compressées (gzip) et portent un ETag
+    faible (le même pour la réponse compressée ou non), pour que le navigateur ne
+    retélécharge pas des points qu'il a déjà.
+"""
+import gzip
+import hashlib
+import json
+import numpy as np
+import pandas as pd
+import shapely
+from shapely import STRtree
+from flask import Response, request
+from markers import to_feature_collection
+
+# Taille minimale d'une réponse pour qu'elle soit compressée
+GZIP_MIN_SIZE = 1024
+
+class GeoLayer:
+    """
+        Points d'une couche de la carte, avec leur index spatial
+
+        Args:
+            latitudes: les latitudes des points
+            longitudes: les longitudes des points
+            properties (pd.DataFrame): les propriétés de chaque point (popup et icône)
+    """
+    def __init__(self, latitudes, longitudes, properties: pd.DataFrame):
+        self.latitudes = np.asarray(latitudes, dtype=float)
+        self.longitudes = np.asarray(longitudes, dtype=float)
+        self.properties = properties.reset_index(drop=True)
+        self.tree = STRtree(shapely.points(self.longitudes, self.latitudes))
+
+    def positions(self, bbox: tuple = None) -> np.ndarray:
+        """
+            Fonction pour récupérer les positions des points d'une zone
+
+            Args:
+                bbox (tuple): la zone (longitude min, latitude min, longitude max,
+                    latitude max), None pour tous les points
+
+            Returns:
+                np.ndarray: les positions des points, triées
+        """
+        if bbox is None:
+            return np.arange(len(self.properties))
+        return np.sort(self.tree.query(shapely.box(*bbox)))
+
+    def feature_collection(self, positions: np.ndarray) -> dict:
+        """
+            Fonction pour assembler la FeatureCollection de certains points.
+            Les valeurs manquantes (NaN, NaT) deviennent null, et un point sans coordonnées
+            n'a pas de géométrie : NaN n'existe pas en JSON.
+
+            Args:
+                positions (np.ndarray): les positions des points
+
+            Returns:
+                dict: la FeatureCollection
+        """
+        latitudes, longitudes = self.latitudes[positions], self.longitudes[positions]
+        properties = self.properties.iloc[positions]
+        properties = properties.astype(object).where(properties.notna(), None)
+        collection = to_feature_collection(latitudes, longitudes, properties)
+        for position in np.flatnonzero(~(np.isfinite(latitudes) & np.isfinite(longitudes))):
+            collection['features'][position]['geometry'] = None
+        return collection
+
+def parse_bbox(text: str) -> tuple:
+    """
+        Fonction pour lire le paramètre bbox ("ouest,sud,est,nord", format de Leaflet)
+
+        Args:
+            text (str): le paramètre, None s'il est absent
+
+        Returns:
+            tuple: la zone, None si le paramètre est absent
+    """
+    if text is None:
+        return None
+    bbox = tuple(float(value) for value in text.split(","))
+    if len(bbox) != 4 or bbox[0] > bbox[2] or bbox[1] > bbox[3] or not np.isfinite(bbox).all():
+        raise ValueError(f"bbox invalide : {text}")
+    return bbox
+
+def make_etag(*parts) -> str:
+    """
+        Fonction pour calculer l'ETag d'une réponse à partir de ce qui la détermine
+        (version des données, couche, paramètres), sans construire la réponse
+
+        Args:
+            *parts: les éléments qui déterminent la réponse
+
+        Returns:
+            str: l'ETag
+    """
+    return hashlib.sha1("|".join(str(part) for part in parts).encode("utf-8")).hexdigest()[:24]
+
+def geojson_response(build, etag: str) -> Response:
+    """
+        Fonction pour répondre à une requête GeoJSON : 304 si le navigateur a déjà
+        la réponse, sinon la FeatureCollection, compressée si le navigateur l'accepte
+
+        Args:
+            build (function): la fonction qui construit la FeatureCollection
+            etag (str): l'ETag de la réponse, envoyé en ETag faible : les réponses
+                compressée et non compressée ont le même contenu, mais pas les mêmes octets
+
+        Returns:
+            flask.Response: la réponse
+    """
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        body = json.dumps(build(), ensure_ascii=False, separators=(',', ':'),
+                          allow_nan=False).encode("utf-8")
+        response = Response(body, mimetype="application/geo+json")
+        if len(body) >= GZIP_MIN_SIZE and "gzip" in request.accept_encodings:
+            response.set_data(gzip.compress(body, compresslevel=6))
+            response.headers["Content-Encoding"] = "gzip"
+    response.set_etag(etag, weak=True)
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["Vary"] = "Accept-Encoding"
+    return response
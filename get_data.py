@@ -1,44 +1,82 @@
 """
     Script pour récupérer les données des accidents
-    radars, communes et auto écoles
+    radars, communes et auto écoles.
+    Le téléchargement, le scraping (selenium) et fiona ne sont importés que lorsque
+    des données doivent vraiment être récupérées : le dashboard importe ce module
+    à chaque démarrage, même quand tous les fichiers sont déjà là.
 """
-from os import path, makedirs
-from concurrent.futures import ThreadPoolExecutor
-import urllib.request
+from os import path, makedirs, replace, remove
+from concurrent.futures import ProcessPoolExecutor
+from collections import Counter
+from itertools import chain
+from urllib.parse import quote
+import argparse
 import asyncio
 import ssl
+import pandas as pd
 import geopandas
-from scraping import get_scraping_data
+from data_cache import (load_cached, append_cached, read_accidents, read_communes, read_radars,
+                        data_version, COMMUNES_SOURCE)
+from pipeline import Pipeline
+from cube import source_key, load_saved_cube, add_to_cube, save_cube
+from map_cache import MapCache
+from compact import build_compact_table
+from accident_store import is_store_valid, append_to_store
 
 # Pour éviter les erreurs de certificat sur le réseau de l'ESIEE
 # Source:
 # https://stackoverflow.com/questions/27835619/urllib-and-ssl-certificate-verify-failed-error
 ssl._create_default_https_context = ssl._create_unverified_context
 
+# Export des accidents du 92 (API Opendatasoft)
+ACCIDENTS_URL = (
+    "https://opendata.hauts-de-seine.fr/api/explore/v2.1/catalog/datasets/"
+    "accidents-corporels-de-la-circulation-routiere/exports/geojson?lang=fr&timezone=Europe%2FBerlin"
+)
+
+# Jeux de données du dashboard : fichier, fonction de lecture et autres fichiers lus
+DATASETS = {
+    'accidents': ("data/light_accidents.geojson", read_accidents, (COMMUNES_SOURCE,)),
+    'communes': (COMMUNES_SOURCE, read_communes, ()),
+    'driving_schools': ("data/driving_schools.geojson", geopandas.read_file, ()),
+    'radars': ("data/radars.csv", read_radars, ()),
+}
+
 # Fonction pour récupérer les données des accidents, des radars, des communes et des auto écoles
-async def get_data() -> None:
+async def get_data(datasets: list = None, files: list = ()) -> dict:
     """
-        Procédure pour récupérer les données des accidents,
-        radars, communes et auto écoles
+        Fonction pour récupérer les données des accidents,
+        radars, communes et auto écoles.
+        Chaque jeu de données suit ses étapes (téléchargement, allègement, mise en cache)
+        dès que les précédentes sont finies, en parallèle des autres jeux de données.
+
+        Args:
+            datasets (list): les jeux de données à attendre (voir DATASETS), None pour tous
+            files (list): les étapes des fichiers à attendre en plus, sans les mettre en
+                cache (par exemple "light_accidents", lu par le stockage par période)
 
         Returns:
-            None
+            dict: chaque jeu de données attendu, lu depuis le cache
     """
     makedirs("data/", exist_ok=True)
+    datasets = list(DATASETS) if datasets is None else datasets
 
-    with ThreadPoolExecutor(max_workers=3) as executor:
-        if not path.exists("data/big_accidents.geojson"):
-            executor.submit(
-                get_data_from_internet,
-                "https://opendata.hauts-de-seine.fr/api/explore/v2.1/catalog/datasets/accidents-corporels-de-la-circulation-routiere/exports/geojson?lang=fr&timezone=Europe%2FBerlin",
-                "data/big_accidents.geojson",
-                "big_accidents",
-                True)
+    with ProcessPoolExecutor(max_workers=1) as processes:
+        pipeline = Pipeline(processes)
+
+        if not path.exists("data/big_accidents.geojson") and \
+           not path.exists("data/light_accidents.geojson"):
+            pipeline.add("big_accidents", get_data_from_internet,
+                         ACCIDENTS_URL, "data/big_accidents.geojson", "big_accidents", True)
         else:
             print("Le fichier big_accidents existe déjà !")
+        if not path.exists("data/light_accidents.geojson"):
+            # L'allègement est un calcul lourd, fait dans un autre processus
+            pipeline.add("light_accidents", lighten_data, depends=("big_accidents",), process=True)
 
         if not path.exists("data/communes-92-hauts-de-seine.geojson"):
-            executor.submit(
+            pipeline.add(
+                "communes-92-hauts-de-seine",
                 get_data_from_internet,
                 ("https://opendata.hauts-de-seine.fr/api/explore/v2.1/catalog/datasets/"
                 "communes/exports/geojson?lang=fr&timezone=Europe/Berlin"),
@@ -49,12 +87,15 @@ async def get_data() -> None:
             print("Le fichier communes-92-hauts-de-seine existe déjà !")
 
         if not path.exists("data/driving_schools.geojson"):
-            executor.submit(get_scraping_data)
+            # selenium n'est importé que si le scraping doit être fait
+            from scraping import get_scraping_data
+            pipeline.add("driving_schools", get_scraping_data)
         else:
             print("Le fichier driving_schools existe déjà !")
 
         if not path.exists("data/radars.csv"):
-            executor.submit(
+            pipeline.add(
+                "radars",
                 get_data_from_internet,
                 "https://www.data.gouv.fr/fr/datasets/r/8a22b5a8-4b65-41be-891a-7c0aead4ba51",
                 "data/radars.csv",
@@ -63,40 +104,246 @@ async def get_data() -> None:
         else:
             print("Le fichier radars existe déjà !")
 
-def lighten_data() -> None:
+        # Mise en cache de chaque jeu de données dès que son fichier est prêt
+        for name in datasets:
+            source, reader, depends = DATASETS[name]
+            file_stages = tuple(path.splitext(path.basename(filepath))[0]
+                                for filepath in (source,) + depends)
+            pipeline.add(f"cache {name}", load_cached, source, reader, depends,
+                         depends=file_stages)
+
+        # Les fichiers déjà présents n'ont pas d'étape : il n'y a rien à attendre
+        waited_files = [name for name in files if name in pipeline.tasks]
+        try:
+            results = await pipeline.wait([f"cache {name}" for name in datasets] + waited_files)
+            return {name: results[f"cache {name}"] for name in datasets}
+        finally:
+            print("Temps de chaque étape :")
+            pipeline.report()
+
+# Colonnes gardées dans le fichier léger des accidents (en plus de la géométrie)
+LIGHT_COLUMNS = [
+    'date','heure', 'commune', 'code_insee',
+    'type_colli', 'type_acci', 'luminosite', 'adresse'
+]
+
+def lighten_data(source: str = "data/big_accidents.geojson",
+                 destination: str = "data/light_accidents.geojson",
+                 chunk_size: int = 10000) -> None:
     """
         Procédure pour alléger le fichier big_accidents
+        Les accidents sont lus au fil de l'eau et écrits par paquets de chunk_size,
+        la mémoire utilisée dépend donc de chunk_size et non de la taille du fichier
+
+        Args:
+            source (str): le chemin du fichier lourd
+            destination (str): le chemin du fichier léger
+            chunk_size (int): le nombre d'accidents écrits à la fois
 
         Returns:
             None
     """
-    print("Lecture du fichier big_accidents (Cela peut prendre quelques temps, fichiers lourds)...")
-    accident = geopandas.read_file("data/big_accidents.geojson")
-
-    print("Création du fichier léger de big_accidents...")
-    new_columns = [
-        'date','heure', 'commune', 'geometry', 'code_insee',
-        'type_colli', 'type_acci', 'luminosite', 'adresse'
-    ]
-    accident = accident[new_columns]
-    accident.to_file("data/light_accidents.geojson", driver='GeoJSON')
+    import fiona
+    from fiona.errors import DriverError
+    from fiona.model import Feature, Properties
+
+    print("Création du fichier léger de big_accidents (lecture au fil de l'eau)...")
+    try:
+        # Seules les colonnes gardées sont lues, si fiona (>= 1.9) et le format le permettent
+        source_file = fiona.open(source, include_fields=LIGHT_COLUMNS)
+    except (TypeError, DriverError):
+        source_file = fiona.open(source)
+
+    with source_file:
+        properties = source_file.schema['properties']
+        schema = {
+            'geometry': source_file.schema['geometry'],
+            'properties': {column: properties[column] for column in LIGHT_COLUMNS},
+        }
+        features = (
+            Feature(geometry=feature.geometry,
+                    properties=Properties.from_dict(
+                        {column: feature.properties[column] for column in LIGHT_COLUMNS}))
+            for feature in source_file
+        )
+        write_features(destination, schema, source_file.crs, features, chunk_size)
+
     print("big_accidents allégé !")
 
+def write_features(destination: str, schema: dict, crs, features, chunk_size: int,
+                   rename: bool = True) -> None:
+    """
+        Procédure pour écrire des points dans un fichier GeoJSON, par paquets de chunk_size.
+        Le fichier est écrit à côté (destination.tmp) puis renommé : il n'existe que s'il est complet.
+
+        Args:
+            destination (str): le chemin du fichier GeoJSON
+            schema (dict): le schéma fiona du fichier
+            crs: le système de coordonnées du fichier
+            features: les points à écrire (un itérable, lu au fil de l'eau)
+            chunk_size (int): le nombre de points écrits à la fois
+            rename (bool): si False, le fichier reste en destination.tmp et c'est à
+                l'appelant de le renommer (quand destination est encore ouvert en lecture)
+
+        Returns:
+            None
+    """
+    import fiona
+
+    with fiona.open(f"{destination}.tmp", "w", driver="GeoJSON",
+                    crs=crs, schema=schema) as destination_file:
+        chunk = []
+        for feature in features:
+            chunk.append(feature)
+            if len(chunk) >= chunk_size:
+                destination_file.writerecords(chunk)
+                chunk = []
+        destination_file.writerecords(chunk)
+
+    if rename:
+        replace(f"{destination}.tmp", destination)
+
+def unknown_accidents(new_accidents: geopandas.GeoDataFrame,
+                      known: geopandas.GeoDataFrame) -> list:
+    """
+        Fonction pour repérer les accidents qui ne sont pas déjà enregistrés,
+        comparés par date, heure, commune et position
+
+        Args:
+            new_accidents (geopandas.GeoDataFrame): les accidents téléchargés
+            known (geopandas.GeoDataFrame): les accidents déjà enregistrés des mêmes jours
+
+        Returns:
+            list: pour chaque accident téléchargé, True s'il n'est pas encore enregistré
+    """
+    def keys(accidents: geopandas.GeoDataFrame) -> list:
+        return list(zip(accidents['date'].dt.strftime('%Y-%m-%d'), accidents['heure'].astype(str),
+                        accidents['code_insee'].astype(str),
+                        accidents.geometry.x.round(7), accidents.geometry.y.round(7)))
+
+    # Deux accidents identiques peuvent exister : chacun n'en retire qu'un seul
+    remaining = Counter(keys(known))
+    unknown = []
+    for key in keys(new_accidents):
+        unknown.append(remaining[key] == 0)
+        if remaining[key]:
+            remaining[key] -= 1
+    return unknown
+
+def refresh_accidents(light_path: str = "data/light_accidents.geojson",
+                      cube_path: str = "data/cache/accident_cube.npz",
+                      map_cache_dir: str = None, store_dir: str = None) -> list:
+    """
+        Fonction pour ajouter au fichier léger uniquement les accidents publiés depuis
+        le dernier jour déjà enregistré (ce jour compris, sans les accidents déjà
+        enregistrés), puis mettre à jour les caches sans tout relire : les nouveaux
+        accidents sont ajoutés au cache du jeu de données, au cube et aux seules périodes
+        du stockage concernées, et seules les cartes des mois concernés sont retirées.
+        Si le fichier léger n'a aucun accident daté, tout le fichier est retéléchargé.
+
+        Args:
+            light_path (str): le chemin du fichier léger des accidents
+            cube_path (str): le chemin du cube des nombres d'accidents
+            map_cache_dir (str): le dossier du cache des cartes, None s'il est désactivé
+            store_dir (str): le dossier du stockage par période, None s'il est désactivé
+
+        Returns:
+            list: les (année, mois) qui ont reçu de nouveaux accidents
+    """
+    import fiona
+    from downloader import download
+
+    print("Mise à jour incrémentale des accidents...")
+    # Version et clé des données avant l'ajout, pour ne mettre à jour que les caches à jour
+    data_version(light_path)
+    old_key = source_key(light_path, (COMMUNES_SOURCE,))
+    with fiona.open(light_path) as light_file:
+        empty = len(light_file) == 0
+    # Un fichier sans accident n'a pas de colonnes à lire
+    accidents = None if empty else load_cached(light_path, read_accidents, (COMMUNES_SOURCE,))
+    latest = pd.NaT if empty else accidents['date'].max()
+    if pd.isna(latest):
+        # Fichier vide ou sans date : il n'y a pas de dernier jour à partir duquel compléter
+        print("Aucun accident daté dans le fichier léger, téléchargement complet...")
+        get_data_from_internet(ACCIDENTS_URL, "data/big_accidents.geojson", "big_accidents", True)
+        lighten_data("data/big_accidents.geojson", light_path)
+        dates = load_cached(light_path, read_accidents, (COMMUNES_SOURCE,))['date'].dropna()
+        return sorted(set(zip(dates.dt.year, dates.dt.month)))
+    # Le stockage n'est complété que s'il est à jour avec le fichier d'avant l'ajout
+    store_valid = store_dir is not None and is_store_valid(store_dir, light_path, COMMUNES_SOURCE)
+
+    # Seuls les accidents depuis le dernier jour enregistré sont exportés : ce jour est
+    # redemandé, car des accidents peuvent être publiés après les autres du même jour
+    where = f"date >= date'{latest:%Y-%m-%d}'"
+    download(f"{ACCIDENTS_URL}&where={quote(where)}", "data/new_accidents.geojson")
+    with fiona.open("data/new_accidents.geojson") as new_file:
+        count = len(new_file)
+    if count:
+        lighten_data("data/new_accidents.geojson", "data/new_light_accidents.geojson")
+    for filepath in ["data/new_accidents.geojson", "data/new_accidents.geojson.meta.json"]:
+        if path.exists(filepath):
+            remove(filepath)
+    if count:
+        new_accidents = read_accidents("data/new_light_accidents.geojson")
+        known = accidents[accidents['date'] >= min(latest, new_accidents['date'].min())]
+        unknown = unknown_accidents(new_accidents, known)
+        count = sum(unknown)
+    if not count:
+        if path.exists("data/new_light_accidents.geojson"):
+            remove("data/new_light_accidents.geojson")
+        print(f"Aucun nouvel accident depuis le {latest:%d/%m/%Y}, rien à mettre à jour.")
+        return []
+
+    new_accidents = new_accidents[unknown].reset_index(drop=True)
+    with fiona.open(light_path) as light_file, \
+         fiona.open("data/new_light_accidents.geojson") as new_file:
+        new_features = (feature for feature, is_new in zip(new_file, unknown) if is_new)
+        write_features(light_path, light_file.schema, light_file.crs,
+                       chain(light_file, new_features), 10000, rename=False)
+    # Le fichier léger n'est remplacé qu'une fois fermé (impossible sous Windows sinon)
+    replace(f"{light_path}.tmp", light_path)
+    remove("data/new_light_accidents.geojson")
+
+    # Le cache du jeu de données et le stockage reçoivent les seuls nouveaux accidents : le
+    # prochain démarrage ne relit pas le fichier et ne refait pas la jointure des communes
+    append_cached(light_path, accidents, new_accidents, (COMMUNES_SOURCE,))
+    if store_valid:
+        append_to_store(store_dir, new_accidents, light_path, COMMUNES_SOURCE)
+
+    partitions = sorted(set(zip(new_accidents['date'].dt.year, new_accidents['date'].dt.month)))
+
+    # Le cube est complété avec les seuls nouveaux accidents (ceux du dernier jour déjà
+    # enregistrés ont été retirés, ils ne sont pas comptés deux fois), sans tout recompter
+    cube = load_saved_cube(cube_path, old_key)
+    if cube is not None:
+        save_cube(add_to_cube(cube, build_compact_table(new_accidents)), light_path, cube_path,
+                  (COMMUNES_SOURCE,))
+
+    # Les cartes des autres mois restent valables : seule celles des mois concernés sont retirées
+    version = data_version(light_path, keep=True)
+    if map_cache_dir is not None:
+        MapCache(cache_dir=map_cache_dir, version=version).invalidate(partitions)
+
+    print(f"{len(new_accidents)} nouveaux accidents ajoutés, mois mis à jour : "
+          + ", ".join(f"{month:02d}/{year}" for year, month in partitions))
+    return partitions
+
 
 def get_data_from_internet(url: str, filepath: str, filename: str, lourd: bool) -> None:
     """
         Procédure pour télécharger un fichier depuis internet
-        Si le fichier est lourd, on allège le fichier
 
         Args:
             url (str): l'url du fichier à télécharger
             filepath (str): le chemin du fichier
             filename (str): le nom du fichier
-            lourd (bool): si le fichier est lourd ou non
+            lourd (bool): si le fichier est lourd ou non (seulement pour le message)
 
         Returns:
             None
     """
+    from downloader import download
+
     if lourd:
         print(
             f"Début du téléchargement de {filename} "
@@ -104,10 +351,19 @@ def get_data_from_internet(url: str, filepath: str, filename: str, lourd: bool)
         )
     else:
         print(f"Début du téléchargement de {filename} (fichier léger)...")
-    urllib.request.urlretrieve(url, filepath)
+    download(url, filepath)
     print(f"Fin du téléchargement de {filename}!")
-    if lourd:
-        lighten_data()
 
 if __name__ == "__main__":
-    asyncio.run(get_data())
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--refresh", action="store_true",
+                        help="ajoute seulement les nouveaux accidents aux données existantes")
+    parser.add_argument("--map-cache-dir", default=None,
+                        help="dossier du cache des cartes à mettre à jour avec --refresh")
+    parser.add_argument("--store-dir", default=None,
+                        help="dossier du stockage par période à mettre à jour avec --refresh")
+    arguments = parser.parse_args()
+    if arguments.refresh:
+        refresh_accidents(map_cache_dir=arguments.map_cache_dir, store_dir=arguments.store_dir)
+    else:
+        asyncio.run(get_data())
@@ -0,0 +1,23 @@
+"""
+    Configuration de gunicorn pour servir le dashboard avec plusieurs processus.
+    Les variables d'environnement DASHBOARD_BIND, DASHBOARD_WORKERS et DASHBOARD_THREADS
+    remplacent les valeurs par défaut.
+"""
+from os import environ
+import multiprocessing
+
+# Application WSGI, créée par la fabrique de wsgi.py
+wsgi_app = "wsgi:create_app()"
+
+# Adresse d'écoute du serveur
+bind = environ.get("DASHBOARD_BIND", "0.0.0.0:8050")
+
+# Un worker par cœur, chacun avec quelques threads pour les requêtes qui attendent
+workers = int(environ.get("DASHBOARD_WORKERS", multiprocessing.cpu_count()))
+threads = int(environ.get("DASHBOARD_THREADS", 2))
+
+# Données chargées une seule fois dans le maître puis partagées par fork avec les workers
+preload_app = True
+
+# Le rendu d'une carte peut être long la première fois
+timeout = 120
@@ -2,16 +2,36 @@
     Programme principal qui crée le dashboard
 """
 import time
+import json
 import random
 import asyncio
 import calendar
+from functools import lru_cache
 import geopandas
+import numpy as np
 import pandas as pd
-import folium
-from dash import Dash, dcc, html, Input, Output, State
+from dash import Dash, dcc, html, Input, Output, State, ClientsideFunction, Patch
 import plotly.graph_objects as go
-import plotly.express as px
-from get_data import get_data
+import plotly.io as pio
+from get_data import get_data, refresh_accidents, DATASETS
+from os import path
+from flask import jsonify, request, abort, Response
+from partitions import (build_partition_index, select_partition, get_positions,
+                        get_years, get_months)
+from cube import (load_or_build_cube, load_saved_cube, save_cube, source_key, counts_by_month,
+                  counts_by_hour, counts_by_hour_and_severity, counts_by_commune)
+from map_cache import MapCache, warm_up
+from data_cache import load_cached, data_version, COMMUNES_SOURCE
+from accident_store import open_store
+# Les couches des cartes (marker_layers.py), folium et plotly.express ne sont importés
+# qu'à leur première utilisation, pour démarrer plus vite
+from markers import (choose_render_mode, accident_properties, radar_properties,
+                     driving_school_properties)
+from geo_api import GeoLayer, parse_bbox, make_etag, geojson_response
+from compact import build_compact_table, memory_report
+from artifact_cache import content_hash, cached_artifact
+from metrics import METRICS
+from proximity import project_points, build_radar_index, accidents_near_radars, nearest_radars
 
 app = Dash(__name__)
 
@@ -37,6 +57,116 @@ couleurs_par_commune = {commune: random.choice(list(couleurs_acceptees))
 # Couleur de fond
 BG_COLOR = '#FCF5ED'
 
+# Cache des cartes rendues : nombre de cartes et taille maximale gardées en mémoire
+MAP_CACHE_ENTRIES = 64
+MAP_CACHE_BYTES = 256 * 1024 * 1024
+# Dossier du cache des cartes sur le disque (par exemple "data/cache/maps"), None pour le désactiver
+MAP_CACHE_DIR = None
+# Pré-rendu au démarrage des cartes du slider, dans un pool de processus : toutes les
+# cartes avec MAP_CACHE_DIR, sinon seulement les MAP_CACHE_ENTRIES mois les plus récents
+# (les autres ne tiendraient pas dans le cache en mémoire)
+MAP_WARM_UP = False
+MAP_WARM_UP_PROCESSES = None
+
+# Jeux de données nécessaires au premier affichage du dashboard (voir DATASETS dans get_data.py)
+FIRST_RENDER_DATASETS = ['accidents', 'communes', 'driving_schools', 'radars']
+
+# Si True, la carte des accidents est une page légère (src de l'iframe) qui demande au
+# serveur les seuls points de la zone visible (/api/geojson/...), au lieu de contenir
+# tous les points de la période dans son code HTML (srcDoc)
+MAP_LAZY = False
+
+# Distances (en mètres) proposées dans le panneau des accidents proches des radars
+RADAR_RADII = [100, 250, 500, 1000]
+# Nombre de résultats (année, mois, distance) gardés en mémoire pour ce panneau
+PROXIMITY_CACHE_SIZE = 256
+
+# Dossier du stockage des accidents par période sur le disque (par exemple
+# "data/store/accidents"), pour les données plus grandes que la mémoire : les accidents
+# ne sont plus chargés en entier et les callbacks ne lisent que la période affichée.
+# None pour garder tous les accidents en mémoire
+ACCIDENT_STORE_DIR = None
+
+# Si True, l'animation du slider des années se fait dans le navigateur : les séries de
+# chaque année sont envoyées une seule fois (dcc.Store), puis l'intervalle, le bouton et
+# les deux graphiques du slider sont mis à jour par assets/animation.js, sans requête au serveur
+ANIMATION_CLIENTSIDE = False
+
+# Journal des mesures des callbacks (une ligne JSON par appel, par exemple
+# "data/metrics.jsonl"), None pour ne garder que la route /metrics
+METRICS_LOG = None
+# Profilage avec cProfile d'une fraction des appels des callbacks (0 pour le désactiver) :
+# les profils des PROFILE_KEEP appels les plus lents, au-delà de PROFILE_MIN_SECONDS,
+# sont gardés dans PROFILE_DIR
+PROFILE_RATE = 0
+PROFILE_MIN_SECONDS = 0.5
+PROFILE_DIR = "data/profiles"
+PROFILE_KEEP = 20
+METRICS.configure(METRICS_LOG, PROFILE_RATE, PROFILE_MIN_SECONDS, PROFILE_DIR, PROFILE_KEEP)
+
+# Ajout des nouveaux accidents publiés depuis le dernier lancement, au démarrage
+REFRESH_ON_START = False
+
+# Au-delà de ce nombre de points, une couche de la carte est dessinée en mode dense :
+# 'cluster' (marqueurs regroupés) ou 'canvas' (cercles dessinés sur un canvas)
+MAP_DENSE_THRESHOLD = 1000
+MAP_DENSE_MODE = 'canvas'
+
+# Dossier du cache des éléments statiques (carte choroplèthe, histogramme de la gravité),
+# partagé par tous les processus, None pour les recalculer à chaque démarrage
+FIGURE_CACHE_DIR = "data/cache/figures"
+# Version du code des éléments statiques, à incrémenter quand il change
+FIGURE_CACHE_VERSION = 2
+# Colonnes des communes dessinées dans la carte choroplèthe (les seules qui entrent dans
+# son code HTML, et donc dans la clé de son cache)
+CHOROPLETH_COLUMNS = ['insee_com', 'nom', 'geometry']
+
+def animation_callback(*args, **kwargs):
+    """
+        Décorateur des callbacks de l'animation du slider : callback du serveur, sauf si
+        ANIMATION_CLIENTSIDE (la fonction est alors remplacée par celle de assets/animation.js)
+
+        Args:
+            *args: Les sorties, entrées et états du callback
+            **kwargs: Les options du callback
+
+        Returns:
+            function: Le décorateur
+    """
+    if ANIMATION_CLIENTSIDE:
+        return lambda function: function
+    return app.callback(*args, **kwargs)
+
+def load_saved_colors(filepath: str) -> None:
+    """
+        Procédure pour réutiliser les couleurs des communes d'une exécution précédente,
+        pour que les cartes du cache sur le disque gardent les mêmes couleurs
+
+        Args:
+            filepath (str): le chemin du fichier des couleurs
+
+        Returns:
+            None
+    """
+    if path.exists(filepath):
+        with open(filepath, encoding="utf-8") as file:
+            couleurs_par_commune.update(json.load(file))
+    else:
+        with open(filepath, "w", encoding="utf-8") as file:
+            json.dump(couleurs_par_commune, file, ensure_ascii=False)
+
+def load_data(names: list) -> tuple:
+    """
+        Lit les données, depuis le cache au format colonne quand il est à jour
+
+        Args:
+            names (list): Les noms des jeux de données (voir DATASETS dans get_data.py)
+
+        Returns:
+            tuple: Les jeux de données, dans l'ordre des noms
+    """
+    return tuple(load_cached(*DATASETS[name]) for name in names)
+
 async def main() -> None:
     """
         Fonction principale qui récupère les données et qui crée le dashboard
@@ -45,50 +175,151 @@ async def main() -> None:
     global geo_data_92
     global driving_schools
     global radars
+    global partition_index
+    global accident_table
+    global accident_cube
+    global map_cache
+    global radar_index
+    global accident_points
+    global commune_colors
+    global geo_layers
+    global geo_version
+    global warm_up_thread
+    global accident_store
+    if REFRESH_ON_START and path.exists("data/light_accidents.geojson"):
+        refresh_accidents(map_cache_dir=MAP_CACHE_DIR, store_dir=ACCIDENT_STORE_DIR)
+
+    # Avec le stockage par période, les accidents ne sont pas chargés en mémoire
+    names = [name for name in FIRST_RENDER_DATASETS
+             if ACCIDENT_STORE_DIR is None or name != 'accidents']
+    # Le stockage par période a aussi besoin du fichier léger des accidents, qui n'est pas
+    # un jeu de données chargé en mémoire
+    store_files = ["light_accidents"] if ACCIDENT_STORE_DIR is not None else []
     try:
-        accident = geopandas.read_file("data/light_accidents.geojson")
-        geo_data_92 = geopandas.read_file("data/communes-92-hauts-de-seine.geojson")
-        driving_schools = geopandas.read_file("data/driving_schools.geojson")
-        radars = pd.read_csv("data/radars.csv")
+        if store_files and not path.exists("data/light_accidents.geojson"):
+            raise FileNotFoundError("data/light_accidents.geojson")
+        datasets = dict(zip(names, load_data(names)))
     except Exception:
         print("Il manque au moins un fichier, exécution de la commande get_data.py")
         print(
-            "Pour récupérer les données, les fonctions fonctionnent sur différents "
-            "threads, ce qui permet de gagner du temps."
+            "Pour récupérer les données, les téléchargements, le scraping, l'allègement "
+            "et la mise en cache se font en parallèle, ce qui permet de gagner du temps."
         )
         print("")
         print(
             "Dans de bonnes conditions, le temps d'exécution est d'environ 220 "
             "secondes sur les machines de l'ESIEE..."
         )
-        print(
-            "ATTENTION, MEME SI LE MESSAGE \"Scraping terminé !\" S'AFFICHE, CELA NE "
-            "VEUT PAS DIRE QUE TOUT EST FINI !"
-        )
-        print("IL EST TRES PROBABLE QUE L'OUVERTURE DU FICHIER LOURD PRENNE DU TEMPS !")
         print("")
         start = time.time()
-        await get_data()
+        # Le dashboard attend uniquement les jeux de données de son premier affichage
+        datasets = await get_data(names, files=store_files)
         print("")
         print(f"Temps d'exécution: {time.time() - start} secondes")
-        print("Lectures des données...")
-
-        accident = geopandas.read_file("data/light_accidents.geojson")
-        geo_data_92 = geopandas.read_file("data/communes-92-hauts-de-seine.geojson")
-        driving_schools = geopandas.read_file("data/driving_schools.geojson")
-        radars = pd.read_csv("data/radars.csv")
         print("Création du dashboard...")
 
-    base_year = 2019
-
-    # Convertit la date, qui est en string, en datetime
-    accident['date'] = pd.to_datetime(accident['date'])
+    accident = datasets.get('accidents')
+    geo_data_92 = datasets['communes']
+    driving_schools = datasets['driving_schools']
+    radars = datasets['radars']
 
-    # Crée une carte choroplèthe, non dynamique
-    choropleth_map = create_choropleth_map()
+    base_year = 2019
 
-    # Crée un histogramme de la gravité des accidents par heure, non dynamique
-    histogram_gravity = create_histogram_gravity_by_hour()
+    if ACCIDENT_STORE_DIR is not None:
+        # Colonnes des accidents sur le disque, par période, construites au premier lancement
+        accident_store = open_store(ACCIDENT_STORE_DIR, "data/light_accidents.geojson",
+                                    COMMUNES_SOURCE)
+        accident_table = None
+        accident_points = None
+        # Index des périodes, sans lire les lignes
+        partition_index = accident_store.partition_index()
+
+        # Cube des nombres d'accidents, construit une année à la fois
+        accident_cube = load_saved_cube("data/cache/accident_cube.npz",
+                                        source_key("data/light_accidents.geojson",
+                                                   (COMMUNES_SOURCE,)))
+        if accident_cube is None:
+            accident_cube = accident_store.build_cube()
+            save_cube(accident_cube, "data/light_accidents.geojson", "data/cache/accident_cube.npz",
+                      (COMMUNES_SOURCE,))
+    else:
+        accident_store = None
+
+        # Convertit la date, qui est en string, en datetime
+        accident['date'] = pd.to_datetime(accident['date'])
+
+        # Champs des accidents décodés et typés une seule fois, utilisés par les graphiques et cartes
+        accident_table = build_compact_table(accident)
+        print(memory_report(accident, accident_table))
+
+        # Index des lignes par année et par mois, utilisé par tous les callbacks
+        partition_index = build_partition_index(accident['date'])
+
+        # Cube des nombres d'accidents, à partir duquel sont calculés tous les graphiques
+        accident_cube = load_or_build_cube(accident_table, "data/light_accidents.geojson",
+                                           "data/cache/accident_cube.npz", (COMMUNES_SOURCE,))
+
+        # Accidents projetés en mètres, pour le panneau de proximité
+        accident_points = project_points(accident.geometry)
+
+    years = get_years(partition_index)
+
+    # Index spatial des radars, pour le panneau de proximité
+    radar_index = build_radar_index(radars)
+
+    # Cache des cartes rendues, invalidé quand le fichier des accidents change
+    map_cache = MapCache(max_entries=MAP_CACHE_ENTRIES, max_bytes=MAP_CACHE_BYTES,
+                         cache_dir=MAP_CACHE_DIR,
+                         version=data_version("data/light_accidents.geojson"))
+    # Compteurs des caches exposés sur /metrics
+    METRICS.add_cache('maps', map_cache.stats)
+    METRICS.add_cache('lazy_maps', render_lazy_map.cache_info)
+    METRICS.add_cache('radar_proximity', radar_proximity.cache_info)
+    METRICS.add_cache('period_layers', period_layer.cache_info)
+
+    # Couleur de chaque commune du fichier des communes, y compris celles absentes de la liste
+    for commune in geo_data_92['nom']:
+        couleurs_par_commune.setdefault(commune, random.choice(list(couleurs_acceptees)))
+    if MAP_CACHE_DIR is not None:
+        load_saved_colors(path.join(MAP_CACHE_DIR, "couleurs.json"))
+    # Couleurs dans l'ordre des commune_id, pour colorer les accidents sans chercher leur nom
+    commune_colors = [couleurs_par_commune[commune] for commune in geo_data_92['nom']]
+
+    # Points des couches servis au format GeoJSON, avec leur index spatial
+    radars_92 = radars[radars['departement'] == '92']
+    geo_layers = {
+        'radars': GeoLayer(radars_92['latitude'], radars_92['longitude'],
+                           radar_properties(radars_92)),
+        'driving_schools': GeoLayer(driving_schools.geometry.y, driving_schools.geometry.x,
+                                    driving_school_properties(driving_schools)),
+    }
+    # Avec le stockage par période, les accidents sont servis mois par mois (voir period_layer)
+    if accident_store is None:
+        geo_layers['accidents'] = GeoLayer(accident.geometry.y, accident.geometry.x,
+                                           accident_properties(accident, commune_colors))
+    # Les réponses changent avec les données et avec les couleurs des communes
+    geo_version = make_etag(map_cache.version, *commune_colors)
+    warm_up_thread = None
+    if MAP_WARM_UP:
+        warm_up_thread = warm_up(map_cache, list(partition_index['months']), render_map,
+                                 MAP_WARM_UP_PROCESSES)
+
+    # Crée une carte choroplèthe, non dynamique, ou la relit depuis le cache si ses données
+    # n'ont pas changé
+    choropleth_map = cached_artifact(
+        FIGURE_CACHE_DIR, "choropleth", content_hash(
+            FIGURE_CACHE_VERSION, counts_by_commune(accident_cube), map_center(),
+            geo_data_92[CHOROPLETH_COLUMNS], driving_schools,
+            MAP_LAZY, MAP_DENSE_THRESHOLD, MAP_DENSE_MODE),
+        create_choropleth_map)
+
+    # Crée un histogramme de la gravité des accidents par heure, non dynamique, ou le relit
+    # depuis le cache
+    histogram_gravity = cached_artifact(
+        FIGURE_CACHE_DIR, "histogram_gravity", content_hash(
+            FIGURE_CACHE_VERSION, counts_by_hour_and_severity(accident_cube),
+            accident_cube['severities'], BG_COLOR),
+        create_histogram_gravity_by_hour, dumps=pio.to_json, loads=pio.from_json)
 
     # Le layout du dashboard
     app.layout = html.Div(children=[
@@ -107,7 +338,7 @@ async def main() -> None:
                 style={'textAlign': 'center', 'color': "#503D36", 'margin-bottom': '15px'}),
 
         # Contenant de la carte des accidents en fonction du mois et de l'année
-        html.Div(children=[html.Iframe(id='map', srcDoc=None, width='80%', height='500px',
+        html.Div(children=[html.Iframe(id='map', width='80%', height='500px',
                                        style={'border': '2px solid #FFA500'})],
                             style={'height': '500px', 'width': '100%',
                                    'margin-bottom': '15px',
@@ -130,9 +361,8 @@ async def main() -> None:
                         dcc.Dropdown(
                             id='month-dropdown',
                             options=[
-                                {'label': month, 'value': pd.to_datetime(month, format='%B').month}
-                                for month in sorted(accident['date'].dt.month_name().unique(),
-                                            key=lambda x: pd.to_datetime(x, format='%B').month)
+                                {'label': calendar.month_name[month], 'value': month}
+                                for month in get_months(partition_index)
                             ],
                             value=4,  # Valeur par défaut
                             style={'width': '150px'},
@@ -143,8 +373,7 @@ async def main() -> None:
                         dcc.Dropdown(
                             id='year-dropdown',
                             options=[
-                                {'label': str(year), 'value': year} for year
-                                    in sorted(accident['date'].dt.year.unique())
+                                {'label': str(year), 'value': year} for year in years
                             ],
                             value=2019,  # Valeur par défaut
                             style={'width': '150px'},
@@ -160,24 +389,26 @@ async def main() -> None:
         ),
 
         # Graphique de l'histogramme des accidents par mois d'une année
+        # Les graphiques complets sont envoyés une fois avec la page, les callbacks
+        # ne changent ensuite que leurs séries et leurs titres
         dcc.Graph(
             id='histogramme-accidents',
-            figure={},
+            figure=create_histogramme(base_year),
         ),
 
         # Courbe du nombre d'accidents par heure d'une journée d'une année
         dcc.Graph(
             id='graphique-accidents-heures',
-            figure={},
+            figure=create_graphique(base_year),
         ),
 
         # Slider pour changer l'année des 2 graphiques précédents
         dcc.Slider(
             id='year-slider',
-            min=accident['date'].dt.year.min(),
-            max=accident['date'].dt.year.max(),
+            min=years[0],
+            max=years[-1],
             value=base_year,
-            marks={str(year): str(year) for year in accident['date'].dt.year.unique()},
+            marks={str(year): str(year) for year in years},
             step=None,
         ),
 
@@ -214,6 +445,9 @@ async def main() -> None:
         # Intervalle qui permet de rendre dynamique le slider et donc les graphiques
         dcc.Interval(id="interval", interval=1*3000, n_intervals=0, disabled=False),
 
+        # Séries de chaque année, pour l'animation dans le navigateur
+        dcc.Store(id='yearly-series', data=yearly_series() if ANIMATION_CLIENTSIDE else None),
+
         # Titre de la carte choroplèthe
         html.H2(id="title-map-choropleth",
                 children='''Carte choroplèthe représentant le nombre d'accidents par commune.''',
@@ -228,6 +462,35 @@ async def main() -> None:
                                'justify-content': 'center', 'align-items':
                                'center', 'display': 'flex'}),
 
+        # Titre du panneau des accidents proches des radars
+        html.H2(id="title-radar-proximity",
+                children='''Accidents à proximité des radars, pour le mois et l'année de la carte.''',
+                style={'textAlign': 'center', 'color': "#503D36"}),
+
+        # Dropdown pour choisir la distance autour des radars
+        html.Div(
+            children=[
+                dcc.Dropdown(
+                    id='radius-dropdown',
+                    options=[{'label': f'{radius} m', 'value': radius} for radius in RADAR_RADII],
+                    value=RADAR_RADII[2] if len(RADAR_RADII) > 2 else RADAR_RADII[0],
+                    style={'width': '150px'},
+                    clearable=False
+                ),
+            ],
+            style={'display': 'flex', 'justify-content': 'center'}
+        ),
+
+        # Texte qui résume la distance entre les accidents et les radars
+        html.Div(id='text-radar-proximity', children=[],
+                 style={'textAlign': 'center', 'color': "#503D36", 'margin': '15px'}),
+
+        # Graphique des radars qui ont le plus d'accidents autour d'eux
+        dcc.Graph(
+            id='graph-radar-proximity',
+            figure={},
+        ),
+
     ], style={'width': '100%', 'padding': '0', 'padding-bottom':
               '15px', 'font-family': 'Helvetica', 'background-color': BG_COLOR})
 
@@ -239,49 +502,19 @@ def create_histogram_gravity_by_hour() -> go.Figure:
         Returns:
             go.Figure: L'histogramme de la gravité des accidents par heure
     """
-    accident_heure = accident.copy()
-
-    accident_heure['heure'] = pd.to_datetime(accident['heure'], format='%H:%M:%S').dt.hour
-    accident_sorted = accident_heure.sort_values(by='heure')
-
-    accidents_mortels = (
-        accident_sorted[accident_sorted['type_acci'] == 'Mortel']
-        .groupby('heure')
-        .size()
-        .reset_index(name='accidents')
-    )
-    accidents_mortels['type_acci'] = 'Mortel'
-
-    accidents_graves = (
-        accident_sorted[accident_sorted['type_acci'] == 'Grave']
-        .groupby('heure')
-        .size()
-        .reset_index(name='accidents')
-    )
-    accidents_graves['type_acci'] = 'Grave'
-
-    accidents_legers = (
-        accident_sorted[accident_sorted['type_acci'] == 'Léger']
-        .groupby('heure')
-        .size()
-        .reset_index(name='accidents')
-    )
-    accidents_legers['type_acci'] = 'Léger'
-
-    accident_sorted = pd.concat([accidents_mortels,
-                                 accidents_graves, accidents_legers], ignore_index=True)
+    import plotly.express as px
 
-    # Pivoter la table pour avoir les catégories comme colonnes
-    accident_sorted = accident_sorted.pivot(index='heure', columns='type_acci', values='accidents')
+    # Nombre d'accidents par heure (lignes) et par gravité (colonnes)
+    counts = counts_by_hour_and_severity(accident_cube)
+    accident_sorted = pd.DataFrame(counts, columns=accident_cube['severities'])
+    accident_sorted = accident_sorted[accident_sorted.sum(axis=1) > 0]
+    accident_sorted = accident_sorted[sorted(accident_sorted.columns)]
 
     # Calculer les pourcentages
     accident_sorted = accident_sorted.div(accident_sorted.sum(axis=1), axis=0) * 100
 
-    # Remplacer les valeurs NaN par 0
-    accident_sorted = accident_sorted.fillna(0)
-
     # Réinitialiser l'index
-    accident_sorted.reset_index(inplace=True)
+    accident_sorted = accident_sorted.rename_axis('heure').reset_index()
 
     accident_sorted = pd.melt(accident_sorted, id_vars='heure',
                               var_name='type_acci', value_name='proportion')
@@ -312,11 +545,12 @@ def create_histogram_gravity_by_hour() -> go.Figure:
     return fig
 
 # Callback pour gérer l'intervalle et le slider dynamique
-@app.callback(
+@animation_callback(
         Output('year-slider', 'value'),
         Input('interval', 'n_intervals'),
         State('year-slider', 'value')
     )
+@METRICS.instrument()
 def on_tick(_: int, year: int) -> int:
     """
         Gère l'intervalle et le slider dynamique
@@ -328,18 +562,28 @@ def on_tick(_: int, year: int) -> int:
         Returns:
             int: L'année
     """
-    years = sorted(accident['date'].dt.year.unique())
+    years = get_years(partition_index)
     year_index = years.index(year)
     return years[year_index + 1 if year_index + 1 < len(years) else 0]
 
-# Callback pour mettre à jour l'histogramme des accidents par mois
-@app.callback(
-    Output(component_id='histogramme-accidents', component_property='figure'),
-    Input(component_id='year-slider', component_property='value')
-)
-def update_histogramme(year: int) -> dict:
+def histogramme_series(year: int) -> tuple:
     """
-        Met à jour l'histogramme des accidents par mois
+        Calcule le nombre d'accidents de chaque mois d'une année et le titre de l'histogramme
+
+        Args:
+            year (int): L'année
+
+        Returns:
+            list: Le nombre d'accidents de chaque mois
+            str: Le titre de l'histogramme
+    """
+    accident_months = counts_by_month(accident_cube, year)
+    return ([int(accident_months[month - 1]) for month in get_months(partition_index)],
+            f'Nombre d\'accidents par mois en {year}')
+
+def create_histogramme(year: int) -> dict:
+    """
+        Crée l'histogramme complet des accidents par mois, envoyé avec la page
 
         Args:
             year (int): L'année
@@ -347,14 +591,13 @@ def update_histogramme(year: int) -> dict:
         Returns:
             dict: Le dictionnaire qui contient les données et le layout de l'histogramme
     """
-    accident_year = accident[accident['date'].dt.year == year]
+    counts, title = histogramme_series(year)
 
     return {
         'data': [
             go.Bar(
-                x=sorted(accident['date'].dt.month_name().unique(),
-                         key=lambda x: pd.to_datetime(x, format='%B').month),
-                y=accident_year.groupby(accident_year['date'].dt.month)['date'].count(),
+                x=[calendar.month_name[month] for month in get_months(partition_index)],
+                y=counts,
                 name='Nombre d\'accidents',
                 marker=go.bar.Marker(
                     color='#EEDD00'
@@ -362,7 +605,7 @@ def update_histogramme(year: int) -> dict:
             )
         ],
         'layout': go.Layout(
-            title=f'Nombre d\'accidents par mois en {year}',
+            title=title,
             xaxis={'title': 'Mois'},
             yaxis={'title': 'Nombre d\'accidents'},
             plot_bgcolor=BG_COLOR,
@@ -370,14 +613,48 @@ def update_histogramme(year: int) -> dict:
         )
     }
 
-# Callback pour mettre à jour la courbe du nombre d'accidents par heure
-@app.callback(
-    Output(component_id='graphique-accidents-heures', component_property='figure'),
-    Input(component_id='year-slider', component_property='value')
+# Callback pour mettre à jour l'histogramme des accidents par mois
+@animation_callback(
+    Output(component_id='histogramme-accidents', component_property='figure'),
+    Input(component_id='year-slider', component_property='value'),
+    prevent_initial_call=True
 )
-def update_graphique(year: int) -> dict:
+@METRICS.instrument(rows=lambda year: len(get_positions(partition_index, year)))
+def update_histogramme(year: int) -> Patch:
     """
-        Met à jour la courbe du nombre d'accidents par heure
+        Met à jour l'histogramme des accidents par mois : seuls les nombres d'accidents
+        et le titre sont envoyés au navigateur
+
+        Args:
+            year (int): L'année
+
+        Returns:
+            Patch: Les modifications de l'histogramme
+    """
+    counts, title = histogramme_series(year)
+
+    figure = Patch()
+    figure['data'][0]['y'] = counts
+    figure['layout']['title']['text'] = title
+    return figure
+
+def graphique_series(year: int) -> tuple:
+    """
+        Calcule le nombre d'accidents de chaque heure d'une année et le titre du graphique
+
+        Args:
+            year (int): L'année
+
+        Returns:
+            list: Le nombre d'accidents de chaque heure
+            str: Le titre du graphique
+    """
+    return (counts_by_hour(accident_cube, year).tolist(),
+            f'Nombre d\'accidents par heure de la journée en {year}')
+
+def create_graphique(year: int) -> dict:
+    """
+        Crée la courbe complète du nombre d'accidents par heure, envoyée avec la page
 
         Args:
             year (int): L'année
@@ -385,14 +662,8 @@ def update_graphique(year: int) -> dict:
         Returns:
             dict: Le dictionnaire qui contient les données et le layout du graphique
     """
-    accident_year = accident[accident['date'].dt.year == year]
-    # trier par heure
-    accident_year = accident_year.sort_values(by=['heure'])
     # nombre d'accidents par heure
-    heure = [int(hour[0:2]) for hour in accident_year['heure'].to_list()]
-    nombre_accident = []
-    for hour in range(24):
-        nombre_accident.append(heure.count(hour))
+    nombre_accident, title = graphique_series(year)
     heure = list(range(24))
 
     # graphique du nombre d'accidents en fonction de l'heure
@@ -402,7 +673,7 @@ def update_graphique(year: int) -> dict:
                        line=dict({"color": '#EEDD00'}))
         ],
         'layout': go.Layout(
-            title=f'Nombre d\'accidents par heure de la journée en {year}',
+            title=title,
             xaxis={'title': 'Heure'},
             yaxis={'title': 'Nombre d\'accidents'},
             plot_bgcolor=BG_COLOR,
@@ -410,12 +681,38 @@ def update_graphique(year: int) -> dict:
         )
     }
 
+# Callback pour mettre à jour la courbe du nombre d'accidents par heure
+@animation_callback(
+    Output(component_id='graphique-accidents-heures', component_property='figure'),
+    Input(component_id='year-slider', component_property='value'),
+    prevent_initial_call=True
+)
+@METRICS.instrument(rows=lambda year: len(get_positions(partition_index, year)))
+def update_graphique(year: int) -> Patch:
+    """
+        Met à jour la courbe du nombre d'accidents par heure : seuls les nombres
+        d'accidents et le titre sont envoyés au navigateur
+
+        Args:
+            year (int): L'année
+
+        Returns:
+            Patch: Les modifications du graphique
+    """
+    nombre_accident, title = graphique_series(year)
+
+    figure = Patch()
+    figure['data'][0]['y'] = nombre_accident
+    figure['layout']['title']['text'] = title
+    return figure
+
 # Callback pour gérer le bouton pour stopper le slider dynamique
-@app.callback(
+@animation_callback(
     Output('interval', 'disabled'),
     Output('play-button', 'children'),
     Input('play-button', 'n_clicks'),
 )
+@METRICS.instrument()
 def on_play_button_click(n_clicks: int) -> tuple:
     """
         Gère le bouton pour stopper le slider dynamique
@@ -434,14 +731,65 @@ def on_play_button_click(n_clicks: int) -> tuple:
 
     return False, '⏸️'
 
+def yearly_series() -> dict:
+    """
+        Calcule les séries et les titres des deux graphiques du slider pour chaque année,
+        envoyés une seule fois au navigateur pour l'animation
+
+        Returns:
+            dict: Les années ('years') et, pour chaque année, l'axe y et le titre de
+                l'histogramme par mois et de la courbe par heure ('series')
+    """
+    series = {}
+    for year in get_years(partition_index):
+        histogram_counts, histogram_title = histogramme_series(year)
+        graph_counts, graph_title = graphique_series(year)
+        series[str(year)] = {
+            'histogramme': {'y': histogram_counts, 'title': histogram_title},
+            'graphique': {'y': graph_counts, 'title': graph_title},
+        }
+    return {'years': get_years(partition_index), 'series': series}
+
+# Callbacks de l'animation dans le navigateur (assets/animation.js)
+if ANIMATION_CLIENTSIDE:
+    app.clientside_callback(
+        ClientsideFunction(namespace='animation', function_name='on_tick'),
+        Output('year-slider', 'value'),
+        Input('interval', 'n_intervals'),
+        State('year-slider', 'value'),
+        State('yearly-series', 'data')
+    )
+    app.clientside_callback(
+        ClientsideFunction(namespace='animation', function_name='update_histogramme'),
+        Output('histogramme-accidents', 'figure'),
+        Input('year-slider', 'value'),
+        State('yearly-series', 'data'),
+        State('histogramme-accidents', 'figure')
+    )
+    app.clientside_callback(
+        ClientsideFunction(namespace='animation', function_name='update_graphique'),
+        Output('graphique-accidents-heures', 'figure'),
+        Input('year-slider', 'value'),
+        State('yearly-series', 'data'),
+        State('graphique-accidents-heures', 'figure')
+    )
+    app.clientside_callback(
+        ClientsideFunction(namespace='animation', function_name='on_play_button_click'),
+        Output('interval', 'disabled'),
+        Output('play-button', 'children'),
+        Input('play-button', 'n_clicks')
+    )
+
 # Callback pour mettre à jour la carte des accidents en fonction du mois et de l'année
 @app.callback(
-    Output(component_id='map', component_property='srcDoc'),
+    Output(component_id='map', component_property='src' if MAP_LAZY else 'srcDoc'),
     Output(component_id='text-number-accident', component_property='children'),
     Output(component_id='title-map', component_property='children'),
     Input(component_id='year-dropdown', component_property='value'),
     Input(component_id='month-dropdown', component_property='value')
 )
+@METRICS.instrument(
+    rows=lambda year, month: len(get_positions(partition_index, year, month)))
 def update_map(year: int, month: int) -> tuple:
     """
         Met à jour la carte des accidents en fonction du mois et de l'année
@@ -451,96 +799,120 @@ def update_map(year: int, month: int) -> tuple:
             month (int): Le mois
 
         Returns:
-            str: Le code HTML de la carte
+            str: Le code HTML de la carte (son adresse si MAP_LAZY)
             str: Le nombre d'accidents pendant cette période
             str: Le titre de la carte
     """
-    m = create_map(accident, year, month)
-
-    accident_year = accident[accident['date'].dt.year == year]
-    accident_year_month = accident_year[accident_year['date'].dt.month == month]
+    if MAP_LAZY:
+        m = f'/map/lazy?year={year}&month={month}'
+    else:
+        m = map_cache.get_or_render((year, month), render_map, year, month)
 
     # récupérer le nom du mois
     month_name = calendar.month_name[month]
 
     return (m,
-            f'''Nombre d'accidents pendant cette période: {len(accident_year_month)}''',
+            f'''Nombre d'accidents pendant cette période: '''
+            f'''{len(get_positions(partition_index, year, month))}''',
             f'''Carte représentant les accidents de la route dans les Hauts-de-Seine en '''
             f'''{month_name} {year}.''')
 
-def create_map(data: geopandas.GeoDataFrame, year: int, month: int) -> str:
+def render_map(year: int, month: int) -> str:
     """
-        Crée une carte avec les accidents de la route en fonction du mois et de l'année
+        Rend la carte des accidents d'un mois d'une année, sans passer par le cache
 
         Args:
-            data (geopandas.GeoDataFrame): Les données des accidents
             year (int): L'année
             month (int): Le mois
 
         Returns:
             str: Le code HTML de la carte
     """
+    return create_map(period_accidents(year, month), map_center(year, month))
 
+def period_accidents(year: int, month: int) -> geopandas.GeoDataFrame:
+    """
+        Récupère les accidents d'un mois d'une année, en mémoire ou dans le stockage par période
 
-    accident_year = data[data['date'].dt.year == year]
-    accident_year_month = accident_year[accident_year['date'].dt.month == month]
+        Args:
+            year (int): L'année
+            month (int): Le mois
 
-    m = folium.Map(location=[accident_year_month['geometry'].apply(lambda geom: geom.y).mean()
-                             ,accident_year_month['geometry'].apply(lambda geom: geom.x).mean()],
-                               zoom_start=13)
+        Returns:
+            geopandas.GeoDataFrame: Les accidents de la période
+    """
+    if accident_store is not None:
+        return accident_store.frame(year, month)
+    return select_partition(accident, partition_index, year, month)
 
-    for _, row in accident_year_month.iterrows():
-        popup_content = f"""<div style='white-space: pre-wrap; width: 200px;'>
-<b>📍  Adresse</b> : {row['adresse']}<br>
-<b>📅 Date</b> : {row['date'].date()}<br>
-<b>🕐 Heure</b> : {row['heure']}<br>
-<b>🚗 Accident</b> : {row['type_acci']}<br>
-"""
-        if row['type_colli'] is not None:
-            if not row['type_colli'].isdigit() and row['type_colli'] != '-1':
-                popup_content += f"<b>🚨 Collision</b> : {row['type_colli']}<br>"
+def map_center(year: int = None, month: int = None) -> list:
+    """
+        Calcule le centre d'une carte : la position moyenne de ses accidents
 
-        if row['luminosite'] is not None:
-            if "Nuit" in row['luminosite']:
-                emoji_lum = "🌑"
-            else:
-                emoji_lum = "☀️"
+        Args:
+            year (int): L'année, None pour tous les accidents
+            month (int): Le mois
 
-        popup_content += f"<b>{emoji_lum} Luminosité</b> : {row['luminosite']}"
-        color = couleurs_par_commune.get(row['commune'], 'blue')
-        folium.Marker(location=[row['geometry'].y, row['geometry'].x],
-                      popup=popup_content, parse_html=True, icon=folium.Icon(color=color)).add_to(m)
+        Returns:
+            list: La latitude et la longitude du centre
+    """
+    if accident_store is not None:
+        return accident_store.center(year, month)
+    positions = slice(None) if year is None else get_positions(partition_index, year, month)
+    return [float(accident_table['y'].to_numpy()[positions].mean(dtype=np.float64)),
+            float(accident_table['x'].to_numpy()[positions].mean(dtype=np.float64))]
+
+@lru_cache(maxsize=MAP_CACHE_ENTRIES)
+def render_lazy_map(year: int, month: int) -> str:
+    """
+        Rend la carte légère des accidents d'un mois d'une année : les points sont
+        demandés au serveur par la carte, pour la zone visible
 
-    # Ajout des radars que du 92
-    radars_92 = radars[radars['departement'] == '92']
-    for _, row in radars_92.iterrows():
-        popup_content = """
-<div style='white-space: pre-wrap; width: 200px;'>
-"""
+        Args:
+            year (int): L'année
+            month (int): Le mois
+
+        Returns:
+            str: Le code HTML de la carte
+    """
+    import folium
+    from marker_layers import lazy_accident_layer, lazy_radar_layer
 
-        icon_name = 'assets/radar_fixe.png'
+    positions = get_positions(partition_index, year, month)
+    m = folium.Map(location=map_center(year, month), zoom_start=13)
 
-        if row['type'] != '':
-            popup_content += f"<b>🚨 {row['type']}</b><br>"
-            if row['type'] == 'Radar feu rouge':
-                icon_name = 'assets/radar_feu_rouge.png'
+    mode = choose_render_mode(len(positions), MAP_DENSE_THRESHOLD, MAP_DENSE_MODE)
+    lazy_accident_layer(f'/api/geojson/accidents?year={year}&month={month}',
+                        commune_colors, mode).add_to(m)
+    lazy_radar_layer('/api/geojson/radars').add_to(m)
 
-        if not pd.isna(row['route']) and isinstance(row['route'], str):
-            popup_content += f"<b>🛣️ Route</b> : {row['route']}<br>"
+    return m.get_root().render()
 
-        if not pd.isna(row['vitesse_vehicules_legers_kmh']) :
-            popup_content += (
-                f"<b>💨 Vitesse max</b> : "
-                f"{row['vitesse_vehicules_legers_kmh']} km/h<br>"
-            )
+def create_map(accident_year_month: geopandas.GeoDataFrame, location: list = None) -> str:
+    """
+        Crée une carte avec les accidents de la route d'un mois d'une année
 
-        icon = folium.CustomIcon(icon_image=icon_name, icon_size=(64, 64))
-        folium.Marker(
-            location=[row['latitude'], row['longitude']],
-            popup=folium.Popup(popup_content, max_width='100%'),
-            parse_html=True,
-            icon=icon
-        ).add_to(m)
+        Args:
+            accident_year_month (geopandas.GeoDataFrame): Les accidents du mois et de l'année
+            location (list): Le centre de la carte, la position moyenne des accidents si None
+
+        Returns:
+            str: Le code HTML de la carte
+    """
+    import folium
+    from marker_layers import accident_layer, radar_layer
+
+    if location is None:
+        location = [accident_year_month.geometry.y.mean(), accident_year_month.geometry.x.mean()]
+
+    m = folium.Map(location=location, zoom_start=13)
+
+    # Tous les accidents de la période dans une seule couche, colorés par commune
+    mode = choose_render_mode(len(accident_year_month), MAP_DENSE_THRESHOLD, MAP_DENSE_MODE)
+    accident_layer(accident_year_month, commune_colors, mode).add_to(m)
+
+    # Ajout des radars que du 92
+    radar_layer(radars[radars['departement'] == '92']).add_to(m)
 
     html_string = m.get_root().render().split('\n', 1)[1]
 
@@ -549,6 +921,92 @@ def create_map(data: geopandas.GeoDataFrame, year: int, month: int) -> str:
 
     return html_string
 
+@lru_cache(maxsize=PROXIMITY_CACHE_SIZE)
+def radar_proximity(year: int, month: int, radius: int) -> tuple:
+    """
+        Calcule la proximité entre les accidents d'un mois d'une année et les radars,
+        avec l'index spatial des radars. Le résultat est gardé en mémoire.
+
+        Args:
+            year (int): L'année
+            month (int): Le mois
+            radius (int): La distance autour des radars, en mètres
+
+        Returns:
+            np.ndarray: Le nombre d'accidents à moins de radius mètres de chaque radar
+            np.ndarray: La distance de chaque accident à son radar le plus proche
+    """
+    if accident_store is not None:
+        columns = accident_store.columns(year, month, ['x', 'y'])
+        points = project_points(geopandas.GeoSeries(
+            geopandas.points_from_xy(columns['x'], columns['y']), crs=accident_store.meta['crs']))
+    else:
+        points = accident_points[get_positions(partition_index, year, month)]
+    counts = accidents_near_radars(radar_index, points, radius)
+    _, distances = nearest_radars(radar_index, points)
+    # Les tableaux sont partagés par le cache : ils ne doivent pas être modifiés
+    counts.setflags(write=False)
+    distances.setflags(write=False)
+    return counts, distances
+
+# Callback pour mettre à jour le panneau des accidents proches des radars
+@app.callback(
+    Output(component_id='graph-radar-proximity', component_property='figure'),
+    Output(component_id='text-radar-proximity', component_property='children'),
+    Input(component_id='year-dropdown', component_property='value'),
+    Input(component_id='month-dropdown', component_property='value'),
+    Input(component_id='radius-dropdown', component_property='value')
+)
+@METRICS.instrument(
+    rows=lambda year, month, radius: len(get_positions(partition_index, year, month)))
+def update_radar_proximity(year: int, month: int, radius: int) -> tuple:
+    """
+        Met à jour le panneau des accidents proches des radars
+
+        Args:
+            year (int): L'année
+            month (int): Le mois
+            radius (int): La distance autour des radars, en mètres
+
+        Returns:
+            dict: Le graphique des radars qui ont le plus d'accidents autour d'eux
+            str: Le résumé de la distance entre les accidents et les radars
+    """
+    counts, distances = radar_proximity(year, month, radius)
+    top = radars.assign(radar=np.arange(len(radars)), nbAccidents=counts)
+    top = top[top['nbAccidents'] > 0].nlargest(10, 'nbAccidents')
+    # Le numéro du radar (le même que dans /api/radars/proximity) rend chaque libellé unique :
+    # Plotly regrouperait les barres de deux radars du même type sur la même route
+    labels = (top['type'].astype(str) + ' (' + top['route'].astype(str) + ') n°'
+              + top['radar'].astype(str))
+
+    if len(distances) == 0:
+        text = '''Aucun accident pendant cette période.'''
+    else:
+        text = (f'''{int((distances <= radius).sum())} accidents sur {len(distances)} '''
+                f'''à moins de {radius} m d'un radar, distance médiane au radar le plus '''
+                f'''proche : {np.nanmedian(distances):.0f} m.''')
+
+    return {
+        'data': [
+            go.Bar(
+                x=labels.tolist(),
+                y=top['nbAccidents'].tolist(),
+                name='Nombre d\'accidents',
+                marker=go.bar.Marker(
+                    color='#EEDD00'
+                )
+            )
+        ],
+        'layout': go.Layout(
+            title=f'Radars avec le plus d\'accidents à moins de {radius} m',
+            xaxis={'title': 'Radar'},
+            yaxis={'title': 'Nombre d\'accidents'},
+            plot_bgcolor=BG_COLOR,
+            paper_bgcolor=BG_COLOR
+        )
+    }, text
+
 # Callback pour créer la carte choroplèthe
 def create_choropleth_map() -> str:
     """
@@ -557,18 +1015,19 @@ def create_choropleth_map() -> str:
         Returns:
             str: Le code HTML de la carte choroplèthe
     """
-    center_lat = accident['geometry'].apply(lambda geom: geom.y).mean()
-    center_lon = accident['geometry'].apply(lambda geom: geom.x).mean()
+    import folium
+    from marker_layers import driving_school_layer
 
-    m = folium.Map(location=[center_lat,center_lon], zoom_start=13)
+    m = folium.Map(location=map_center(), zoom_start=13)
 
-    accident_count = accident.groupby('code_insee').size().reset_index(name='nbAccidents')
+    accident_count = counts_by_commune(accident_cube)
+    accident_count['insee_com'] = geo_data_92['insee_com'].to_numpy()[accident_count['commune_id']]
 
     choropleth = folium.Choropleth(
-        geo_data=geo_data_92, # données géographiques
+        geo_data=geo_data_92[CHOROPLETH_COLUMNS], # données géographiques
         name='choropleth',
         data=accident_count, # nombre d'accidents par commune
-        columns=['code_insee', 'nbAccidents'],
+        columns=['insee_com', 'nbAccidents'],
         key_on='feature.properties.insee_com',
         fill_color='YlOrRd',
         fill_opacity=0.7,
@@ -583,16 +1042,9 @@ def create_choropleth_map() -> str:
     choropleth.add_to(m)
 
     # ajout des auto-écoles
-    for _, row in driving_schools.iterrows():
-        popup_content = f"""
-<div style='white-space: pre-wrap; width: 200px;'>
-<b>🏫 Nom</b> : {row['name']}<br>
-<b>⭐ Note</b> : {row['grade']}/5
-"""
-
-        folium.Marker(location=[row['geometry'].y, row['geometry'].x],
-                      popup=folium.Popup(popup_content, max_width='100%'),
-                      parse_html=True, icon=folium.Icon(color='green')).add_to(m)
+    mode = choose_render_mode(len(driving_schools), MAP_DENSE_THRESHOLD, MAP_DENSE_MODE)
+    driving_school_layer(driving_schools, mode,
+                         '/api/geojson/driving_schools' if MAP_LAZY else None).add_to(m)
 
     legend_html = """
 <div style="position: fixed;
@@ -615,6 +1067,147 @@ def create_choropleth_map() -> str:
 
     return html_string
 
+# Compteurs du cache des cartes, pour ajuster sa taille
+@app.server.route('/stats/map-cache')
+def map_cache_stats():
+    """
+        Renvoie les compteurs du cache des cartes rendues
+
+        Returns:
+            flask.Response: Les compteurs au format JSON
+    """
+    return jsonify(map_cache.stats())
+
+# Mesures des callbacks, des étapes de récupération et des caches, au format de Prometheus
+@app.server.route('/metrics')
+def metrics():
+    """
+        Renvoie les mesures du processus au format texte de Prometheus
+
+        Returns:
+            flask.Response: Les mesures
+    """
+    return Response(METRICS.prometheus(), mimetype="text/plain; version=0.0.4")
+
+@app.server.after_request
+def record_response_size(response: Response) -> Response:
+    """
+        Enregistre la taille des réponses des callbacks envoyées au navigateur
+
+        Args:
+            response (flask.Response): La réponse
+
+        Returns:
+            flask.Response: La même réponse
+    """
+    if request.path.endswith('/_dash-update-component') and not response.direct_passthrough:
+        callback = app.callback_map.get((request.get_json(silent=True) or {}).get('output'), {})
+        if 'callback' in callback:
+            METRICS.record_response(callback['callback'].__name__,
+                                    response.calculate_content_length() or 0)
+    return response
+
+@lru_cache(maxsize=MAP_CACHE_ENTRIES)
+def period_layer(year: int, month: int) -> GeoLayer:
+    """
+        Crée la couche GeoJSON des accidents d'un mois d'une année, lus dans le stockage
+        par période. La couche est gardée en mémoire.
+
+        Args:
+            year (int): L'année
+            month (int): Le mois
+
+        Returns:
+            GeoLayer: Les accidents de la période, avec leur index spatial
+    """
+    accidents = accident_store.frame(year, month)
+    return GeoLayer(accidents.geometry.y, accidents.geometry.x,
+                    accident_properties(accidents, commune_colors))
+
+@app.server.route('/api/geojson/<layer>')
+def geojson_layer(layer: str):
+    """
+        Renvoie les points d'une couche (accidents, radars ou driving_schools) au format
+        GeoJSON, limités à la zone bbox si elle est donnée, et pour les accidents au mois
+        (month) de l'année (year) si ils sont donnés
+
+        Args:
+            layer (str): Le nom de la couche
+
+        Returns:
+            flask.Response: La FeatureCollection, compressée et avec un ETag
+    """
+    if layer not in geo_layers and not (layer == 'accidents' and accident_store is not None):
+        abort(404)
+    try:
+        bbox = parse_bbox(request.args.get('bbox'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    year = request.args.get('year', type=int) if layer == 'accidents' else None
+    month = request.args.get('month', type=int) if year is not None else None
+
+    if layer == 'accidents' and accident_store is not None:
+        # Avec le stockage par période, seuls les accidents d'un mois sont servis
+        if year is None or month is None:
+            return jsonify({'error': 'year et month sont attendus'}), 400
+
+        def build() -> dict:
+            geo_layer = period_layer(year, month)
+            return geo_layer.feature_collection(geo_layer.positions(bbox))
+    else:
+        def build() -> dict:
+            positions = geo_layers[layer].positions(bbox)
+            if year is not None:
+                positions = np.intersect1d(positions, get_positions(partition_index, year, month),
+                                           assume_unique=True)
+            return geo_layers[layer].feature_collection(positions)
+
+    return geojson_response(build, make_etag(geo_version, layer, year, month, bbox))
+
+@app.server.route('/map/lazy')
+def lazy_map():
+    """
+        Renvoie la carte légère des accidents d'un mois d'une année (paramètres year et month)
+
+        Returns:
+            str: Le code HTML de la carte
+    """
+    year = request.args.get('year', type=int)
+    month = request.args.get('month', type=int)
+    if year is None or month is None or not len(get_positions(partition_index, year, month)):
+        abort(404)
+    return render_lazy_map(year, month)
+
+@app.server.route('/api/radars/proximity')
+def radar_proximity_api():
+    """
+        Renvoie le nombre d'accidents autour de chaque radar pour un mois d'une année
+        (paramètres year, month et radius en mètres)
+
+        Returns:
+            flask.Response: Les radars qui ont des accidents autour d'eux, au format JSON
+    """
+    year = request.args.get('year', type=int)
+    month = request.args.get('month', type=int)
+    radius = request.args.get('radius', default=RADAR_RADII[0], type=int)
+    if year is None or month is None or radius is None or radius <= 0:
+        return jsonify({'error': 'year, month et radius (> 0) sont attendus'}), 400
+
+    counts, distances = radar_proximity(year, month, radius)
+    near_radars = radars[['type', 'route', 'latitude', 'longitude']].assign(
+        radar=np.arange(len(radars)), accidents=counts)
+    near_radars = near_radars[near_radars['accidents'] > 0]
+    # Les valeurs manquantes deviennent null en JSON
+    near_radars = near_radars.astype(object).where(near_radars.notna(), None)
+    return jsonify({
+        'year': year,
+        'month': month,
+        'radius': radius,
+        'accidents': len(distances),
+        'median_distance': None if np.isnan(distances).all() else float(np.nanmedian(distances)),
+        'radars': near_radars.to_dict(orient='records'),
+    })
+
 if __name__ == "__main__":
     asyncio.run(main())
     app.run_server(debug=False)
@@ -0,0 +1,251 @@
+"""
+    Cache LRU du code HTML des cartes déjà rendues.
+    Une carte est identique pour un même (année, mois) : on la garde en mémoire,
+    dans la limite d'un nombre d'entrées et d'une taille totale, et éventuellement
+    dans un dossier sur le disque pour la retrouver après un redémarrage.
+"""
+from os import path, makedirs, replace, remove
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import glob
+import threading
+import sys
+
+class MapCache:
+    """
+        Cache LRU borné des cartes rendues, avec compteurs de succès et d'échecs
+    """
+
+    def __init__(self, max_entries: int = 64, max_bytes: int = 256 * 1024 * 1024,
+                 cache_dir: str = None, version: str = "") -> None:
+        """
+            Crée un cache vide
+
+            Args:
+                max_entries (int): le nombre maximal de cartes gardées en mémoire
+                max_bytes (int): la taille maximale en octets des cartes gardées en mémoire
+                cache_dir (str): le dossier du cache sur le disque, None pour le désactiver
+                version (str): la version des données, les fichiers d'une autre version
+                    sur le disque sont ignorés
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        self.version = version
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if cache_dir is not None:
+            makedirs(cache_dir, exist_ok=True)
+
+    def _disk_path(self, key: tuple) -> str:
+        """
+            Fonction pour récupérer le chemin sur le disque d'une carte
+
+            Args:
+                key (tuple): la clé de la carte
+
+            Returns:
+                str: le chemin du fichier de la carte
+        """
+        name = "_".join(str(part) for part in (self.version, *key))
+        return path.join(self.cache_dir, f"{name}.html")
+
+    def _store(self, key: tuple, html_string: str) -> None:
+        """
+            Procédure pour ranger une carte en mémoire et libérer la place nécessaire
+
+            Args:
+                key (tuple): la clé de la carte
+                html_string (str): le code HTML de la carte
+
+            Returns:
+                None
+        """
+        size = sys.getsizeof(html_string)
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._size -= sys.getsizeof(self._entries.pop(key))
+        self._entries[key] = html_string
+        self._size += size
+        while len(self._entries) > self.max_entries or self._size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._size -= sys.getsizeof(evicted)
+            self.evictions += 1
+
+    def contains(self, key: tuple) -> bool:
+        """
+            Fonction pour savoir si une carte est en cache, sans modifier les compteurs
+
+            Args:
+                key (tuple): la clé de la carte
+
+            Returns:
+                bool: si la carte est en mémoire ou sur le disque
+        """
+        with self._lock:
+            if key in self._entries:
+                return True
+        return self.cache_dir is not None and path.exists(self._disk_path(key))
+
+    def get(self, key: tuple) -> str:
+        """
+            Fonction pour récupérer une carte depuis la mémoire, puis depuis le disque
+
+            Args:
+                key (tuple): la clé de la carte
+
+            Returns:
+                str: le code HTML de la carte, None si elle n'est pas en cache
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+
+        if self.cache_dir is not None and path.exists(self._disk_path(key)):
+            with open(self._disk_path(key), encoding="utf-8") as file:
+                html_string = file.read()
+            with self._lock:
+                self.disk_hits += 1
+                self._store(key, html_string)
+            return html_string
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: tuple, html_string: str) -> None:
+        """
+            Procédure pour ajouter une carte au cache (et sur le disque si activé)
+
+            Args:
+                key (tuple): la clé de la carte
+                html_string (str): le code HTML de la carte
+
+            Returns:
+                None
+        """
+        with self._lock:
+            self._store(key, html_string)
+
+        if self.cache_dir is not None:
+            # Écriture dans un fichier temporaire puis renommage, pour ne jamais lire
+            # une carte à moitié écrite
+            disk_path = self._disk_path(key)
+            with open(f"{disk_path}.tmp", "w", encoding="utf-8") as file:
+                file.write(html_string)
+            replace(f"{disk_path}.tmp", disk_path)
+
+    def get_or_render(self, key: tuple, render, *args) -> str:
+        """
+            Fonction pour récupérer une carte du cache, ou la rendre si elle n'y est pas
+
+            Args:
+                key (tuple): la clé de la carte
+                render (function): la fonction qui rend la carte
+                *args: les arguments de la fonction de rendu
+
+            Returns:
+                str: le code HTML de la carte
+        """
+        html_string = self.get(key)
+        if html_string is None:
+            html_string = render(*args)
+            self.put(key, html_string)
+        return html_string
+
+    def invalidate(self, keys: list = None) -> None:
+        """
+            Procédure pour retirer des cartes du cache, en mémoire et sur le disque
+
+            Args:
+                keys (list): les clés à retirer, None pour vider tout le cache
+
+            Returns:
+                None
+        """
+        with self._lock:
+            if keys is None:
+                self._entries.clear()
+                self._size = 0
+            else:
+                for key in keys:
+                    if key in self._entries:
+                        self._size -= sys.getsizeof(self._entries.pop(key))
+
+        if self.cache_dir is None:
+            return
+        if keys is None:
+            for disk_path in glob.glob(path.join(self.cache_dir, f"{self.version}_*.html")):
+                remove(disk_path)
+        else:
+            for key in keys:
+                if path.exists(self._disk_path(key)):
+                    remove(self._disk_path(key))
+
+    def stats(self) -> dict:
+        """
+            Fonction pour récupérer les compteurs du cache
+
+            Returns:
+                dict: les succès, échecs, évictions, le nombre d'entrées et la taille
+        """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self._size,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+            }
+
+def warm_up(cache: MapCache, keys: list, render, processes: int = None) -> threading.Thread:
+    """
+        Fonction pour pré-rendre des cartes en arrière-plan dans un pool de processus
+
+        Les processus sont créés par fork pour hériter des données déjà chargées.
+        Si fork n'est pas disponible (Windows), les cartes sont rendues une par une
+        dans le thread d'arrière-plan.
+        Sans dossier sur le disque, seules les cache.max_entries clés les plus récentes
+        sont rendues : les autres seraient aussitôt retirées de la mémoire.
+
+        Args:
+            cache (MapCache): le cache à remplir
+            keys (list): les clés à rendre, triables, chaque clé est passée en argument à render
+            render (function): la fonction de rendu, définie au niveau d'un module
+            processes (int): le nombre de processus, None pour le nombre de cœurs
+
+        Returns:
+            threading.Thread: le thread qui pilote le pré-rendu
+    """
+    if cache.cache_dir is None:
+        keys = sorted(keys, reverse=True)[:cache.max_entries]
+
+    def run() -> None:
+        missing = [key for key in keys if not cache.contains(key)]
+        if not missing:
+            return
+        if "fork" not in multiprocessing.get_all_start_methods():
+            for key in missing:
+                cache.put(key, render(*key))
+            return
+        context = multiprocessing.get_context("fork")
+        with ProcessPoolExecutor(max_workers=processes, mp_context=context) as executor:
+            for key, html_string in zip(missing, executor.map(render, *zip(*missing))):
+                cache.put(key, html_string)
+        print(f"Pré-rendu des cartes terminé ({len(missing)} cartes) !")
+
+    thread = threading.Thread(target=run, name="map-warm-up", daemon=True)
+    thread.start()
+    return thread
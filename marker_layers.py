@@ -0,0 +1,242 @@
+"""
+    Couches de marqueurs des cartes folium, construites à partir des propriétés
+    calculées dans markers.py. Ce module importe folium : il n'est chargé qu'au
+    premier rendu d'une carte, pas au démarrage du dashboard.
+"""
+import json
+import pandas as pd
+import geopandas
+from branca.element import MacroElement
+from folium.elements import JSCSSMixin
+from folium.plugins import MarkerCluster
+from folium.utilities import image_to_url
+from jinja2 import Template
+from markers import (RENDER_MODES, EMPTY_FEATURES, ACCIDENT_POPUP, RADAR_POPUP,
+                     DRIVING_SCHOOL_POPUP, awesome_icon, to_feature_collection,
+                     accident_properties, radar_properties, driving_school_properties)
+
+class MarkerLayer(JSCSSMixin, MacroElement):
+    """
+        Couche de marqueurs construite en une seule fois à partir d'une FeatureCollection.
+        Chaque point porte dans ses propriétés le nom de son icône ('icon') et les champs
+        de son popup. Les icônes ne sont créées qu'une fois et le code HTML d'un popup
+        n'est assemblé, à partir du modèle de la couche, qu'à son ouverture.
+
+        Modes de rendu :
+            'markers': un marqueur Leaflet par point
+            'cluster': les marqueurs sont regroupés selon le niveau de zoom
+            'canvas': les points sont des cercles dessinés sur un seul canvas
+                (les icônes personnalisées restent des marqueurs)
+
+        Si une url est donnée, les points ne sont pas dans la page : ils sont demandés
+        à l'url (avec la zone visible en paramètre bbox) à chaque déplacement de la carte.
+    """
+
+    _template = Template("""
+{% macro script(this, kwargs) %}
+    var {{ this.get_name() }}_icons = {};
+    var {{ this.get_name() }}_definitions = {{ this.icons|tojson }};
+    for (var key in {{ this.get_name() }}_definitions) {
+        var definition = {{ this.get_name() }}_definitions[key];
+        {{ this.get_name() }}_icons[key] = definition.type === "custom"
+            ? L.icon(definition.options)
+            : L.AwesomeMarkers.icon(definition.options);
+    }
+    var {{ this.get_name() }}_popup = {{ this.popup_template|tojson }};
+    {% if this.mode == "canvas" %}
+    var {{ this.get_name() }}_renderer = L.canvas({padding: 0.5});
+    {% endif %}
+    var {{ this.get_name() }} = L.geoJson({{ this.data_json if not this.url else "null" }}, {
+        pointToLayer: function (feature, latlng) {
+            {% if this.mode == "canvas" %}
+            var definition = {{ this.get_name() }}_definitions[feature.properties.icon];
+            if (definition.type !== "custom") {
+                return L.circleMarker(latlng, {
+                    renderer: {{ this.get_name() }}_renderer, radius: 6, weight: 1,
+                    color: definition.color, fillColor: definition.color, fillOpacity: 0.8
+                });
+            }
+            {% endif %}
+            return L.marker(latlng, {icon: {{ this.get_name() }}_icons[feature.properties.icon]});
+        },
+        onEachFeature: function (feature, layer) {
+            layer.bindPopup(function () {
+                return {{ this.get_name() }}_popup.replace(/\\{(\\w+)\\}/g, function (match, field) {
+                    return feature.properties[field];
+                });
+            }, {{ this.popup_options|tojson }});
+        }
+    });
+    {% if this.mode == "cluster" %}
+    var {{ this.get_name() }}_group = L.markerClusterGroup({chunkedLoading: true})
+        .addLayer({{ this.get_name() }})
+        .addTo({{ this._parent.get_name() }});
+    {% else %}
+    {{ this.get_name() }}.addTo({{ this._parent.get_name() }});
+    {% endif %}
+    {% if this.url %}
+    var {{ this.get_name() }}_request = 0;
+    function {{ this.get_name() }}_load() {
+        // Seule la dernière réponse est affichée, si la carte a bougé entre temps
+        var request = ++{{ this.get_name() }}_request;
+        var bounds = {{ this._parent.get_name() }}.getBounds().pad(0.2);
+        var url = {{ this.url|tojson }};
+        fetch(url + (url.indexOf("?") < 0 ? "?" : "&") + "bbox=" + bounds.toBBoxString())
+            .then(function (response) { return response.json(); })
+            .then(function (data) {
+                if (request !== {{ this.get_name() }}_request) {
+                    return;
+                }
+                {{ this.get_name() }}.clearLayers();
+                {{ this.get_name() }}.addData(data);
+                {% if this.mode == "cluster" %}
+                {{ this.get_name() }}_group.clearLayers();
+                {{ this.get_name() }}_group.addLayer({{ this.get_name() }});
+                {% endif %}
+            });
+    }
+    {{ this._parent.get_name() }}.on("moveend", {{ this.get_name() }}_load);
+    {{ this.get_name() }}_load();
+    {% endif %}
+{% endmacro %}
+""")
+
+    def __init__(self, data: dict, icons: dict, popup_template: str,
+                 popup_options: dict = None, mode: str = 'markers', url: str = None) -> None:
+        """
+            Crée la couche de marqueurs
+
+            Args:
+                data (dict): la FeatureCollection des points
+                icons (dict): la définition de chaque icône, par nom
+                popup_template (str): le modèle HTML des popups, avec des {champ}
+                popup_options (dict): les options Leaflet des popups
+                mode (str): le mode de rendu, parmi RENDER_MODES
+                url (str): l'adresse des points, None s'ils sont dans data
+        """
+        super().__init__()
+        if mode not in RENDER_MODES:
+            raise ValueError(f"Mode de rendu inconnu : {mode}")
+        self._name = "MarkerLayer"
+        self.data = data
+        self.icons = icons
+        self.popup_template = popup_template
+        self.popup_options = popup_options or {"maxWidth": 300}
+        self.mode = mode
+        self.url = url
+        if mode == 'cluster':
+            self.default_js = MarkerCluster.default_js
+            self.default_css = MarkerCluster.default_css
+
+    @property
+    def data_json(self) -> str:
+        """
+            Les points au format JSON, sans échapper les accents et les emojis
+            (qui prendraient jusqu'à 12 caractères chacun), prêts à être mis dans un script
+        """
+        return (json.dumps(self.data, ensure_ascii=False, separators=(',', ':'))
+                .replace("</", "<\\/")
+                .replace("\u2028", "\\u2028")
+                .replace("\u2029", "\\u2029"))
+
+def accident_layer(accidents: geopandas.GeoDataFrame, colors: list,
+                   mode: str = 'markers') -> MarkerLayer:
+    """
+        Fonction pour créer la couche des accidents, colorés par commune
+
+        Args:
+            accidents (geopandas.GeoDataFrame): les accidents, avec leur commune_id
+            colors (list): la couleur de chaque commune, dans l'ordre des commune_id
+            mode (str): le mode de rendu de la couche
+
+        Returns:
+            MarkerLayer: la couche des accidents
+    """
+    properties = accident_properties(accidents, colors)
+    icons = {color: awesome_icon(color) for color in pd.unique(properties['icon'])}
+    data = to_feature_collection(accidents.geometry.y.to_numpy(),
+                                 accidents.geometry.x.to_numpy(), properties)
+    return MarkerLayer(data, icons, ACCIDENT_POPUP, mode=mode)
+
+def lazy_accident_layer(url: str, colors: list, mode: str = 'markers') -> MarkerLayer:
+    """
+        Fonction pour créer la couche des accidents chargée depuis le serveur
+
+        Args:
+            url (str): l'adresse des accidents au format GeoJSON
+            colors (list): la couleur de chaque commune, dans l'ordre des commune_id
+            mode (str): le mode de rendu de la couche
+
+        Returns:
+            MarkerLayer: la couche des accidents, sans point dans la page
+    """
+    icons = {color: awesome_icon(color) for color in list(dict.fromkeys(colors)) + ['blue']}
+    return MarkerLayer(EMPTY_FEATURES, icons, ACCIDENT_POPUP, mode=mode, url=url)
+
+def radar_icons(names) -> dict:
+    """
+        Fonction pour définir les icônes des radars, chaque image n'étant intégrée
+        qu'une seule fois dans la page
+
+        Args:
+            names: les noms des icônes (images du dossier assets)
+
+        Returns:
+            dict: la définition de chaque icône
+    """
+    return {
+        name: {"type": "custom", "options": {
+            "iconSize": [64, 64], "iconUrl": image_to_url(f"assets/{name}.png")}}
+        for name in names
+    }
+
+def radar_layer(radars: pd.DataFrame) -> MarkerLayer:
+    """
+        Fonction pour créer la couche des radars
+
+        Args:
+            radars (pd.DataFrame): les radars
+
+        Returns:
+            MarkerLayer: la couche des radars
+    """
+    properties = radar_properties(radars)
+    data = to_feature_collection(radars['latitude'].to_numpy(),
+                                 radars['longitude'].to_numpy(), properties)
+    return MarkerLayer(data, radar_icons(properties['icon'].unique()), RADAR_POPUP,
+                       popup_options={"maxWidth": "100%"})
+
+def lazy_radar_layer(url: str) -> MarkerLayer:
+    """
+        Fonction pour créer la couche des radars chargée depuis le serveur
+
+        Args:
+            url (str): l'adresse des radars au format GeoJSON
+
+        Returns:
+            MarkerLayer: la couche des radars, sans point dans la page
+    """
+    return MarkerLayer(EMPTY_FEATURES, radar_icons(['radar_feu_rouge', 'radar_fixe']),
+                       RADAR_POPUP, popup_options={"maxWidth": "100%"}, url=url)
+
+def driving_school_layer(driving_schools: geopandas.GeoDataFrame,
+                         mode: str = 'markers', url: str = None) -> MarkerLayer:
+    """
+        Fonction pour créer la couche des auto-écoles
+
+        Args:
+            driving_schools (geopandas.GeoDataFrame): les auto-écoles
+            mode (str): le mode de rendu de la couche
+            url (str): l'adresse des auto-écoles au format GeoJSON,
+                None pour mettre les points dans la page
+
+        Returns:
+            MarkerLayer: la couche des auto-écoles
+    """
+    data = EMPTY_FEATURES
+    if url is None:
+        data = to_feature_collection(driving_schools.geometry.y.to_numpy(),
+                                     driving_schools.geometry.x.to_numpy(),
+                                     driving_school_properties(driving_schools))
+    return MarkerLayer(data, {'green': awesome_icon('green')}, DRIVING_SCHOOL_POPUP,
+                       popup_options={"maxWidth": "100%"}, mode=mode, url=url)
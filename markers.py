@@ -0,0 +1,214 @@
+"""
+    Construction des marqueurs des cartes par lots.
+    Les champs des popups, couleurs et coordonnées de toute une période sont calculés
+    colonne par colonne, puis envoyés à la carte dans une seule couche GeoJSON au lieu
+    d'un objet folium.Marker par accident.
+    Au-delà d'un certain nombre de points, la couche passe en mode regroupé
+    (clusters) ou en cercles dessinés sur un canvas, pour alléger le navigateur.
+    Une couche peut aussi ne contenir aucun point et les demander au serveur,
+    pour la seule zone visible de la carte (voir geo_api.py).
+    Ce module ne dépend pas de folium : les couches elles-mêmes sont dans marker_layers.py,
+    chargé seulement au premier rendu d'une carte.
+"""
+import numpy as np
+import pandas as pd
+import geopandas
+
+# Options des icônes (au format des icônes folium.Icon)
+AWESOME_ICON_OPTIONS = {
+    "extraClasses": "fa-rotate-0",
+    "icon": "info-sign",
+    "iconColor": "white",
+    "prefix": "glyphicon",
+}
+
+# Couleurs des icônes folium.Icon, pour dessiner les cercles du mode canvas
+ICON_COLORS_HEX = {
+    'red': '#D63E2A', 'darkred': '#A23336', 'lightred': '#FF8E7F',
+    'orange': '#F69730', 'beige': '#FFCB92', 'green': '#72B026',
+    'darkgreen': '#728224', 'lightgreen': '#BBF970', 'blue': '#38AADD',
+    'darkblue': '#0067A3', 'lightblue': '#8ADAFF', 'purple': '#D252B9',
+    'darkpurple': '#5B396B', 'pink': '#FF91EA', 'cadetblue': '#436978',
+    'white': '#FBFBFB', 'gray': '#575757', 'lightgray': '#A3A3A3', 'black': '#303030',
+}
+
+# Modes de rendu des couches de marqueurs
+RENDER_MODES = ('markers', 'cluster', 'canvas')
+
+# FeatureCollection vide, pour les couches chargées depuis le serveur
+EMPTY_FEATURES = {"type": "FeatureCollection", "features": []}
+
+# Début commun des popups
+POPUP_START = "<div style='white-space: pre-wrap; width: 200px;'>\n"
+
+# Modèles des popups : les {champ} sont remplacés par les propriétés du point
+ACCIDENT_POPUP = (POPUP_START
+                  + "<b>📍  Adresse</b> : {adresse}<br>\n"
+                  + "<b>📅 Date</b> : {date}<br>\n"
+                  + "<b>🕐 Heure</b> : {heure}<br>\n"
+                  + "<b>🚗 Accident</b> : {type_acci}<br>\n"
+                  + "{collision}"
+                  + "<b>{emoji_lum} Luminosité</b> : {luminosite}")
+RADAR_POPUP = "\n" + POPUP_START + "{type}{route}{vitesse}"
+DRIVING_SCHOOL_POPUP = ("\n" + POPUP_START
+                        + "<b>🏫 Nom</b> : {name}<br>\n"
+                        + "<b>⭐ Note</b> : {grade}/5\n")
+
+def choose_render_mode(count: int, threshold: int, dense_mode: str) -> str:
+    """
+        Fonction pour choisir le mode de rendu d'une couche selon son nombre de points
+
+        Args:
+            count (int): le nombre de points de la couche
+            threshold (int): le nombre de points au-delà duquel la couche est dense
+            dense_mode (str): le mode de rendu des couches denses ('cluster' ou 'canvas')
+
+        Returns:
+            str: le mode de rendu
+    """
+    return dense_mode if count > threshold else 'markers'
+
+def awesome_icon(color: str) -> dict:
+    """
+        Fonction pour définir une icône de marqueur d'une couleur (comme folium.Icon)
+
+        Args:
+            color (str): la couleur du marqueur
+
+        Returns:
+            dict: la définition de l'icône
+    """
+    return {
+        "type": "awesome",
+        "options": {**AWESOME_ICON_OPTIONS, "markerColor": color},
+        "color": ICON_COLORS_HEX.get(color, color),
+    }
+
+def escape_column(column: pd.Series) -> pd.Series:
+    """
+        Fonction pour échapper les caractères HTML d'une colonne de texte
+
+        Args:
+            column (pd.Series): la colonne
+
+        Returns:
+            pd.Series: la colonne en texte, échappée, avec '' pour les valeurs manquantes
+    """
+    return (column.astype(str).where(column.notna(), "")
+            .str.replace("&", "&amp;", regex=False)
+            .str.replace("<", "&lt;", regex=False)
+            .str.replace(">", "&gt;", regex=False)
+            .str.replace("{", "&#123;", regex=False))
+
+def to_feature_collection(latitudes, longitudes, properties: pd.DataFrame) -> dict:
+    """
+        Fonction pour assembler une FeatureCollection de points
+
+        Args:
+            latitudes: les latitudes des points
+            longitudes: les longitudes des points
+            properties (pd.DataFrame): les propriétés de chaque point
+
+        Returns:
+            dict: la FeatureCollection
+    """
+    records = properties.to_dict(orient="records")
+    return {
+        "type": "FeatureCollection",
+        "features": [
+            {
+                "type": "Feature",
+                "geometry": {"type": "Point", "coordinates": [float(lon), float(lat)]},
+                "properties": record,
+            }
+            for lat, lon, record in zip(latitudes, longitudes, records)
+        ],
+    }
+
+def accident_popup_fields(accidents: geopandas.GeoDataFrame) -> pd.DataFrame:
+    """
+        Fonction pour calculer les champs du popup de chaque accident (modèle ACCIDENT_POPUP)
+
+        Args:
+            accidents (geopandas.GeoDataFrame): les accidents
+
+        Returns:
+            pd.DataFrame: les champs du popup, une ligne par accident
+    """
+    collision = accidents['type_colli']
+    has_collision = (collision.notna()
+                     & ~collision.astype(str).str.isdigit()
+                     & (collision.astype(str) != '-1'))
+    luminosite = accidents['luminosite']
+
+    return pd.DataFrame({
+        'adresse': escape_column(accidents['adresse']).to_numpy(),
+        'date': accidents['date'].dt.strftime('%Y-%m-%d').to_numpy(),
+        'heure': escape_column(accidents['heure']).to_numpy(),
+        'type_acci': escape_column(accidents['type_acci']).to_numpy(),
+        'collision': ("<b>🚨 Collision</b> : " + escape_column(collision) + "<br>")
+                     .where(has_collision, "").to_numpy(),
+        'emoji_lum': luminosite.astype(str).str.contains("Nuit", regex=False)
+                     .map({True: "🌑", False: "☀️"}).to_numpy(),
+        'luminosite': escape_column(luminosite).to_numpy(),
+    })
+
+def accident_properties(accidents: geopandas.GeoDataFrame, colors: list) -> pd.DataFrame:
+    """
+        Fonction pour calculer les propriétés des points des accidents : champs du popup
+        et icône, de la couleur de la commune
+
+        Args:
+            accidents (geopandas.GeoDataFrame): les accidents, avec leur commune_id
+            colors (list): la couleur de chaque commune, dans l'ordre des commune_id
+
+        Returns:
+            pd.DataFrame: les propriétés, une ligne par accident
+    """
+    # La dernière couleur (position -1) est celle des accidents sans commune connue
+    properties = accident_popup_fields(accidents)
+    properties['icon'] = np.append(np.asarray(colors, dtype=object), 'blue')[
+        accidents['commune_id'].to_numpy()]
+    return properties
+
+def radar_properties(radars: pd.DataFrame) -> pd.DataFrame:
+    """
+        Fonction pour calculer les propriétés des points des radars : champs du popup et icône
+
+        Args:
+            radars (pd.DataFrame): les radars
+
+        Returns:
+            pd.DataFrame: les propriétés, une ligne par radar
+    """
+    radar_type = radars['type']
+    has_type = radar_type.notna() & (radar_type.astype(str) != '')
+    route = radars['route']
+    has_route = route.map(lambda value: isinstance(value, str))
+    vitesse = radars['vitesse_vehicules_legers_kmh']
+
+    return pd.DataFrame({
+        'type': ("<b>🚨 " + escape_column(radar_type) + "</b><br>").where(has_type, "").to_numpy(),
+        'route': ("<b>🛣️ Route</b> : " + escape_column(route) + "<br>").where(has_route, "")
+                 .to_numpy(),
+        'vitesse': ("<b>💨 Vitesse max</b> : " + escape_column(vitesse) + " km/h<br>")
+                   .where(vitesse.notna(), "").to_numpy(),
+        'icon': (radar_type == 'Radar feu rouge').map(
+            {True: 'radar_feu_rouge', False: 'radar_fixe'}).to_numpy(),
+    })
+
+def driving_school_properties(driving_schools: geopandas.GeoDataFrame) -> pd.DataFrame:
+    """
+        Fonction pour calculer les propriétés des points des auto-écoles
+
+        Args:
+            driving_schools (geopandas.GeoDataFrame): les auto-écoles
+
+        Returns:
+            pd.DataFrame: les propriétés, une ligne par auto-école
+    """
+    return pd.DataFrame({
+        'name': escape_column(driving_schools['name']).to_numpy(),
+        'grade': escape_column(driving_schools['grade']).to_numpy(),
+        'icon': 'green',
+    })
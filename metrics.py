@@ -0,0 +1,302 @@
+"""
+    Mesures du dashboard : durée, nombre de lignes, taille des réponses et erreurs
+    de chaque callback, durée des étapes de récupération des données et compteurs
+    des caches. Les mesures sont exposées au format texte de Prometheus (route /metrics),
+    et peuvent aussi être écrites dans un journal (une ligne JSON par appel).
+    Une fraction des appels peut être profilée avec cProfile : seuls les profils des
+    appels les plus lents sont gardés sur le disque.
+
+    Les mesures sont propres à chaque processus : avec plusieurs workers, chacun a les siennes.
+"""
+from os import path, makedirs, remove, getpid
+from functools import wraps
+import cProfile
+import glob
+import json
+import random
+import threading
+import time
+
+# Bornes (en secondes) des intervalles de l'histogramme des durées
+DURATION_BUCKETS = [0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+
+class Metrics:
+    """
+        Mesures des appels et des étapes, partagées par tous les threads du processus
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = {}
+        self.stages = {}
+        self.caches = {}
+        self.log_path = None
+        self.profile_rate = 0
+        self.profile_min_seconds = 0
+        self.profile_dir = None
+        self.profile_keep = 0
+
+    def configure(self, log_path: str = None, profile_rate: float = 0,
+                  profile_min_seconds: float = 0, profile_dir: str = None,
+                  profile_keep: int = 20) -> None:
+        """
+            Procédure pour activer le journal et le profilage
+
+            Args:
+                log_path (str): le fichier du journal (une ligne JSON par appel), None sans journal
+                profile_rate (float): la fraction des appels profilés (0 pour aucun, 1 pour tous)
+                profile_min_seconds (float): la durée à partir de laquelle un profil est gardé
+                profile_dir (str): le dossier des profils (fichiers .prof de cProfile)
+                profile_keep (int): le nombre de profils gardés, les plus lents
+
+            Returns:
+                None
+        """
+        self.log_path = log_path
+        self.profile_rate = profile_rate if profile_dir is not None else 0
+        self.profile_min_seconds = profile_min_seconds
+        self.profile_dir = profile_dir
+        self.profile_keep = profile_keep
+
+    def call_metrics(self, name: str) -> dict:
+        """
+            Fonction pour récupérer les mesures d'un callback, créées au premier appel.
+            Doit être appelée avec le verrou.
+
+            Args:
+                name (str): le nom du callback
+
+            Returns:
+                dict: les mesures du callback
+        """
+        if name not in self.calls:
+            self.calls[name] = {'count': 0, 'errors': 0, 'seconds': 0.0, 'rows': 0,
+                                'bytes': 0, 'responses': 0,
+                                'buckets': [0] * len(DURATION_BUCKETS)}
+        return self.calls[name]
+
+    def record_call(self, name: str, duration: float, rows: int = None,
+                    failed: bool = False) -> None:
+        """
+            Procédure pour enregistrer un appel de callback
+
+            Args:
+                name (str): le nom du callback
+                duration (float): la durée en secondes
+                rows (int): le nombre de lignes lues, None s'il n'est pas connu
+                failed (bool): si True, l'appel a levé une erreur
+
+            Returns:
+                None
+        """
+        with self._lock:
+            call = self.call_metrics(name)
+            call['count'] += 1
+            call['errors'] += int(failed)
+            call['seconds'] += duration
+            call['rows'] += rows or 0
+            for position, bound in enumerate(DURATION_BUCKETS):
+                if duration <= bound:
+                    call['buckets'][position] += 1
+        self.log({'kind': 'callback', 'name': name, 'seconds': duration,
+                  'rows': rows, 'error': failed})
+
+    def record_response(self, name: str, size: int) -> None:
+        """
+            Procédure pour enregistrer la taille d'une réponse envoyée au navigateur
+
+            Args:
+                name (str): le nom du callback
+                size (int): la taille de la réponse en octets
+
+            Returns:
+                None
+        """
+        with self._lock:
+            call = self.call_metrics(name)
+            call['bytes'] += size
+            call['responses'] += 1
+        self.log({'kind': 'response', 'name': name, 'bytes': size})
+
+    def record_stage(self, name: str, duration: float, failed: bool = False) -> None:
+        """
+            Procédure pour enregistrer une étape de la récupération des données
+
+            Args:
+                name (str): le nom de l'étape
+                duration (float): la durée en secondes
+                failed (bool): si True, l'étape a échoué
+
+            Returns:
+                None
+        """
+        with self._lock:
+            stage = self.stages.setdefault(name, {'count': 0, 'failures': 0, 'seconds': 0.0})
+            stage['count'] += 1
+            stage['failures'] += int(failed)
+            stage['seconds'] = duration
+        self.log({'kind': 'stage', 'name': name, 'seconds': duration, 'error': failed})
+
+    def add_cache(self, name: str, stats) -> None:
+        """
+            Procédure pour exposer les compteurs d'un cache
+
+            Args:
+                name (str): le nom du cache
+                stats (function): la fonction qui renvoie ses compteurs, un dict avec 'hits'
+                    et 'misses' ou le résultat de cache_info() d'un lru_cache
+
+            Returns:
+                None
+        """
+        self.caches[name] = stats
+
+    def log(self, record: dict) -> None:
+        """
+            Procédure pour écrire une mesure dans le journal, s'il est activé
+
+            Args:
+                record (dict): la mesure
+
+            Returns:
+                None
+        """
+        if self.log_path is None:
+            return
+        line = json.dumps({'time': time.time(), 'pid': getpid(), **record}, ensure_ascii=False)
+        with self._lock, open(self.log_path, "a", encoding="utf-8") as file:
+            file.write(line + "\n")
+
+    def keep_profile(self, name: str, profile: cProfile.Profile, duration: float) -> None:
+        """
+            Procédure pour enregistrer le profil d'un appel lent, en ne gardant que
+            les profile_keep profils les plus lents
+
+            Args:
+                name (str): le nom du callback
+                profile (cProfile.Profile): le profil de l'appel
+                duration (float): la durée de l'appel en secondes
+
+            Returns:
+                None
+        """
+        if duration < self.profile_min_seconds:
+            return
+        makedirs(self.profile_dir, exist_ok=True)
+        # La durée en millisecondes en tête du nom permet de trier les profils
+        profile.dump_stats(path.join(self.profile_dir, f"{int(duration * 1000):09d}ms-{name}-"
+                                                       f"{getpid()}-{time.time_ns()}.prof"))
+        with self._lock:
+            for old_path in sorted(glob.glob(path.join(self.profile_dir, "*.prof")),
+                                   reverse=True)[self.profile_keep:]:
+                try:
+                    remove(old_path)
+                except FileNotFoundError:
+                    pass
+
+    def prometheus(self) -> str:
+        """
+            Fonction pour écrire les mesures au format texte de Prometheus
+
+            Returns:
+                str: les mesures
+        """
+        lines = []
+
+        def metric(name: str, kind: str, description: str, samples: list) -> None:
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                text = ",".join(f'{key}="{label}"' for key, label in labels.items())
+                lines.append(f"{name}{{{text}}} {value}")
+
+        with self._lock:
+            calls = {name: {**call, 'buckets': list(call['buckets'])}
+                     for name, call in self.calls.items()}
+            stages = {name: dict(stage) for name, stage in self.stages.items()}
+
+        # Histogramme : chaque intervalle compte les appels de durée inférieure à sa borne
+        lines.append("# HELP dashboard_callback_duration_seconds Durée des callbacks")
+        lines.append("# TYPE dashboard_callback_duration_seconds histogram")
+        for name, call in calls.items():
+            bounds = [str(bound) for bound in DURATION_BUCKETS] + ["+Inf"]
+            for bound, count in zip(bounds, call['buckets'] + [call['count']]):
+                lines.append(f'dashboard_callback_duration_seconds_bucket'
+                             f'{{callback="{name}",le="{bound}"}} {count}')
+            lines.append(f'dashboard_callback_duration_seconds_sum{{callback="{name}"}} '
+                         f'{call["seconds"]}')
+            lines.append(f'dashboard_callback_duration_seconds_count{{callback="{name}"}} '
+                         f'{call["count"]}')
+
+        metric("dashboard_callback_errors_total", "counter", "Appels de callbacks en erreur",
+               [({'callback': name}, call['errors']) for name, call in calls.items()])
+        metric("dashboard_callback_rows_total", "counter", "Lignes lues par les callbacks",
+               [({'callback': name}, call['rows']) for name, call in calls.items()])
+        metric("dashboard_callback_response_bytes_total", "counter",
+               "Octets des réponses des callbacks envoyées au navigateur",
+               [({'callback': name}, call['bytes']) for name, call in calls.items()])
+        metric("dashboard_callback_responses_total", "counter",
+               "Réponses des callbacks envoyées au navigateur",
+               [({'callback': name}, call['responses']) for name, call in calls.items()])
+
+        metric("dashboard_stage_duration_seconds", "gauge",
+               "Durée de la dernière exécution de chaque étape de récupération des données",
+               [({'stage': name}, stage['seconds']) for name, stage in stages.items()])
+        metric("dashboard_stage_failures_total", "counter", "Étapes de récupération en échec",
+               [({'stage': name}, stage['failures']) for name, stage in stages.items()])
+
+        cache_stats = {}
+        for name, stats in self.caches.items():
+            values = stats()
+            cache_stats[name] = (values if isinstance(values, dict)
+                                 else {'hits': values.hits, 'misses': values.misses})
+        metric("dashboard_cache_hits_total", "counter", "Réponses trouvées dans les caches",
+               [({'cache': name}, stats['hits']) for name, stats in cache_stats.items()])
+        metric("dashboard_cache_misses_total", "counter", "Réponses absentes des caches",
+               [({'cache': name}, stats['misses']) for name, stats in cache_stats.items()])
+        return "\n".join(lines) + "\n"
+
+    def instrument(self, name: str = None, rows=None):
+        """
+            Fonction pour créer un décorateur qui mesure chaque appel d'une fonction
+
+            Args:
+                name (str): le nom des mesures, celui de la fonction si None
+                rows (function): la fonction qui calcule le nombre de lignes lues
+                    à partir des paramètres de l'appel, None si ce nombre n'a pas de sens
+
+            Returns:
+                function: le décorateur
+        """
+        def decorator(function):
+            metric_name = name or function.__name__
+
+            @wraps(function)
+            def wrapper(*args, **kwargs):
+                profile = None
+                if self.profile_rate and random.random() < self.profile_rate:
+                    profile = cProfile.Profile()
+                start = time.perf_counter()
+                failed = False
+                try:
+                    if profile is not None:
+                        return profile.runcall(function, *args, **kwargs)
+                    return function(*args, **kwargs)
+                except Exception:
+                    failed = True
+                    raise
+                finally:
+                    duration = time.perf_counter() - start
+                    count = None
+                    if rows is not None and not failed:
+                        try:
+                            count = rows(*args, **kwargs)
+                        except Exception:
+                            count = None
+                    self.record_call(metric_name, duration, count, failed)
+                    if profile is not None:
+                        self.keep_profile(metric_name, profile, duration)
+            return wrapper
+        return decorator
+
+# Mesures du processus
+METRICS = Metrics()
@@ -0,0 +1,103 @@
+"""
+    Index des accidents par année et par mois.
+    L'index est construit une seule fois au démarrage, après la conversion des dates,
+    et permet de récupérer les lignes d'une période sans parcourir toute la table.
+"""
+import numpy as np
+import pandas as pd
+
+# Positions renvoyées pour une période sans accident
+EMPTY_POSITIONS = np.empty(0, dtype=np.int64)
+
+def build_partition_index(dates: pd.Series) -> dict:
+    """
+        Construit l'index des positions des lignes par année et par (année, mois)
+
+        Args:
+            dates (pd.Series): la colonne des dates, déjà convertie en datetime
+
+        Returns:
+            dict: les positions par année ('years') et par (année, mois) ('months')
+    """
+    valid = dates.notna().to_numpy()
+    positions = np.flatnonzero(valid)
+    years = dates.dt.year.to_numpy()[valid].astype(np.int64)
+    months = dates.dt.month.to_numpy()[valid].astype(np.int64)
+
+    # Un tri stable sur la clé année * 100 + mois rend chaque partition contiguë
+    # tout en gardant l'ordre d'origine des lignes à l'intérieur d'un mois
+    keys = years * 100 + months
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+    sorted_positions = positions[order]
+
+    unique_keys, starts = np.unique(sorted_keys, return_index=True)
+    ends = np.append(starts[1:], len(sorted_keys))
+
+    index = {'years': {}, 'months': {}}
+    for key, start, end in zip(unique_keys, starts, ends):
+        index['months'][(int(key // 100), int(key % 100))] = sorted_positions[start:end]
+
+    unique_years = unique_keys // 100
+    for year in np.unique(unique_years):
+        year_starts = starts[unique_years == year]
+        year_ends = ends[unique_years == year]
+        # Les mois d'une année se suivent, on remet les lignes dans l'ordre d'origine
+        index['years'][int(year)] = np.sort(sorted_positions[year_starts[0]:year_ends[-1]])
+
+    return index
+
+def get_positions(index: dict, year: int, month: int = None) -> np.ndarray:
+    """
+        Fonction pour récupérer les positions des lignes d'une année ou d'un mois
+
+        Args:
+            index (dict): l'index construit par build_partition_index
+            year (int): l'année
+            month (int): le mois, None pour toute l'année
+
+        Returns:
+            np.ndarray: les positions des lignes de la période
+    """
+    if month is None:
+        return index['years'].get(year, EMPTY_POSITIONS)
+    return index['months'].get((year, month), EMPTY_POSITIONS)
+
+def select_partition(data: pd.DataFrame, index: dict, year: int, month: int = None) -> pd.DataFrame:
+    """
+        Fonction pour récupérer les accidents d'une année ou d'un mois
+
+        Args:
+            data (pd.DataFrame): les données indexées
+            index (dict): l'index construit par build_partition_index sur data
+            year (int): l'année
+            month (int): le mois, None pour toute l'année
+
+        Returns:
+            pd.DataFrame: les lignes de la période
+    """
+    return data.iloc[get_positions(index, year, month)]
+
+def get_years(index: dict) -> list:
+    """
+        Fonction pour récupérer les années présentes dans l'index
+
+        Args:
+            index (dict): l'index construit par build_partition_index
+
+        Returns:
+            list: les années triées
+    """
+    return sorted(index['years'])
+
+def get_months(index: dict) -> list:
+    """
+        Fonction pour récupérer les mois présents dans l'index
+
+        Args:
+            index (dict): l'index construit par build_partition_index
+
+        Returns:
+            list: les numéros des mois triés
+    """
+    return sorted({month for _, month in index['months']})
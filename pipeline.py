@@ -0,0 +1,128 @@
+"""
+    Graphe d'étapes asynchrone pour la récupération des données.
+    Chaque étape attend les étapes dont elle dépend, s'exécute dans un thread
+    (téléchargements, scraping, lecture) ou dans un processus (calculs lourds),
+    et son temps d'exécution est mesuré. Une étape dont une dépendance a échoué
+    échoue aussi, et les erreurs sont remontées à l'appelant.
+"""
+from functools import partial
+import asyncio
+import time
+from metrics import METRICS
+
+class StageError(Exception):
+    """
+        Erreur levée quand une étape dépend d'une étape qui a échoué
+    """
+
+class PipelineError(Exception):
+    """
+        Erreur levée quand au moins une des étapes attendues a échoué
+
+        Args:
+            errors (dict): l'erreur de chaque étape qui a échoué
+    """
+    def __init__(self, errors: dict):
+        self.errors = errors
+        causes = {}
+        for name, error in errors.items():
+            # On remonte jusqu'à l'erreur de l'étape qui a vraiment échoué
+            while isinstance(error, StageError) and error.__cause__ is not None:
+                error = error.__cause__
+            causes[name] = error
+        super().__init__("Étapes en échec : " + ", ".join(
+            f"{name} ({type(error).__name__}: {error})" for name, error in causes.items()))
+
+class Pipeline:
+    """
+        Graphe des étapes, lancées dès que leurs dépendances sont terminées
+
+        Args:
+            processes (concurrent.futures.Executor): le pool de processus
+                des étapes lourdes, None pour les lancer dans un thread
+    """
+    def __init__(self, processes=None):
+        self.processes = processes
+        self.tasks = {}
+        self.timings = {}
+
+    def add(self, name: str, function, *args, depends: tuple = (), process: bool = False) -> None:
+        """
+            Procédure pour ajouter une étape, lancée immédiatement
+
+            Args:
+                name (str): le nom de l'étape
+                function (function): la fonction de l'étape
+                *args: les paramètres de la fonction
+                depends (tuple): les noms des étapes à attendre avant de commencer
+                process (bool): si True, l'étape s'exécute dans le pool de processus
+
+            Returns:
+                None
+        """
+        dependencies = [self.tasks[dependency] for dependency in depends if dependency in self.tasks]
+        self.tasks[name] = asyncio.create_task(
+            self.run(name, partial(function, *args), dependencies, process))
+
+    async def run(self, name: str, function, dependencies: list, process: bool):
+        """
+            Fonction pour exécuter une étape après ses dépendances
+
+            Args:
+                name (str): le nom de l'étape
+                function (function): la fonction de l'étape, sans paramètre
+                dependencies (list): les tâches des étapes à attendre
+                process (bool): si True, l'étape s'exécute dans le pool de processus
+
+            Returns:
+                le résultat de la fonction
+        """
+        for dependency in dependencies:
+            try:
+                await dependency
+            except Exception as e:
+                raise StageError(f"une dépendance de {name} a échoué") from e
+
+        start = time.perf_counter()
+        failed = True
+        try:
+            if process and self.processes is not None:
+                result = await asyncio.get_running_loop().run_in_executor(self.processes, function)
+            else:
+                result = await asyncio.to_thread(function)
+            failed = False
+            return result
+        finally:
+            self.timings[name] = time.perf_counter() - start
+            METRICS.record_stage(name, self.timings[name], failed)
+
+    async def wait(self, names: list = None) -> dict:
+        """
+            Fonction pour attendre des étapes et récupérer leurs résultats
+
+            Args:
+                names (list): les noms des étapes à attendre, None pour toutes
+
+            Returns:
+                dict: le résultat de chaque étape attendue
+        """
+        names = list(self.tasks) if names is None else names
+        results = await asyncio.gather(*(self.tasks[name] for name in names),
+                                       return_exceptions=True)
+        errors = {name: result for name, result in zip(names, results)
+                  if isinstance(result, Exception)}
+        if errors:
+            raise PipelineError(errors)
+        return dict(zip(names, results))
+
+    def report(self) -> None:
+        """
+            Procédure pour afficher le temps de chaque étape terminée
+
+            Returns:
+                None
+        """
+        for name, duration in self.timings.items():
+            task = self.tasks[name]
+            failed = task.done() and not task.cancelled() and task.exception() is not None
+            print(f"  {name} : {duration:.2f} secondes" + (" (échec)" if failed else ""))
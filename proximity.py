@@ -0,0 +1,82 @@
+"""
+    Index spatial des radars, pour mesurer la proximité entre accidents et radars.
+    Les points sont projetés une seule fois en Lambert-93 (coordonnées en mètres),
+    puis un STRtree des radars répond en une requête groupée à "combien d'accidents
+    à moins de X mètres de chaque radar" et "quel est le radar le plus proche de
+    chaque accident", sans calculer toutes les distances accident-radar.
+"""
+import numpy as np
+import pandas as pd
+import geopandas
+from shapely import STRtree
+
+# Projection métrique de la France métropolitaine
+LAMBERT_93 = "EPSG:2154"
+
+def project_points(geometry: geopandas.GeoSeries) -> np.ndarray:
+    """
+        Fonction pour projeter des points en Lambert-93
+
+        Args:
+            geometry (geopandas.GeoSeries): les points, en latitude/longitude si aucun CRS
+
+        Returns:
+            np.ndarray: les points projetés (géométries shapely), dans le même ordre
+    """
+    if geometry.crs is None:
+        geometry = geometry.set_crs("EPSG:4326")
+    return np.asarray(geometry.to_crs(LAMBERT_93).values)
+
+def build_radar_index(radars: pd.DataFrame) -> dict:
+    """
+        Fonction pour construire l'index spatial des radars
+
+        Args:
+            radars (pd.DataFrame): les radars, avec les colonnes latitude et longitude
+
+        Returns:
+            dict: l'arbre des radars ('tree') et leurs points projetés ('points')
+    """
+    points = project_points(geopandas.GeoSeries(
+        geopandas.points_from_xy(radars['longitude'], radars['latitude']), crs="EPSG:4326"))
+    return {'tree': STRtree(points), 'points': points}
+
+def accidents_near_radars(radar_index: dict, points: np.ndarray, radius: float) -> np.ndarray:
+    """
+        Fonction pour compter les accidents à moins de radius mètres de chaque radar
+
+        Args:
+            radar_index (dict): l'index spatial des radars
+            points (np.ndarray): les accidents, projetés en Lambert-93
+            radius (float): la distance en mètres
+
+        Returns:
+            np.ndarray: le nombre d'accidents de chaque radar, dans l'ordre des radars
+    """
+    _, radar_positions = radar_index['tree'].query(points, predicate='dwithin', distance=radius)
+    return np.bincount(radar_positions, minlength=len(radar_index['points']))
+
+def nearest_radars(radar_index: dict, points: np.ndarray) -> tuple:
+    """
+        Fonction pour trouver le radar le plus proche de chaque accident
+
+        Args:
+            radar_index (dict): l'index spatial des radars
+            points (np.ndarray): les accidents, projetés en Lambert-93
+
+        Returns:
+            np.ndarray: la position du radar le plus proche (-1 si l'accident n'a pas de point)
+            np.ndarray: la distance en mètres (NaN si l'accident n'a pas de point)
+    """
+    positions = np.full(len(points), -1, dtype=np.int64)
+    distances = np.full(len(points), np.nan)
+    if len(points) == 0 or len(radar_index['points']) == 0:
+        return positions, distances
+
+    (accident_positions, radar_positions), found = radar_index['tree'].query_nearest(
+        points, return_distance=True)
+    # En cas d'égalité, plusieurs radars sont renvoyés : on garde le premier
+    _, first = np.unique(accident_positions, return_index=True)
+    positions[accident_positions[first]] = radar_positions[first]
+    distances[accident_positions[first]] = found[first]
+    return positions, distances
@@ -2,16 +2,59 @@
     Script pour récupérer les données des auto écoles du 92.
     Nous utilisons le site vroomvroom.fr pour récupérer les données.
     Nous récupérons les données et les stockons dans un fichier geojson.
+    Les pages sont lues soit par de simples requêtes HTTP (backend "http"),
+    soit par un navigateur Firefox piloté par Selenium (backend "selenium").
 """
-from os import makedirs
+from os import makedirs, path, replace, listdir, remove, rmdir
+from concurrent.futures import ThreadPoolExecutor
+import json
+from html.parser import HTMLParser
+from urllib.parse import urljoin
+import queue
+import re
+import requests
+from requests.adapters import HTTPAdapter
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.wait import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException
 from selenium.webdriver.firefox.options import Options
+import pandas as pd
 import geopandas
-from shapely.geometry import Point
+
+# Page des auto écoles du 92, qui contient les liens des villes
+DEPARTMENT_URL = "https://www.vroomvroom.fr/auto-ecoles/hauts-de-seine/"
+
+# Nombre de navigateurs qui récupèrent les villes en même temps
+SCRAPING_WORKERS = 4
+
+# "http" pour lire les pages sans navigateur, "selenium" pour utiliser Firefox.
+# Si le backend http ne trouve pas les villes ou les auto écoles (pages construites
+# en javascript), le scraping est refait avec Selenium
+SCRAPING_BACKEND = "http"
+
+# Nombre d'essais pour chaque ville avant de l'abandonner
+SCRAPING_RETRIES = 3
+
+# Dossier des résultats de chaque ville déjà récupérée, pour reprendre un scraping interrompu
+PARTS_DIR = "data/driving_schools_parts"
+
+# Attributs html de chaque auto école, et colonne correspondante
+DRIVING_SCHOOL_ATTRIBUTES = {"name": "data-name", "position": "data-position", "grade": "data-note"}
+
+class ScrapingIncomplete(Exception):
+    """
+        Erreur levée quand des villes ont été abandonnées : le fichier final n'est pas
+        écrit, et les résultats des autres villes sont gardés pour la reprise
+
+        Args:
+            failures (list): les liens des villes abandonnées
+    """
+    def __init__(self, failures: list):
+        self.failures = failures
+        super().__init__(f"Villes abandonnées après {SCRAPING_RETRIES} essais : "
+                         + ", ".join(failures))
 
 def wait_for_element_loading(driver: webdriver, class_name: str, timeout: int =120):
     """
@@ -41,23 +84,142 @@ def create_firefox_browser() -> webdriver.Firefox:
     options.add_argument('--disable-blink-features=AutomationControlled')
     return webdriver.Firefox(options=options)
 
-def get_cities(driver: webdriver) -> list:
+class HttpClient:
+    """
+        Client HTTP qui remplace le navigateur pour le backend "http" :
+        une session requests garde les connexions ouvertes d'une page à l'autre
+
+        Args:
+            timeout (int): le temps d'attente maximal d'une page en secondes
+    """
+    def __init__(self, timeout: int = 30):
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers["User-Agent"] = "Mozilla/5.0 (X11; Linux x86_64; rv:109.0) Firefox/118.0"
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=SCRAPING_WORKERS)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def get_page(self, url: str) -> str:
+        """
+            Fonction pour récupérer le html d'une page
+
+            Args:
+                url (str): l'adresse de la page
+
+            Returns:
+                str: le html de la page
+        """
+        response = self.session.get(url, timeout=self.timeout)
+        response.raise_for_status()
+        return response.text
+
+    def quit(self) -> None:
+        """
+            Procédure pour fermer les connexions, comme driver.quit() pour un navigateur
+
+            Returns:
+                None
+        """
+        self.session.close()
+
+class ElementParser(HTMLParser):
+    """
+        Lecteur html qui garde les attributs des éléments d'une classe donnée
+
+        Args:
+            class_name (str): la classe html des éléments recherchés
+    """
+    def __init__(self, class_name: str):
+        super().__init__()
+        self.class_name = class_name
+        self.elements = []
+
+    def handle_starttag(self, tag: str, attrs: list) -> None:
+        """
+            Procédure appelée pour chaque balise ouvrante du html
+
+            Args:
+                tag (str): le nom de la balise
+                attrs (list): les (nom, valeur) des attributs de la balise
+
+            Returns:
+                None
+        """
+        attributes = dict(attrs)
+        if self.class_name in (attributes.get("class") or "").split():
+            self.elements.append(attributes)
+
+def find_elements(html: str, class_name: str) -> list:
+    """
+        Fonction pour récupérer les attributs des éléments d'une classe dans une page
+
+        Args:
+            html (str): le html de la page
+            class_name (str): la classe html des éléments
+
+        Returns:
+            list: les attributs de chaque élément (un dictionnaire par élément)
+    """
+    parser = ElementParser(class_name)
+    parser.feed(html)
+    parser.close()
+    return parser.elements
+
+def get_cities_http(client: HttpClient, url: str = DEPARTMENT_URL) -> list:
+    """
+        Fonction pour récupérer les liens des villes sans navigateur
+
+        Args:
+            client (HttpClient): le client HTTP
+            url (str): l'adresse de la page du département
+
+        Returns:
+            list: la liste des liens des villes, vide si la page n'a pas pu être lue
+    """
+    try:
+        html = client.get_page(url)
+    except requests.RequestException as e:
+        print(f"Couldn't load page {url} : {e}")
+        return []
+    return [urljoin(url, element["href"])
+            for element in find_elements(html, "vv-department__link") if element.get("href")]
+
+def get_city_driving_schools_http(client: HttpClient, city_link: str) -> dict:
+    """
+        Fonction pour récupérer les auto écoles de la page d'une ville sans navigateur
+
+        Args:
+            client (HttpClient): le client HTTP
+            city_link (str): le lien de la page de la ville
+
+        Returns:
+            dict: la liste des valeurs de chaque colonne (name, position, grade)
+    """
+    print(city_link)
+    elements = find_elements(client.get_page(city_link), "vv-search-item")
+    return {column: [element.get(attribute) for element in elements]
+            for column, attribute in DRIVING_SCHOOL_ATTRIBUTES.items()}
+
+def get_cities(driver: webdriver, url: str = DEPARTMENT_URL) -> list:
     """
         Fonction pour récupérer les liens des villes et les stocker dans une liste
 
         Args:
             driver (webdriver): le navigateur
+            url (str): l'adresse de la page du département
 
         Returns:
             list: la liste des liens des villes
     """
-    driver.get("https://www.vroomvroom.fr/auto-ecoles/hauts-de-seine/")
+    driver.get(url)
     department_class = "vv-department__link"
     cities = []
     try:
         wait_for_element_loading(driver, department_class)
         elements = driver.find_elements(By.CLASS_NAME, department_class)
-        cities = [element.get_attribute("href")for element in elements]
+        cities = [href for href in (element.get_attribute("href") for element in elements)
+                  if href]
     except TimeoutException:
         print(f"Couldn't load page {driver.current_url}")
         driver.quit()
@@ -66,67 +228,283 @@ def get_cities(driver: webdriver) -> list:
         driver.quit()
     return cities
 
-def get_driving_schools(driver: webdriver) -> None:
+def get_city_driving_schools(driver: webdriver, city_link: str) -> dict:
     """
-        Procédure pour récupérer les données des auto écoles et les stocker dans un fichier geojson
+        Fonction pour récupérer les auto écoles de la page d'une ville
 
         Args:
             driver (webdriver): le navigateur
+            city_link (str): le lien de la page de la ville
+
+        Returns:
+            dict: la liste des valeurs de chaque colonne (name, position, grade)
+    """
+    print(city_link)
+    driver.get(city_link)
+    wait_for_element_loading(driver, "vv-search-item__content__title")
+    elements = driver.find_elements(By.CLASS_NAME, "vv-search-item")
+    return {column: [element.get_attribute(attribute) for element in elements]
+            for column, attribute in DRIVING_SCHOOL_ATTRIBUTES.items()}
+
+def part_path(city_link: str, parts_dir: str = PARTS_DIR) -> str:
+    """
+        Fonction pour récupérer le chemin du fichier des résultats d'une ville
+
+        Args:
+            city_link (str): le lien de la page de la ville
+            parts_dir (str): le dossier des résultats des villes
+
+        Returns:
+            str: le chemin du fichier
+    """
+    name = re.sub(r"[^\w-]", "_", city_link.rstrip("/").rsplit("/", 1)[-1])
+    return path.join(parts_dir, f"{name}.json")
+
+def save_part(city_link: str, columns: dict, parts_dir: str = PARTS_DIR) -> None:
+    """
+        Procédure pour sauvegarder les résultats d'une ville dès qu'elle est récupérée
+
+        Args:
+            city_link (str): le lien de la page de la ville
+            columns (dict): les colonnes des auto écoles de la ville
+            parts_dir (str): le dossier des résultats des villes
 
         Returns:
             None
     """
-    cities = get_cities(driver)
+    filepath = part_path(city_link, parts_dir)
+    with open(f"{filepath}.tmp", "w", encoding="utf-8") as file:
+        json.dump({"city": city_link, "columns": columns}, file, ensure_ascii=False)
+    replace(f"{filepath}.tmp", filepath)
+
+def load_parts(cities: list, parts_dir: str = PARTS_DIR) -> dict:
+    """
+        Fonction pour lire les résultats des villes récupérées lors d'un scraping interrompu
 
-    auto_ecoles = geopandas.GeoDataFrame(columns=["name", "position", "grade", "geometry"])
+        Args:
+            cities (list): les liens des villes
+            parts_dir (str): le dossier des résultats des villes
 
+        Returns:
+            dict: les colonnes des auto écoles de chaque ville déjà récupérée
+    """
+    results = {}
     for city_link in cities:
-        print(city_link)
-        driver.get(city_link)
+        filepath = part_path(city_link, parts_dir)
+        if path.exists(filepath):
+            with open(filepath, encoding="utf-8") as file:
+                part = json.load(file)
+            if part["city"] == city_link:
+                results[city_link] = part["columns"]
+    return results
+
+def remove_parts(parts_dir: str = PARTS_DIR) -> None:
+    """
+        Procédure pour supprimer les résultats des villes, une fois le fichier final écrit
+
+        Args:
+            parts_dir (str): le dossier des résultats des villes
+
+        Returns:
+            None
+    """
+    if not path.isdir(parts_dir):
+        return
+    for filename in listdir(parts_dir):
+        remove(path.join(parts_dir, filename))
+    rmdir(parts_dir)
+
+def build_driving_schools(columns: dict) -> geopandas.GeoDataFrame:
+    """
+        Fonction pour créer le GeoDataFrame des auto écoles en une seule fois
+
+        Args:
+            columns (dict): la liste des valeurs de chaque colonne (name, position, grade)
+
+        Returns:
+            geopandas.GeoDataFrame: les auto écoles, avec leur point
+    """
+    # La position est "x,y" : les deux coordonnées sont converties en une seule fois
+    coords = pd.Series(columns["position"], dtype=object).str.split(",", expand=True)
+    if coords.empty:
+        coords = pd.DataFrame({0: [], 1: []})
+    # astype(float) lit les nombres au plus près, comme Point le faisait pour chaque ligne
+    coords = coords[[0, 1]].astype(float)
+    geometry = geopandas.points_from_xy(x=coords[0], y=coords[1])
+    return geopandas.GeoDataFrame(columns, geometry=geometry)
+
+def scrape_cities_worker(city_queue: queue.Queue, results: dict, failures: list,
+                         create_browser, driver: webdriver = None,
+                         retries: int = SCRAPING_RETRIES,
+                         get_city=get_city_driving_schools) -> None:
+    """
+        Procédure d'un navigateur du pool : récupère les villes de la file jusqu'à ce
+        qu'elle soit vide. Une ville en échec est remise dans la file, avec un nouveau
+        navigateur, jusqu'à retries essais.
+
+        Args:
+            city_queue (queue.Queue): la file des (lien de la ville, numéro de l'essai)
+            results (dict): les colonnes des auto écoles de chaque ville déjà récupérée
+            failures (list): les villes abandonnées
+            create_browser (function): la fonction qui crée un navigateur
+            driver (webdriver): un navigateur déjà ouvert, None pour en créer un
+            retries (int): le nombre d'essais pour chaque ville
+            get_city (function): la fonction qui récupère les auto écoles d'une ville
+
+        Returns:
+            None
+    """
+    while True:
         try:
-            wait_for_element_loading(driver, "vv-search-item__content__title")
-            list_items = driver.find_elements(By.CLASS_NAME, "vv-search-item")
-            for element in list_items:
-                name = element.get_attribute("data-name")
-                position = element.get_attribute("data-position")
-                note = element.get_attribute("data-note")
-                coords = position.split(",")
-                geometry = Point(coords[0], coords[1])
-                data_dict = {
-                    "name": name,
-                    "position": position,
-                    "grade": note,
-                    "geometry": geometry
-                }
-                auto_ecoles = auto_ecoles._append(data_dict, ignore_index=True)
-        except TimeoutException:
-            print(f"Couldn't load page {driver.current_url}")
-            driver.quit()
+            city_link, attempt = city_queue.get_nowait()
+        except queue.Empty:
+            break
+        try:
+            if driver is None:
+                driver = create_browser()
+            results[city_link] = get_city(driver, city_link)
+            save_part(city_link, results[city_link])
         except Exception as e:
-            print(e)
+            if isinstance(e, TimeoutException):
+                print(f"Couldn't load page {city_link} (essai {attempt}/{retries})")
+            else:
+                print(f"{city_link} (essai {attempt}/{retries}) : {e}")
+            # Le navigateur peut être bloqué : il est remplacé pour l'essai suivant
+            if driver is not None:
+                try:
+                    driver.quit()
+                except Exception:
+                    pass
+                driver = None
+            if attempt < retries:
+                city_queue.put((city_link, attempt + 1))
+            else:
+                failures.append(city_link)
+    if driver is not None:
+        driver.quit()
+
+def scrape_cities(cities: list, create_browser, driver: webdriver = None,
+                  workers: int = SCRAPING_WORKERS, get_city=get_city_driving_schools) -> dict:
+    """
+        Fonction pour récupérer les auto écoles de toutes les villes
+        avec plusieurs navigateurs en même temps.
+        Si des villes sont abandonnées après leurs essais, lève ScrapingIncomplete.
+
+        Args:
+            cities (list): les liens des villes
+            create_browser (function): la fonction qui crée un navigateur
+            driver (webdriver): un navigateur déjà ouvert, utilisé par le premier worker
+            workers (int): le nombre de navigateurs
+            get_city (function): la fonction qui récupère les auto écoles d'une ville
+
+        Returns:
+            dict: la liste des valeurs de chaque colonne, toutes villes confondues,
+                dans l'ordre des villes
+    """
+    makedirs(PARTS_DIR, exist_ok=True)
+    # Les villes déjà récupérées par un scraping interrompu ne sont pas redemandées
+    results = load_parts(cities)
+    if results:
+        print(f"Reprise du scraping : {len(results)} villes déjà récupérées")
+    remaining = [city_link for city_link in cities if city_link not in results]
+
+    city_queue = queue.Queue()
+    for city_link in remaining:
+        city_queue.put((city_link, 1))
+    failures = []
+
+    if remaining:
+        workers = max(1, min(workers, len(remaining)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for worker in range(workers):
+                executor.submit(scrape_cities_worker, city_queue, results, failures,
+                                create_browser, driver if worker == 0 else None,
+                                SCRAPING_RETRIES, get_city)
+    elif driver is not None:
+        # Le navigateur a déjà pu être fermé par get_cities en cas d'erreur
+        try:
             driver.quit()
+        except Exception:
+            pass
+
+    if failures:
+        # Les résultats des autres villes restent dans PARTS_DIR : le prochain scraping
+        # ne redemandera que les villes manquantes
+        raise ScrapingIncomplete(failures)
+    return {column: [value for city_link in cities if city_link in results
+                     for value in results[city_link][column]]
+            for column in DRIVING_SCHOOL_ATTRIBUTES}
+
+# Fonctions de chaque backend : liens des villes, auto écoles d'une ville, création du client
+BACKENDS = {
+    "http": (get_cities_http, get_city_driving_schools_http, HttpClient),
+    "selenium": (get_cities, get_city_driving_schools, create_firefox_browser),
+}
+
+def get_driving_schools(driver: webdriver, workers: int = SCRAPING_WORKERS,
+                        url: str = DEPARTMENT_URL,
+                        create_browser=None, backend: str = "selenium") -> bool:
+    """
+        Procédure pour récupérer les données des auto écoles et les stocker dans un fichier geojson
+
+        Args:
+            driver (webdriver): le navigateur (ou le HttpClient du backend "http")
+            workers (int): le nombre de navigateurs qui récupèrent les villes en même temps
+            url (str): l'adresse de la page du département
+            create_browser (function): la fonction qui crée les autres navigateurs,
+                celle du backend par défaut
+            backend (str): "http" ou "selenium"
+
+        Returns:
+            bool: False si le backend "http" n'a trouvé aucune ville ou aucune auto école
+                (rien n'est écrit)
+    """
+    find_cities, get_city, create_default = BACKENDS[backend]
+    cities = find_cities(driver, url)
+    if not cities and backend == "http":
+        driver.quit()
+        return False
+
+    columns = scrape_cities(cities, create_browser or create_default, driver, workers, get_city)
+    if not columns["name"] and backend == "http":
+        # Les auto écoles des pages des villes sont construites en javascript : les
+        # résultats vides des villes sont retirés pour que Selenium les redemande
+        remove_parts()
+        return False
+    auto_ecoles = build_driving_schools(columns)
 
     auto_ecoles.to_file("data/driving_schools.geojson", driver="GeoJSON")
+    # Le fichier final est écrit : les résultats par ville ne servent plus
+    remove_parts()
+    return True
 
-def get_scraping_data() -> None:
+def get_scraping_data(backend: str = SCRAPING_BACKEND) -> None:
     """
         Procédure pour récupérer les données des auto écoles et les stocker dans un fichier geojson
 
+        Args:
+            backend (str): "http" pour lire les pages sans navigateur, "selenium" pour Firefox
+
         Returns:
             None
     """
     print("Récupération des données des auto écoles...")
+    makedirs("data", exist_ok=True)
+
+    if backend == "http":
+        if get_driving_schools(HttpClient(), backend="http"):
+            print("Scraping terminé !")
+            return
+        print("Aucune ville ou auto école trouvée sans navigateur, scraping avec Selenium...")
+
     try:
         driver = create_firefox_browser()
     except Exception:
         driver = create_firefox_browser()
 
-    makedirs("data", exist_ok=True)
-
+    # Le navigateur est fermé par le pool, une fois ses villes récupérées
     get_driving_schools(driver)
-    driver.quit()
     print("Scraping terminé !")
-    print("Attention, La lecture du fichier lourd n'est peut-être pas finie...")
 
 if __name__ == "__main__":
     get_scraping_data()
@@ -0,0 +1,7 @@
+"""
+    Configuration des tests : les modules du dashboard sont à la racine du dépôt
+"""
+from os import path
+import sys
+
+sys.path.insert(0, path.dirname(path.dirname(path.abspath(__file__))))
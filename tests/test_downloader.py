@@ -0,0 +1,205 @@
+"""
+    Tests du téléchargement avec reprise (downloader.py), contre un serveur HTTP local
+    qui gère les requêtes Range et les ETag
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import hashlib
+import json
+import threading
+import pytest
+import downloader
+
+# Contenu servi, assez grand pour être découpé en plusieurs morceaux et plusieurs blocs
+CONTENT = bytes(range(256)) * 4096
+ETAG = '"v1"'
+
+class FileHandler(BaseHTTPRequestHandler):
+    """
+        Sert CONTENT avec les options du serveur : requêtes Range, ETag, coupure
+        de la connexion et erreurs
+    """
+
+    def log_message(self, *args) -> None:
+        pass
+
+    def send_file(self, body: bool) -> None:
+        server = self.server
+        with server.lock:
+            if body:
+                server.requests.append(self.headers.get("Range"))
+            else:
+                server.heads += 1
+            if server.errors:
+                server.errors -= 1
+                self.send_error(503)
+                return
+            cut = None
+            if body:
+                cut, server.cut = server.cut, None
+
+        if self.headers.get("If-None-Match") == ETAG:
+            self.send_response(304)
+            self.end_headers()
+            return
+
+        start, end = 0, len(CONTENT) - 1
+        byte_range = self.headers.get("Range")
+        partial = (server.ranges and byte_range is not None
+                   and self.headers.get("If-Range", ETAG) == ETAG)
+        if partial:
+            first, last = byte_range[len("bytes="):].split("-")
+            start, end = int(first), int(last) if last else len(CONTENT) - 1
+        self.send_response(206 if partial else 200)
+        self.send_header("Content-Length", str(end - start + 1))
+        self.send_header("ETag", ETAG)
+        if server.ranges or server.advertise_ranges:
+            self.send_header("Accept-Ranges", "bytes")
+        if partial:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(CONTENT)}")
+        self.end_headers()
+        if body:
+            # Avec une coupure, seuls les premiers octets sont envoyés
+            self.wfile.write(CONTENT[start:end + 1][:cut])
+
+    def do_HEAD(self) -> None:
+        self.send_file(body=False)
+
+    def do_GET(self) -> None:
+        self.send_file(body=True)
+
+@pytest.fixture
+def server():
+    """
+        Serveur HTTP local, arrêté à la fin du test
+    """
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), FileHandler)
+    httpd.lock = threading.Lock()
+    httpd.requests = []
+    httpd.heads = 0
+    httpd.ranges = True
+    httpd.advertise_ranges = False
+    httpd.cut = None
+    httpd.errors = 0
+    httpd.url = f"http://127.0.0.1:{httpd.server_address[1]}/fichier.geojson"
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+@pytest.fixture(autouse=True)
+def small_blocks(monkeypatch):
+    """
+        Petits blocs et petits morceaux, pour découper CONTENT sans gros fichier
+    """
+    monkeypatch.setattr(downloader, "CHUNK_SIZE", 64 * 1024)
+    monkeypatch.setattr(downloader, "MIN_SEGMENT_SIZE", 256 * 1024)
+
+def test_download_in_segments(server, tmp_path):
+    """
+        Le fichier est téléchargé en plusieurs morceaux et les fichiers de reprise sont retirés
+    """
+    filepath = tmp_path / "fichier.geojson"
+    assert downloader.download(server.url, str(filepath), backoff=0)
+    assert filepath.read_bytes() == CONTENT
+    assert len(server.requests) == 4
+    assert not (tmp_path / "fichier.geojson.part").exists()
+    assert not (tmp_path / "fichier.geojson.part.json").exists()
+
+def test_resume_after_cut(server, tmp_path):
+    """
+        Un téléchargement coupé au milieu d'un morceau reprend depuis .part.json :
+        seul le morceau coupé est redemandé, après les octets déjà écrits
+    """
+    filepath = tmp_path / "fichier.geojson"
+    server.cut = 3 * 64 * 1024 + 100
+    with pytest.raises(ConnectionError):
+        downloader.download(server.url, str(filepath), retries=0)
+    state = json.loads((tmp_path / "fichier.geojson.part.json").read_text())
+    unfinished = [segment for segment in state['segments']
+                  if segment['done'] < segment['end'] - segment['start'] + 1]
+    assert len(unfinished) == 1 and unfinished[0]['done'] == 3 * 64 * 1024 + 100
+    assert not filepath.exists()
+
+    server.requests.clear()
+    assert downloader.download(server.url, str(filepath), retries=0)
+    segment = unfinished[0]
+    assert server.requests == [f"bytes={segment['start'] + segment['done']}-{segment['end']}"]
+    assert filepath.read_bytes() == CONTENT
+
+def test_resume_single_stream(server, tmp_path):
+    """
+        Un téléchargement d'un seul bloc coupé reprend à la fin du fichier .part
+    """
+    filepath = tmp_path / "fichier.geojson"
+    server.cut = 3 * 64 * 1024 + 100
+    with pytest.raises(ConnectionError):
+        downloader.download(server.url, str(filepath), segments=1, retries=0)
+    assert (tmp_path / "fichier.geojson.part").stat().st_size == 3 * 64 * 1024 + 100
+
+    server.requests.clear()
+    assert downloader.download(server.url, str(filepath), segments=1, retries=0)
+    assert server.requests == [f"bytes={3 * 64 * 1024 + 100}-"]
+    assert filepath.read_bytes() == CONTENT
+
+def test_retry_with_backoff(server, tmp_path, monkeypatch):
+    """
+        Les erreurs du serveur sont réessayées, avec une attente qui double à chaque essai
+    """
+    waits = []
+    monkeypatch.setattr(downloader.time, "sleep", waits.append)
+    server.errors = 2
+    filepath = tmp_path / "fichier.geojson"
+    assert downloader.download(server.url, str(filepath), backoff=0.5)
+    assert waits == [0.5, 1.0]
+    assert filepath.read_bytes() == CONTENT
+
+def test_server_ignoring_range(server, tmp_path):
+    """
+        Un serveur qui annonce les requêtes Range mais renvoie tout le fichier (200)
+        est téléchargé d'un seul bloc
+    """
+    server.ranges = False
+    server.advertise_ranges = True
+    filepath = tmp_path / "fichier.geojson"
+    assert downloader.download(server.url, str(filepath), retries=0)
+    assert filepath.read_bytes() == CONTENT
+
+def test_resume_answered_with_full_file(server, tmp_path):
+    """
+        Si le serveur répond 200 à la reprise d'un téléchargement d'un seul bloc,
+        le fichier .part est réécrit depuis le début
+    """
+    filepath = tmp_path / "fichier.geojson"
+    server.cut = 1000
+    with pytest.raises(ConnectionError):
+        downloader.download(server.url, str(filepath), segments=1, retries=0)
+
+    server.ranges = False
+    server.advertise_ranges = True
+    assert downloader.download(server.url, str(filepath), segments=1, retries=0)
+    assert filepath.read_bytes() == CONTENT
+
+def test_unchanged_file_not_downloaded(server, tmp_path):
+    """
+        Un fichier dont l'ETag n'a pas changé n'est pas retéléchargé (304)
+    """
+    filepath = tmp_path / "fichier.geojson"
+    assert downloader.download(server.url, str(filepath))
+    server.requests.clear()
+    assert not downloader.download(server.url, str(filepath))
+    assert server.requests == []
+    assert filepath.read_bytes() == CONTENT
+
+def test_checksum_mismatch(server, tmp_path):
+    """
+        Un fichier dont le sha256 ne correspond pas lève une erreur et n'est pas gardé
+    """
+    filepath = tmp_path / "fichier.geojson"
+    with pytest.raises(ValueError):
+        downloader.download(server.url, str(filepath), sha256="0" * 64)
+    assert not filepath.exists()
+    assert not (tmp_path / "fichier.geojson.part").exists()
+
+    assert downloader.download(server.url, str(filepath),
+                               sha256=hashlib.sha256(CONTENT).hexdigest())
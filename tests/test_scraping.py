@@ -0,0 +1,233 @@
+"""
+    Tests du scraping des auto écoles (scraping.py), sans réseau ni navigateur
+"""
+from os import path
+from urllib.parse import urljoin
+import pytest
+import scraping
+
+# Pages sauvegardées du site des auto écoles
+FIXTURES_DIR = path.join(path.dirname(path.abspath(__file__)), "fixtures", "scraping")
+
+# Page sauvegardée de chaque adresse, telle que renvoyée par le serveur (sans javascript)
+# et telle qu'affichée par un navigateur
+DEPARTMENT_LINKS = [f"{scraping.DEPARTMENT_URL}{city}/" for city in ("antony", "bagneux", "clamart")]
+SERVER_PAGES = {scraping.DEPARTMENT_URL: "department.html",
+                **{link: "city_javascript.html" for link in DEPARTMENT_LINKS}}
+RENDERED_PAGES = {scraping.DEPARTMENT_URL: "department.html",
+                  **{link: f"city_{link.rstrip('/').rsplit('/', 1)[-1]}.html"
+                     for link in DEPARTMENT_LINKS}}
+
+# Villes du département de test
+CITIES = [f"https://example.org/auto-ecoles/hauts-de-seine/ville-{number}/"
+          for number in range(6)]
+
+class StubBrowser:
+    """
+        Navigateur factice : scrape_cities ne fait que le créer et le fermer
+    """
+    def quit(self) -> None:
+        pass
+
+def read_fixture(filename: str) -> str:
+    """
+        Lit une page sauvegardée
+    """
+    with open(path.join(FIXTURES_DIR, filename), encoding="utf-8") as file:
+        return file.read()
+
+class FixtureClient:
+    """
+        Client HTTP factice du backend "http", qui sert des pages sauvegardées
+    """
+    def __init__(self, pages: dict = None):
+        self.pages = RENDERED_PAGES if pages is None else pages
+
+    def get_page(self, url: str) -> str:
+        return read_fixture(self.pages[url])
+
+    def quit(self) -> None:
+        pass
+
+class FixtureElement:
+    """
+        Élément html factice, comme un WebElement de selenium
+    """
+    def __init__(self, attributes: dict, base_url: str):
+        self.attributes = attributes
+        self.base_url = base_url
+
+    def get_attribute(self, name: str) -> str:
+        value = self.attributes.get(name)
+        # Comme un navigateur, href est renvoyé en adresse absolue
+        if name == "href" and value is not None:
+            return urljoin(self.base_url, value)
+        return value
+
+class FixtureDriver:
+    """
+        Navigateur selenium factice, qui affiche des pages sauvegardées
+    """
+    def __init__(self, pages: dict = None):
+        self.pages = RENDERED_PAGES if pages is None else pages
+        self.current_url = None
+        self.html = ""
+
+    def get(self, url: str) -> None:
+        self.current_url = url
+        self.html = read_fixture(self.pages[url])
+
+    def find_elements(self, by: str, class_name: str) -> list:
+        return [FixtureElement(attributes, self.current_url)
+                for attributes in scraping.find_elements(self.html, class_name)]
+
+    def quit(self) -> None:
+        pass
+
+def city_columns(city_link: str) -> dict:
+    """
+        Auto école factice d'une ville
+    """
+    number = int(city_link.rstrip("/").rsplit("-", 1)[-1])
+    return {"name": [f"Auto-école {number}"], "position": [f"48.8{number},2.2{number}"],
+            "grade": ["4.5"]}
+
+@pytest.fixture(autouse=True)
+def workspace(tmp_path, monkeypatch):
+    """
+        Dossier de travail vide : data/ et PARTS_DIR sont relatifs au dossier courant
+    """
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "data").mkdir()
+    return tmp_path
+
+def use_stub_backend(monkeypatch, get_city) -> None:
+    """
+        Remplace le backend selenium par des villes et des pages factices
+    """
+    monkeypatch.setitem(scraping.BACKENDS, "selenium",
+                        (lambda driver, url: list(CITIES), get_city, StubBrowser))
+
+def test_intermittent_failures_are_retried(monkeypatch):
+    """
+        Une ville qui échoue puis réussit avant SCRAPING_RETRIES essais est gardée
+    """
+    attempts = {}
+
+    def flaky_get_city(driver, city_link):
+        attempts[city_link] = attempts.get(city_link, 0) + 1
+        if attempts[city_link] < 2 and city_link in CITIES[::2]:
+            raise ConnectionError("page coupée")
+        return city_columns(city_link)
+
+    use_stub_backend(monkeypatch, flaky_get_city)
+    assert scraping.get_driving_schools(StubBrowser(), workers=2)
+    assert path.exists("data/driving_schools.geojson")
+    assert not path.exists(scraping.PARTS_DIR)
+    assert all(attempts[city] == 2 for city in CITIES[::2])
+
+def test_abandoned_cities_keep_parts(monkeypatch):
+    """
+        Avec des villes abandonnées, rien n'est écrit, les résultats des autres villes
+        sont gardés et le scraping suivant ne redemande que les villes manquantes
+    """
+    broken = set(CITIES[1:3])
+
+    def failing_get_city(driver, city_link):
+        if city_link in broken:
+            raise ConnectionError("page indisponible")
+        return city_columns(city_link)
+
+    use_stub_backend(monkeypatch, failing_get_city)
+    with pytest.raises(scraping.ScrapingIncomplete) as error:
+        scraping.get_driving_schools(StubBrowser(), workers=2)
+    assert sorted(error.value.failures) == sorted(broken)
+    assert not path.exists("data/driving_schools.geojson")
+    assert sorted(scraping.load_parts(CITIES)) == sorted(set(CITIES) - broken)
+
+    requested = []
+
+    def get_city(driver, city_link):
+        requested.append(city_link)
+        return city_columns(city_link)
+
+    use_stub_backend(monkeypatch, get_city)
+    assert scraping.get_driving_schools(StubBrowser(), workers=2)
+    assert sorted(requested) == sorted(broken)
+    assert not path.exists(scraping.PARTS_DIR)
+
+    schools = scraping.geopandas.read_file("data/driving_schools.geojson")
+    assert list(schools["name"]) == [f"Auto-école {number}" for number in range(6)]
+
+def test_element_parser():
+    """
+        Seuls les éléments qui ont la classe demandée (parmi d'autres) sont gardés
+    """
+    elements = scraping.find_elements(read_fixture("department.html"), "vv-department__link")
+    assert [element.get("href") for element in elements] == [
+        "/auto-ecoles/hauts-de-seine/antony/",
+        "/auto-ecoles/hauts-de-seine/bagneux/",
+        "https://www.vroomvroom.fr/auto-ecoles/hauts-de-seine/clamart/",
+        None,
+    ]
+
+def test_get_cities_http():
+    """
+        Les liens des villes sont lus sans navigateur, en adresses absolues
+    """
+    assert scraping.get_cities_http(FixtureClient()) == DEPARTMENT_LINKS
+
+def test_get_cities_selenium():
+    """
+        Le backend selenium trouve les mêmes villes, sans les liens vides
+    """
+    assert scraping.get_cities(FixtureDriver()) == DEPARTMENT_LINKS
+
+def test_get_city_driving_schools_http():
+    """
+        Les attributs des auto écoles sont lus et décodés, une note absente vaut None
+    """
+    client = FixtureClient()
+    assert scraping.get_city_driving_schools_http(client, DEPARTMENT_LINKS[0]) == {
+        "name": ["Auto-École de la Gare", "Conduite & Code"],
+        "position": ["48.7543,2.2977", "48.7521,2.3012"],
+        "grade": ["4.6", "3.9"],
+    }
+    assert scraping.get_city_driving_schools_http(client, DEPARTMENT_LINKS[1])["grade"] == [None]
+
+def test_get_city_driving_schools_selenium():
+    """
+        Les deux backends lisent les mêmes auto écoles sur les mêmes pages
+    """
+    for link in DEPARTMENT_LINKS:
+        assert (scraping.get_city_driving_schools(FixtureDriver(), link)
+                == scraping.get_city_driving_schools_http(FixtureClient(), link))
+
+def test_http_without_driving_schools_writes_nothing():
+    """
+        Si les pages des villes sont construites en javascript, le backend http
+        n'écrit rien et ne garde pas les résultats vides des villes
+    """
+    assert not scraping.get_driving_schools(
+        FixtureClient(SERVER_PAGES), backend="http",
+        create_browser=lambda: FixtureClient(SERVER_PAGES))
+    assert not path.exists("data/driving_schools.geojson")
+    assert not path.exists(scraping.PARTS_DIR)
+
+def test_http_falls_back_to_selenium(monkeypatch):
+    """
+        Sans auto école trouvée par le backend http, le scraping est refait avec selenium
+    """
+    monkeypatch.setattr(scraping, "HttpClient", lambda: FixtureClient(SERVER_PAGES))
+    monkeypatch.setattr(scraping, "create_firefox_browser", FixtureDriver)
+    monkeypatch.setitem(scraping.BACKENDS, "http",
+                        (scraping.get_cities_http, scraping.get_city_driving_schools_http,
+                         lambda: FixtureClient(SERVER_PAGES)))
+    monkeypatch.setitem(scraping.BACKENDS, "selenium",
+                        (scraping.get_cities, scraping.get_city_driving_schools, FixtureDriver))
+
+    scraping.get_scraping_data("http")
+    schools = scraping.geopandas.read_file("data/driving_schools.geojson")
+    assert list(schools["name"]) == ["Auto-École de la Gare", "Conduite & Code",
+                                     "ECF Bagneux", "Clamart Permis"]
+    assert not path.exists(scraping.PARTS_DIR)
@@ -0,0 +1,40 @@
+"""
+    Point d'entrée de production du dashboard, pour un serveur WSGI à plusieurs processus.
+    Les données sont chargées une seule fois, dans le processus maître, avant la création
+    des workers (gunicorn avec preload_app, voir gunicorn.conf.py) : les workers héritent
+    par fork des tableaux déjà construits (table compacte, cube, index, cartes pré-rendues)
+    et les partagent en copie sur écriture au lieu de tout recharger chacun.
+
+    Utilisation : gunicorn -c gunicorn.conf.py
+"""
+import asyncio
+import gc
+import importlib
+import main
+
+def create_app():
+    """
+        Fonction pour charger les données et créer l'application WSGI du dashboard.
+        Les appels suivants renvoient la même application sans recharger les données.
+
+        Returns:
+            flask.Flask: l'application WSGI du dashboard
+    """
+    if main.app.layout is None:
+        asyncio.run(main.main())
+
+        # Le pré-rendu des cartes doit être terminé avant le fork : ses threads ne sont pas
+        # copiés dans les workers, qui héritent en revanche des cartes déjà rendues
+        if main.warm_up_thread is not None:
+            main.warm_up_thread.join()
+
+        # Les modules de rendu, importés par main.py à leur première utilisation, sont
+        # chargés ici une seule fois pour tous les workers au lieu d'une fois par worker
+        importlib.import_module("marker_layers")
+        importlib.import_module("plotly.express")
+
+        # Les objets chargés sont exclus du ramasse-miettes : ses passages dans les workers
+        # n'écrivent plus dans leurs pages mémoire, qui restent partagées avec le maître
+        gc.collect()
+        gc.freeze()
+    return main.app.server